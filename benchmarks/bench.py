@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Benchmarks of QC4SD with synthetic granules
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from contextlib import redirect_stdout
+from multiprocessing import cpu_count
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from qc4sd import __version__
+from qc4sd import qc4sd
+from qc4sd.profiler import Profiler
+from benchmarks.fixtures import QcDistribution, make_granules
+
+PRODUCTS = ['MOD09A1', 'MOD09Q1', 'MOD09GA', 'MOD09GQ']
+TILE = 'h10v08'
+
+
+def run_qc4sd(files, output, args, number_of_processes, profiler=None):
+    """Run QC4SD end to end and return the wall time in seconds
+
+    :rtype: float
+    """
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.makedirs(output)
+    start = time.perf_counter()
+    with redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        qc4sd.run(args.qcf, args.bands, files, output, with_stats=args.with_stats,
+                  number_of_processes=number_of_processes, profile=profiler)
+    return time.perf_counter() - start
+
+
+def benchmark_product(shortname, fixtures_dir, work_dir, args, distribution):
+    """Benchmark of one product: end to end time for each number of
+    processes (the best of the repeats) and the time of each stage with
+    one process (from the profiler).
+
+    :rtype: dict
+    """
+    product_dir = os.path.join(fixtures_dir, shortname)
+    os.makedirs(product_dir, exist_ok=True)
+    print("Generating {0} synthetic granules of {1} ... ".format(args.dates, shortname), end="", flush=True)
+    start = time.perf_counter()
+    files = make_granules(product_dir, shortname, TILE, args.dates, distribution, args.size_factor)
+    print("done ({0:.1f}s)".format(time.perf_counter() - start))
+
+    output = os.path.join(work_dir, 'output_' + shortname)
+    result = {'files': len(files), 'bands': args.bands, 'end_to_end': {}, 'stages': {}}
+
+    for number_of_processes in args.processes:
+        times = [run_qc4sd(files, output, args, number_of_processes) for _ in range(args.repeat)]
+        result['end_to_end'][str(number_of_processes)] = min(times)
+        print("\t{0} end to end with -p {1}: {2:.2f}s".format(shortname, number_of_processes, min(times)))
+
+    # the cost of each stage with one process, from the profiler
+    profiler = Profiler()
+    run_qc4sd(files, output, args, 1, profiler)
+    result['stages_detail'] = profiler.get_stages()
+    result['stages'] = {stage: totals['wall'] for stage, totals in result['stages_detail'].items()}
+    print("\t{0} stages: {1}".format(shortname, ', '.join("{0} {1:.2f}s".format(stage, seconds)
+                                                         for stage, seconds in result['stages'].items())))
+
+    # scaling against the number of processes
+    base = result['end_to_end'].get('1')
+    if base:
+        result['speedup'] = {p: base / t for p, t in result['end_to_end'].items()}
+    return result
+
+
+def get_commit():
+    """Return the git commit of the repository or None
+
+    :rtype: str
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """Print the times of the results compared with the results saved
+    in the baseline file (of other commit)
+    """
+    with open(baseline_file) as json_file:
+        baseline = json.load(json_file)
+    print("\nCompared with {0} (commit {1}):".format(os.path.basename(baseline_file), baseline.get('commit')))
+    for shortname, result in results['products'].items():
+        if shortname not in baseline['products']:
+            continue
+        base_result = baseline['products'][shortname]
+        for section in ('end_to_end', 'stages'):
+            for key, seconds in result[section].items():
+                if key not in base_result[section] or not seconds:
+                    continue
+                print("\t{0} {1} {2}: {3:.2f}s -> {4:.2f}s ({5:.2f}x)".format(
+                    shortname, section, key, base_result[section][key], seconds, base_result[section][key] / seconds))
+
+
+def main():
+    """Run the benchmarks and save the results (json) for compare them
+    between commits.
+
+        $ python3 benchmarks/bench.py -o results.json
+        $ python3 benchmarks/bench.py --size-factor 0.25 --processes 1,2,4 --compare results.json
+    """
+    parser = argparse.ArgumentParser(
+        prog='bench',
+        description='Benchmarks of QC4SD with synthetic granules of the MODIS products')
+    parser.add_argument('--products', type=str, default=','.join(PRODUCTS), help='products to benchmark')
+    parser.add_argument('--dates', type=int, default=2, help='granules (dates) for each product')
+    parser.add_argument('--bands', type=str, default='1', help='band or bands to process')
+    parser.add_argument('--processes', type=str, default='1,{0}'.format(cpu_count()),
+                        help='numbers of processes for the scaling, comma separated')
+    parser.add_argument('--repeat', type=int, default=1, help='repeats of each run, the best time is saved')
+    parser.add_argument('--qcf', type=str, default='default', help='quality control file')
+    parser.add_argument('--with-stats', dest='with_stats', action='store_true', help='run with statistics')
+    parser.add_argument('--size-factor', dest='size_factor', type=float, default=1.0,
+                        help='factor of the size of the tiles, 1 for the real size')
+    parser.add_argument('--clear-fraction', dest='clear_fraction', type=float, default=0.6,
+                        help='fraction of pixels with the quality control value zero')
+    parser.add_argument('--distinct-values', dest='distinct_values', type=int, default=64,
+                        help='distinct values of the other pixels of the quality control bands')
+    parser.add_argument('--patch-size', dest='patch_size', type=int, default=32,
+                        help='size in pixels of the patches with the same value')
+    parser.add_argument('--nodata-fraction', dest='nodata_fraction', type=float, default=0.1,
+                        help='fraction of NoData pixels of the data bands')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic values')
+    parser.add_argument('--work-dir', dest='work_dir', type=str, help='directory for the granules and outputs')
+    parser.add_argument('--compare', type=str, help='results of other commit (json) to compare')
+    parser.add_argument('--verbose', action='store_true', help='show the messages of QC4SD')
+    parser.add_argument('-o', dest='output', type=str, default='benchmark_results.json', help='results file (json)')
+    args = parser.parse_args()
+
+    args.bands = [int(b) for b in args.bands.split(',')]
+    args.processes = [int(p) for p in args.processes.split(',')]
+    distribution = QcDistribution(args.clear_fraction, args.distinct_values, args.patch_size,
+                                  args.nodata_fraction, args.seed)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='qc4sd_bench_')
+    fixtures_dir = os.path.join(work_dir, 'fixtures')
+
+    results = {'qc4sd_version': __version__, 'commit': get_commit(), 'created': datetime.now().isoformat(),
+               'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                           'processor': platform.processor(), 'cpu_count': cpu_count()},
+               'config': {'dates': args.dates, 'bands': args.bands, 'processes': args.processes,
+                          'repeat': args.repeat, 'qcf': args.qcf, 'with_stats': args.with_stats,
+                          'size_factor': args.size_factor, 'distribution': distribution.as_dict()},
+               'products': {}}
+    try:
+        for shortname in args.products.split(','):
+            results['products'][shortname] = benchmark_product(shortname, fixtures_dir, work_dir, args, distribution)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as json_file:
+        json.dump(results, json_file, indent=2)
+    print("\nResults saved in: {0}".format(args.output))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
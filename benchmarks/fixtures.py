@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  Synthetic MODIS granules for the benchmarks
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import numpy as np
+from datetime import date, timedelta
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+# NoData value of the surface reflectance bands
+REFLECTANCE_NODATA = -28672
+
+# subdatasets of each product as (name, data type, resolution, kind), with the names
+# of the original HDF-EOS files that are used to find the bands in QC4SD, the
+# resolution is the size in pixels of the side of the tile
+PRODUCTS = {
+    'MXD09A1': [('sur_refl_b0{0}'.format(b), np.int16, 2400, 'reflectance') for b in range(1, 8)] +
+               [('sur_refl_qc_500m', np.uint32, 2400, 'qc'),
+                ('sur_refl_szen', np.int16, 2400, 'zenith'),
+                ('sur_refl_vzen', np.int16, 2400, 'zenith'),
+                ('sur_refl_raz', np.int16, 2400, 'azimuth'),
+                ('sur_refl_state_500m', np.uint16, 2400, 'qc')],
+    'MXD09Q1': [('sur_refl_b0{0}'.format(b), np.int16, 4800, 'reflectance') for b in range(1, 3)] +
+               [('sur_refl_state_250m', np.uint16, 4800, 'qc'),
+                ('sur_refl_qc_250m', np.uint16, 4800, 'qc')],
+    'MXD09GA': [('state_1km_1', np.uint16, 1200, 'qc'),
+                ('SensorZenith_1', np.int16, 1200, 'zenith'),
+                ('SolarZenith_1', np.int16, 1200, 'zenith')] +
+               [('sur_refl_b0{0}_1'.format(b), np.int16, 2400, 'reflectance') for b in range(1, 8)] +
+               [('QC_500m_1', np.uint32, 2400, 'qc')],
+    'MXD09GQ': [('sur_refl_b0{0}_1'.format(b), np.int16, 4800, 'reflectance') for b in range(1, 3)] +
+               [('QC_250m_1', np.uint16, 4800, 'qc')],
+}
+
+XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<GranuleMetaDataFile>
+  <GranuleURMetaData>
+    <CollectionMetaData>
+      <ShortName>{shortname}</ShortName>
+      <VersionID>6</VersionID>
+    </CollectionMetaData>
+    <ECSDataGranule>
+      <LocalGranuleID>{granule_id}</LocalGranuleID>
+    </ECSDataGranule>
+    <RangeDateTime>
+      <RangeBeginningDate>{date}</RangeBeginningDate>
+    </RangeDateTime>
+    <Platform>
+      <PlatformShortName>{platform}</PlatformShortName>
+      <Instrument>
+        <SensorShortName>MODIS</SensorShortName>
+      </Instrument>
+    </Platform>
+  </GranuleURMetaData>
+</GranuleMetaDataFile>
+"""
+
+
+class QcDistribution:
+    """Distribution of the values of the synthetic bands: the fraction of
+    pixels with the quality control value zero (usually the best quality),
+    the number of distinct values of the other pixels, the size in pixels
+    of the patches with the same value (like clouds) and the fraction of
+    NoData pixels of the data bands.
+    """
+
+    def __init__(self, clear_fraction=0.6, distinct_values=64, patch_size=32, nodata_fraction=0.1, seed=0):
+        self.clear_fraction = clear_fraction
+        self.distinct_values = distinct_values
+        self.patch_size = patch_size
+        self.nodata_fraction = nodata_fraction
+        self.seed = seed
+
+    def as_dict(self):
+        return {'clear_fraction': self.clear_fraction, 'distinct_values': self.distinct_values,
+                'patch_size': self.patch_size, 'nodata_fraction': self.nodata_fraction, 'seed': self.seed}
+
+    def patches(self, rng, size, values, probabilities=None):
+        """Return a raster of the size with patches of the values
+
+        :rtype: ndarray
+        """
+        patch_size = max(1, int(self.patch_size * size / 2400))
+        n_patches = -(-size // patch_size)
+        patches = rng.choice(values, (n_patches, n_patches), p=probabilities)
+        return np.repeat(np.repeat(patches, patch_size, axis=0), patch_size, axis=1)[:size, :size]
+
+    def raster(self, rng, kind, dtype, size):
+        """Return a synthetic raster for the kind of band
+
+        :param kind: kind of the band: reflectance, qc, zenith or azimuth
+        :type kind: str
+        :rtype: ndarray
+        """
+        if kind == 'reflectance':
+            raster = rng.integers(0, 8000, (size, size), dtype=np.int16)
+            nodata = self.patches(rng, size, [False, True], [1 - self.nodata_fraction, self.nodata_fraction])
+            raster[nodata] = REFLECTANCE_NODATA
+            return raster
+        if kind == 'zenith':
+            return self.patches(rng, size, rng.integers(0, 8000, self.distinct_values)).astype(dtype)
+        if kind == 'azimuth':
+            return self.patches(rng, size, rng.integers(-18000, 18000, self.distinct_values)).astype(dtype)
+        # quality control band: value zero or one of the distinct values
+        values = np.concatenate(([0], rng.integers(1, np.iinfo(dtype).max, self.distinct_values, dtype=np.int64)))
+        probabilities = [self.clear_fraction] + [(1 - self.clear_fraction) / self.distinct_values] * self.distinct_values
+        return self.patches(rng, size, values, probabilities).astype(dtype)
+
+
+def write_subdatasets(filename, subdatasets):
+    """Write the rasters as variables (subdatasets) of one netCDF-4 file, the
+    container with named subdatasets of several resolutions and data types
+    like the HDF-EOS files of MODIS, that GDAL can read without HDF4 support.
+
+    :param filename: file to create
+    :type filename: str
+    :param subdatasets: list of (name, raster, NoData value or None)
+    :type subdatasets: list
+    """
+    gdal_types = {np.dtype(np.int16): gdal.GDT_Int16, np.dtype(np.uint16): gdal.GDT_UInt16,
+                  np.dtype(np.uint32): gdal.GDT_UInt32}
+    driver = gdal.GetDriverByName('netCDF')
+    dataset = driver.CreateMultiDimensional(filename, [], ['FORMAT=NC4'])
+    root_group = dataset.GetRootGroup()
+    dimensions = {}
+    for name, raster, nodata in subdatasets:
+        size = raster.shape[0]
+        if size not in dimensions:
+            dimensions[size] = [root_group.CreateDimension('YDim_{0}'.format(size), None, None, size),
+                                root_group.CreateDimension('XDim_{0}'.format(size), None, None, size)]
+        md_array = root_group.CreateMDArray(name, dimensions[size],
+                                            gdal.ExtendedDataType.Create(gdal_types[raster.dtype]))
+        if nodata is not None:
+            md_array.SetNoDataValueDouble(nodata)
+        md_array.Write(raster)
+        md_array = None
+    root_group = None
+    dataset = None
+
+
+def make_granule(directory, shortname, tile, granule_date, distribution, size_factor=1.0):
+    """Create a synthetic granule of the MODIS product (file and its xml
+    file) in the directory, the granules of MXD09GQ are created with the
+    MXD09GA granule of the same date needed for its quality control.
+
+    :param directory: directory to save the granule
+    :type directory: str
+    :param shortname: short name of the product, i.e. MOD09A1
+    :type shortname: str
+    :param tile: tile, i.e. h10v08
+    :type tile: str
+    :param granule_date: beginning date of the granule
+    :type granule_date: date
+    :param distribution: distribution of the values of the bands
+    :type distribution: QcDistribution
+    :param size_factor: factor of the size of the tile (1 for the real size)
+    :type size_factor: float
+    :return: file of the granule
+    :rtype: str
+    """
+    if shortname[3:] == '09GQ':
+        make_granule(directory, shortname.replace('09GQ', '09GA'), tile, granule_date, distribution, size_factor)
+
+    year_and_jday = "{0}{1:03d}".format(granule_date.year, granule_date.timetuple().tm_yday)
+    granule_id = "{0}.A{1}.{2}.006.{1}000000.hdf".format(shortname, year_and_jday, tile)
+    filename = os.path.join(directory, granule_id)
+    # different values for each product and date, the same for each run
+    rng = np.random.default_rng([distribution.seed, int(year_and_jday), sum(map(ord, shortname))])
+
+    subdatasets = []
+    for name, dtype, size, kind in PRODUCTS['MXD' + shortname[3:]]:
+        raster = distribution.raster(rng, kind, dtype, max(1, int(size * size_factor)))
+        subdatasets.append((name, raster, REFLECTANCE_NODATA if kind == 'reflectance' else None))
+    write_subdatasets(filename, subdatasets)
+
+    with open(filename + '.xml', 'w') as xml_file:
+        xml_file.write(XML_TEMPLATE.format(shortname=shortname, granule_id=granule_id, date=granule_date.isoformat(),
+                                           platform='Terra' if shortname.startswith('MOD') else 'Aqua'))
+    return filename
+
+
+def make_granules(directory, shortname, tile, n_dates, distribution, size_factor=1.0, start_date=date(2016, 1, 1)):
+    """Create the synthetic granules of the product for consecutive dates
+    (each 8 days) in the directory
+
+    :return: files of the granules
+    :rtype: list
+    """
+    return [make_granule(directory, shortname, tile, start_date + timedelta(days=8 * n), distribution, size_factor)
+            for n in range(n_dates)]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from qc4sd.lib import chunks, merge_dicts
+from qc4sd.qc4sd import check_quality_control_file
+from qc4sd.scheduler import default_rows_per_chunk
+from qc4sd.quality_control.quality_control import QualityControl
+from qc4sd.quality_control.quality_control_file import setup_quality_control_file
+from qc4sd.quality_control.modis import ModisQC
+from qc4sd.quality_control.modis import products as modis_products
+from qc4sd.quality_control.landsat import LandsatQC
+from qc4sd.quality_control.landsat import products as landsat_products
+
+
+class ArrayData:
+    """Satellite data in memory, the data band and the quality control
+    bands are arrays (without files), for check the quality control with
+    the same engine of the files (see check_arrays).
+    """
+
+    def __init__(self, shortname, qc_arrays):
+        self.shortname = shortname
+        self.tile = None
+        self.file_name = 'array'
+        self.make_qc = True
+
+        # the quality control bands of the product registered for the short name
+        self.qc_bands = {}
+        if shortname in modis_products.PRODUCTS:
+            product = modis_products.get_product(shortname)
+            for qc_band in product.qc_bands.values():
+                self.qc_bands[qc_band.id_name] = ModisQC(shortname, qc_band.id_name, None,
+                                                         scale_resolution=qc_band.scale_resolution)
+        else:
+            product = landsat_products.get_product(shortname)
+            for qc_band in product.qc_bands.values():
+                self.qc_bands[qc_band.id_name] = LandsatQC(shortname, qc_band.id_name, None)
+
+        missing = [id_name for id_name in self.qc_bands if id_name not in qc_arrays]
+        if missing:
+            raise ValueError("The quality control bands {0} are required for the product {1}"
+                             .format(', '.join(missing), shortname))
+        for id_name, qc_checker in self.qc_bands.items():
+            qc_checker.quality_control_raster = np.asarray(qc_arrays[id_name])
+
+    def __str__(self):
+        return self.file_name
+
+
+def check_arrays(qcf, shortname, band, data, qc_arrays, nodata_value, with_mask=False, with_stats=False,
+                 number_of_threads=1):
+    """Check the quality control of the data band in memory with the
+    quality control bands in memory, without files (HDF, xml or GeoTIFF)
+    and without temporary files, with the same engine of the run. The
+    pixels that not pass the quality control are set to NoData.
+
+        >>> from qc4sd.arrays import check_arrays
+        >>> qc_arrays = {'rbq': rbq, 'sza': sza, 'vza': vza, 'rza': rza, 'sf': sf}
+        >>> raster = check_arrays('default', 'MOD09A1', 1, data, qc_arrays, -28672)
+
+    :param qcf: quality control file (configparse) set up once and reused for
+        several arrays (see setup_quality_control_file), or the path of the
+        file or 'default' (as the run)
+    :type qcf: configparse or str
+    :param shortname: short name of the product, i.e. MOD09A1 or LC08_L2SP
+    :type shortname: str
+    :param band: band of the data
+    :type band: int
+    :param data: raster of the data band, it is not modified
+    :type data: ndarray
+    :param qc_arrays: raster of each quality control band of the product by its id
+        name (i.e. rbq, sf), at the resolution of the quality control band
+    :type qc_arrays: dict
+    :param nodata_value: NoData value of the data band
+    :type nodata_value: int
+    :param with_mask: return the mask of the pixels that pass the quality control
+    :type with_mask: bool
+    :param with_stats: return the statistics of invalid pixels
+    :type with_stats: bool
+    :param number_of_threads: threads to check the chunks of rows
+    :type number_of_threads: int
+    :return: the raster checked, or a tuple with the raster checked, the mask
+        (if with_mask) and the statistics (if with_stats)
+    :rtype: ndarray or tuple
+    """
+    if isinstance(qcf, str):
+        qcf = setup_quality_control_file(check_quality_control_file(qcf))
+    data = np.asarray(data)
+    if data.ndim != 2:
+        raise ValueError("The data band must be a 2d array.")
+    array_data = ArrayData(shortname, qc_arrays)
+
+    qc = QualityControl(qcf, band, [array_data], with_stats, number_of_threads)
+    qc.data_band_raster_to_process = data.copy()
+    qc.nodata_value = nodata_value
+
+    # check the chunks of rows, each chunk write its rows of the raster
+    x_chunks = chunks(range(data.shape[0]), default_rows_per_chunk(data.shape[0], number_of_threads))
+    if number_of_threads > 1:
+        with ThreadPoolExecutor(max_workers=number_of_threads) as executor:
+            results = list(executor.map(lambda x_chunk: qc.do_check_qc_by_chunk(x_chunk, array_data), x_chunks))
+    else:
+        results = [qc.do_check_qc_by_chunk(x_chunk, array_data) for x_chunk in x_chunks]
+
+    raster = qc.data_band_raster_to_process
+    if not with_mask and not with_stats:
+        return raster
+    output = (raster,)
+    if with_mask:
+        output += (raster != nodata_value,)
+    if with_stats:
+        statistics = {'total_pixels': int(data.size), 'total_invalid_pixels': 0, 'nodata_pixels': 0,
+                      'invalid_pixels': {}}
+        for chunk_statistics, _, _ in results:
+            statistics = merge_dicts(statistics, chunk_statistics[0])
+        output += (statistics,)
+    return output
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import numpy as np
+import shutil
+import hashlib
+import tempfile
+from joblib import load, dump
+
+from qc4sd import __version__
+from qc4sd.scheduler import parse_memory_size
+
+# change it when the format of the entries of the cache is changed
+CACHE_FORMAT = 2
+
+
+def file_identity(file):
+    """Identity of the file based on its name, size and modification time
+
+    :param file: path to the file
+    :type file: str
+    :rtype: str
+    """
+    stat = os.stat(file)
+    return "{0}:{1}:{2}".format(os.path.basename(file), stat.st_size, stat.st_mtime_ns)
+
+
+def qcf_section_hash(qcf, section):
+    """Hash of the settings of one section of the quality control file,
+    the order of the items don't change the hash
+
+    :param qcf: quality control file
+    :type qcf: configparse
+    :param section: section of the product in the quality control file
+    :type section: str
+    :rtype: str
+    """
+    items = sorted(qcf[section].items()) if qcf.has_section(section) else []
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Cache of the result of the quality control for each satellite data
+    (granule) and band, the entries are addressed by the content of the
+    input files, the settings of the quality control file and the version
+    of QC4SD. The least recently used entries are evicted when the size of
+    the cache exceeds the maximum size.
+    """
+
+    def __init__(self, cache_dir, max_size='10G'):
+        self.cache_dir = cache_dir
+        self.max_size = parse_memory_size(max_size)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, sd, qcf, band, window=None, mask=None):
+        """Key of the entry for the result of the quality control for
+        the satellite data in the band with the quality control file
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :param qcf: quality control file
+        :type qcf: configparse
+        :param band: band to process
+        :type band: int
+        :param window: window processed of the data band or None for all
+        :type window: Window
+        :param mask: exclusion mask of the pixels to process or None
+        :type mask: Mask
+        :rtype: str
+        """
+        section = sd.product.section
+        identity = [file_identity(file) for file in sd.source_files]
+        identity += [qcf_section_hash(qcf, section), str(band), __version__, str(CACHE_FORMAT)]
+        if window is not None:
+            identity.append(','.join(str(n) for n in window))
+        if mask is not None:
+            identity.append(file_identity(mask.mask_file))
+        return hashlib.sha1('|'.join(identity).encode('utf-8')).hexdigest()
+
+    def get(self, key, with_stats=False):
+        """Return the entry of the cache with the raster checked (memmap),
+        the NoData value and the statistics, or None if the entry not exist
+        or it not has the statistics required.
+
+        :rtype: dict
+        """
+        entry_file = os.path.join(self.cache_dir, key + '.pkl')
+        if not os.path.isfile(entry_file):
+            return None
+        try:
+            entry = load(entry_file, mmap_mode='r')
+        except Exception:
+            return None
+        if with_stats and entry['statistics'] is None:
+            return None
+        # mark as recently used
+        os.utime(entry_file)
+        return entry
+
+    def put(self, key, raster, nodata_value, statistics=None):
+        """Save the result of the quality control in the cache and
+        evict the least recently used entries if it is necessary.
+
+        :param raster: raster checked
+        :type raster: ndarray
+        :param nodata_value: NoData value of the raster
+        :type nodata_value: float
+        :param statistics: statistics of invalid pixels or None
+        :type statistics: dict
+        """
+        entry_file = os.path.join(self.cache_dir, key + '.pkl')
+        # write in temporal file and move it for don't leave corrupted entries
+        fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        dump({'raster': raster, 'nodata_value': nodata_value, 'statistics': statistics},
+             tmp_file, compress=0)
+        os.replace(tmp_file, entry_file)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the size of
+        the cache is less than the maximum size
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, filename))
+                except FileNotFoundError:
+                    # evicted by other session or process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+class FlagCache:
+    """Cache of the quality control bands decoded in planes of bit fields
+    (uint8) and the data bands for each satellite data (granule), saved as
+    npy files that are loaded with memmap. The entries are addressed by the
+    content of the input files and they don't depend of the quality control
+    file, then a run with a new quality control file only apply the rules
+    to the planes without read and decode the rasters of the input files.
+    The least recently used entries are evicted when the size of the cache
+    exceeds the maximum size.
+    """
+
+    def __init__(self, cache_dir, max_size='10G'):
+        self.cache_dir = cache_dir
+        self.max_size = parse_memory_size(max_size)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, sd):
+        """Key of the entry for the satellite data
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :rtype: str
+        """
+        identity = [file_identity(file) for file in sd.source_files] + ['flags', str(CACHE_FORMAT)]
+        return hashlib.sha1('|'.join(identity).encode('utf-8')).hexdigest()
+
+    def load(self, sd, band):
+        """Return the raster of the data band, its NoData value and the planes
+        of bit fields of all quality control bands of the satellite data, the
+        planes and data band are decoded and saved in the cache if they don't
+        exist (reading the input files).
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :param band: band to process
+        :type band: int
+        :return: data band (memmap), NoData value and planes (memmap) by quality control band
+        :rtype: tuple
+        """
+        entry_dir = os.path.join(self.cache_dir, self.key(sd))
+        new_entry = not os.path.isdir(entry_dir)
+        if new_entry:
+            # decode and save the planes in temporal dir and move it for don't leave corrupted entries
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, suffix='.tmp')
+            for qc_id_name, qc_checker in sd.qc_bands.items():
+                for plane_name, plane in qc_checker.decode_flags().items():
+                    np.save(os.path.join(tmp_dir, 'qc_{0}_{1}.npy'.format(qc_id_name, plane_name)), plane)
+                qc_checker.release()
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # saved by other process
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        data_band_file = os.path.join(entry_dir, 'data_band{0:02d}.npy'.format(band))
+        nodata_file = os.path.join(entry_dir, 'data_band{0:02d}_nodata.npy'.format(band))
+        new_data_band = not os.path.isfile(nodata_file)
+        if new_data_band:
+            for array, npy_file in ((sd.get_data_band(band), data_band_file),
+                                    (np.array(sd.get_nodata_value(band)), nodata_file)):
+                fd, tmp_file = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as tmp:
+                    np.save(tmp, array)
+                os.replace(tmp_file, npy_file)
+
+        planes = {}
+        for filename in os.listdir(entry_dir):
+            if filename.startswith('qc_') and filename.endswith('.npy'):
+                qc_id_name, plane_name = filename[3:-4].split('_', 1)
+                planes.setdefault(qc_id_name, {})[plane_name] = \
+                    np.load(os.path.join(entry_dir, filename), mmap_mode='r')
+        # mark as recently used
+        os.utime(entry_dir)
+        # the entry or its data band are new, evict the other entries
+        if new_entry or new_data_band:
+            self.evict(keep=entry_dir)
+        return np.load(data_band_file, mmap_mode='r'), np.load(nodata_file).item(), planes
+
+    def evict(self, keep=None):
+        """Delete the least recently used entries until the size of
+        the cache is less than the maximum size, the entry in use is
+        counted but not deleted
+
+        :param keep: directory of the entry in use
+        :type keep: str
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, filename)
+            if os.path.isdir(entry_dir) and not filename.endswith('.tmp'):
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+                    entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+                except FileNotFoundError:
+                    # evicted by other session or process
+                    continue
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
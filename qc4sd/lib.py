@@ -113,107 +113,56 @@ def merge_dicts(a, b):
     return Counter(dict(a_no_common + b_no_common + common_items))
 
 
-def frange(start, stop, step):
-    """Same as range but with floating steps support
-
-    :rtype: list
-    """
-    L = []
-    while 1:
-        next = start + len(L) * step
-        if step > 0 and next >= stop:
-            break
-        elif step < 0 and next <= stop:
-            break
-        L.append(next)
-    return L
-
-
-def repulsive_items_list(l, repulsive_distance=None, min_distance=None):
-    """Separate the items in list if this have less of repulsive distance
-    value and separate its elements with the minimum distance.
+def spread_items_list(l, min_distance):
+    """Separate the items in list that are nearer than the minimum
+    distance, the groups of near items are spread around its original
+    positions (the mean of the group is kept) with the minimum distance
+    between them. Single pass over the items sorted, O(n log n).
 
     :Example:
 
         >>> l=[1,2,4,10,23,25]
-        >>> repulsive_items_list(l, 3, 3)
-        [-0.5, 2.5, 5.5, 10, 22.5, 25.5]
+        >>> spread_items_list(l, 3)
+        [-0.667, 2.333, 5.333, 10, 22.5, 25.5]
 
     :param l: list to process
     :type l: list
-    :param repulsive_distance: minimum value for check the distance between items
-    :type repulsive_distance: float
     :param min_distance: minimum distance for separate the items
     :type min_distance: float
     :rtype: list
     """
-
-    if repulsive_distance is None:
-        repulsive_distance = (max(l)-min(l))*0.04
-    else:
-        repulsive_distance -= repulsive_distance*0.01
-    if min_distance is None:
-        min_distance = repulsive_distance
-
-    ###### group list
-    l_sort = sorted(list(zip(range(len(l)), l)), key=lambda x: x[1])
-    d = dict(l_sort)
-
-    items_to_fix = []
-    for idx, (k, v) in enumerate(l_sort[0:-1]):
-        if abs(v - l_sort[idx+1][1]) < repulsive_distance:
-            items_to_fix.append([k, l_sort[idx+1][0]])
-    if not items_to_fix:
-        return False, repulsive_distance, l
-
-    join_groups = []
-    group_joined = False
-    for group0, group1 in zip(items_to_fix[0:-1], items_to_fix[1::]):
-        if group0[-1] == group1[0]:
-            if group_joined:
-                to_remove = join_groups[-1]
-                join_groups.append(join_groups[-1] + group1[1::])
-                join_groups.remove(to_remove)
-            else:
-                join_groups.append(group0 + group1[1::])
-            group_joined = True
-            if group0 in join_groups:
-                join_groups.remove(group0)
-        else:
-            if group_joined:
-                join_groups.append(group1)
-            elif group0 in join_groups:
-                join_groups.append(group1)
-            else:
-                join_groups.append(group0)
-                if group1 == items_to_fix[-1]:
-                    join_groups.append(group1)
-            group_joined = False
-    if len(items_to_fix) == 1 and not join_groups:
-        join_groups = items_to_fix
-
-    ###### fixes list
-    def fix_group_distance(group):
-        min_value = d[group[0]]
-        max_value = d[group[-1]]
-        center_value = min_value + (max_value-min_value)/2.0
-        if len(group) % 2 == 0:  # even
-            side = len(group)*min_distance/2.0 - min_distance/2.0
-        else:  # odd
-            side = (len(group)-1)*min_distance/2.0
-        re_adjust = frange(center_value-side, center_value+side+1, min_distance)
-        for item in group:
-            pass
-        return re_adjust
-
-    for group in join_groups:
-        group_fixes = fix_group_distance(group)
-        for idx, item in enumerate(group):
-            d[item] = group_fixes[idx]
-
-    result = [round(x[1], 3) for x in sorted(d.items(), key=lambda x: x[0])]
-    if result == l:
-        return False, repulsive_distance, result
-    else:
-        return True, repulsive_distance, result
-
+    order = sorted(range(len(l)), key=lambda idx: l[idx])
+
+    # groups of items as [start position, number of items, sum of targets], the target
+    # of each item is its value minus its offset (k*min_distance) inside the group
+    groups = []
+    for idx in order:
+        groups.append([l[idx], 1, l[idx]])
+        # join with the previous group while they overlap
+        while len(groups) > 1 and groups[-2][0] + groups[-2][1]*min_distance > groups[-1][0]:
+            _, n_items, targets = groups.pop()
+            prev_n_items = groups[-1][1]
+            targets = groups[-1][2] + targets - n_items*prev_n_items*min_distance
+            groups[-1] = [targets/(prev_n_items + n_items), prev_n_items + n_items, targets]
+
+    result = [None]*len(l)
+    items = iter(order)
+    for start, n_items, _ in groups:
+        for k in range(n_items):
+            idx = next(items)
+            result[idx] = l[idx] if n_items == 1 else round(start + k*min_distance, 3)
+    return result
+
+
+def get_metadata_file(file):
+    """Return the metadata file (xml) of the file to process, the metadata
+    file of Landsat (*_MTL.xml) is the file to process, for MODIS it is the
+    xml file with the same name (*.hdf.xml)
+
+    :param file: file to process
+    :type file: str
+    :rtype: str
+    """
+    if file.endswith('_MTL.xml'):
+        return file
+    return file + ".xml"
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from qc4sd.profiler import get_io_bytes
+
+# metrics exported as (name, type, help)
+METRICS = [('qc4sd_granules_done_total', 'counter', 'Granules (file and band) processed'),
+           ('qc4sd_granules_cached_total', 'counter', 'Granules (file and band) processed from the cache'),
+           ('qc4sd_granules_queued', 'gauge', 'Granules (file and band) to process'),
+           ('qc4sd_pixels_processed_total', 'counter', 'Pixels checked (without the granules from the cache)'),
+           ('qc4sd_pixels_cached_total', 'counter', 'Pixels of the granules from the cache'),
+           ('qc4sd_pixels_per_second', 'gauge', 'Pixels checked per second since the start'),
+           ('qc4sd_workers', 'gauge', 'Workers of the pool'),
+           ('qc4sd_worker_utilization_ratio', 'gauge', 'Busy time of the workers over the time of the checks'),
+           ('qc4sd_read_bytes_total', 'counter', 'Bytes read by the main process'),
+           ('qc4sd_written_bytes_total', 'counter', 'Bytes written by the main process'),
+           ('qc4sd_eta_seconds', 'gauge', 'Estimated seconds to process the granules queued'),
+           ('qc4sd_start_timestamp_seconds', 'gauge', 'Start time of the run'),
+           ('qc4sd_last_progress_timestamp_seconds', 'gauge', 'Time of the last granule processed')]
+
+
+class Metrics:
+    """Live metrics of the process (throughput and progress) updated as
+    each granule (file and band) is processed: granules done and queued,
+    pixels per second, utilization of the workers, bytes read and written
+    and the estimated time to finish. The granules from the cache are
+    counted apart, they are not in the pixels per second nor in the
+    utilization of the workers. They are exported in a textfile for
+    the textfile collector of the Prometheus node exporter and/or in a
+    local HTTP endpoint (/metrics), and shown as a progress line.
+    """
+
+    def __init__(self, textfile=None, port=None, host='127.0.0.1'):
+        """
+        :param textfile: textfile (.prom) to export the metrics, None for not export it
+        :type textfile: str
+        :param port: port of the HTTP endpoint, None for not start it
+        :type port: int
+        :param host: address to bind the HTTP endpoint, by default only local
+        :type host: str
+        """
+        self.textfile = textfile
+        self.start_time = time.time()
+        self.start_read, self.start_write = get_io_bytes()
+        self.granules_done = 0
+        self.granules_cached = 0
+        self.granules_total = 0
+        self.pixels_done = 0
+        self.pixels_cached = 0
+        self.pixels_total = 0
+        self.workers = 0
+        # busy seconds of the workers and available seconds of the pool for the checks
+        self.busy_time = 0.0
+        self.pool_time = 0.0
+        self.last_progress_time = self.start_time
+
+        self.server = None
+        if port is not None:
+            metrics = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip('/') not in ('', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = metrics.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self.server = HTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add_queued(self, qc_list, number_of_processes):
+        """Add the granules (file and band) of the quality control instances
+        to the queue
+
+        :param qc_list: quality control instances to process
+        :type qc_list: list
+        :param number_of_processes: workers of the pool
+        :type number_of_processes: int
+        """
+        for qc in qc_list:
+            self.granules_total += len(qc.sd_list)
+            self.pixels_total += sum(qc.get_shape(sd)[0] * qc.get_shape(sd)[1] for sd in qc.sd_list)
+        self.workers = number_of_processes
+        self.save()
+
+    def granule_done(self, pixels, busy_time=0.0, check_time=0.0, workers=None):
+        """Update the metrics with the granule (file and band) processed
+
+        :param pixels: pixels of the granule
+        :type pixels: int
+        :param busy_time: seconds of the workers checking the granule
+        :type busy_time: float
+        :param check_time: seconds of the check of the granule (in parallel)
+        :type check_time: float
+        :param workers: workers of the pool used
+        :type workers: int
+        """
+        self.granules_done += 1
+        self.pixels_done += pixels
+        if workers is not None:
+            self.workers = workers
+        self.busy_time += busy_time
+        self.pool_time += check_time * self.workers
+        self.last_progress_time = time.time()
+        self.save()
+
+    def granule_cached(self, pixels):
+        """Update the metrics with the granule (file and band) processed
+        from the cache, without check it in the workers
+
+        :param pixels: pixels of the granule
+        :type pixels: int
+        """
+        self.granules_done += 1
+        self.granules_cached += 1
+        self.pixels_done += pixels
+        self.pixels_cached += pixels
+        self.last_progress_time = time.time()
+        self.save()
+
+    def get_values(self):
+        """Return the current value of each metric
+
+        :rtype: dict
+        """
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        read_bytes, write_bytes = get_io_bytes()
+        # the pixels from the cache are not checked, the queued are estimated as checked
+        pixels_per_second = (self.pixels_done - self.pixels_cached) / elapsed
+        pixels_queued = self.pixels_total - self.pixels_done
+        return {'qc4sd_granules_done_total': self.granules_done,
+                'qc4sd_granules_cached_total': self.granules_cached,
+                'qc4sd_granules_queued': self.granules_total - self.granules_done,
+                'qc4sd_pixels_processed_total': self.pixels_done - self.pixels_cached,
+                'qc4sd_pixels_cached_total': self.pixels_cached,
+                'qc4sd_pixels_per_second': pixels_per_second,
+                'qc4sd_workers': self.workers,
+                'qc4sd_worker_utilization_ratio': self.busy_time / self.pool_time if self.pool_time else 0.0,
+                'qc4sd_read_bytes_total': read_bytes - self.start_read,
+                'qc4sd_written_bytes_total': write_bytes - self.start_write,
+                'qc4sd_eta_seconds': pixels_queued / pixels_per_second if pixels_per_second else -1,
+                'qc4sd_start_timestamp_seconds': self.start_time,
+                'qc4sd_last_progress_timestamp_seconds': self.last_progress_time}
+
+    def render(self):
+        """Return the metrics in the text format of Prometheus
+
+        :rtype: str
+        """
+        values = self.get_values()
+        lines = []
+        for name, metric_type, metric_help in METRICS:
+            lines += ['# HELP {0} {1}'.format(name, metric_help), '# TYPE {0} {1}'.format(name, metric_type),
+                      '{0} {1}'.format(name, values[name])]
+        return '\n'.join(lines) + '\n'
+
+    def progress(self):
+        """Return the compact progress line
+
+            [3/20 granules (2 cached), 45.2 Mpx/s, workers 87%, read 1.2G, written 0.3G, ETA 0:12:31]
+
+        :rtype: str
+        """
+        values = self.get_values()
+        eta = values['qc4sd_eta_seconds']
+        cached = ' ({0} cached)'.format(self.granules_cached) if self.granules_cached else ''
+        return "[{0}/{1} granules{2}, {3:.1f} Mpx/s, workers {4:.0%}, read {5:.1f}G, written {6:.1f}G, ETA {7}]".format(
+            self.granules_done, self.granules_total, cached, values['qc4sd_pixels_per_second'] / 1e6,
+            values['qc4sd_worker_utilization_ratio'], values['qc4sd_read_bytes_total'] / 1024**3,
+            values['qc4sd_written_bytes_total'] / 1024**3, timedelta(seconds=int(eta)) if eta >= 0 else '-')
+
+    def save(self):
+        """Write the metrics in the textfile if it was set, written in a
+        temporal file and moved for the collector don't read partial files
+        """
+        if self.textfile is None:
+            return
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.textfile)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(self.render())
+        os.replace(tmp_file, self.textfile)
+
+    def close(self):
+        """Save the last metrics and stop the HTTP endpoint
+        """
+        self.save()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import resource
+from datetime import datetime
+from contextlib import contextmanager
+
+from qc4sd import __version__
+
+# formats of the report of the profiler
+PROFILE_FORMATS = ['json', 'chrome']
+
+
+def get_io_bytes():
+    """Return the bytes read and written by this process, passed through
+    the read/write calls (/proc/self/io) or, if it is not available, the
+    blocks read and written in disk
+
+    :rtype: tuple
+    """
+    try:
+        with open('/proc/self/io') as io_file:
+            counters = dict(line.split(':') for line in io_file)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+
+
+def get_peak_rss():
+    """Return the peak of resident memory of this process in bytes
+
+    :rtype: int
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # in bytes in macOS and in kilobytes in Linux
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class Profiler:
+    """Record the wall time, CPU time, bytes read and written and the peak
+    of resident memory of each stage of the process (per file and band),
+    in the main process and in the workers. The events recorded in the
+    workers are saved in files and collected at the end. The report is
+    saved as json (totals by stage and all events) or as trace of Chrome
+    (chrome://tracing or Perfetto).
+
+        >>> profiler = Profiler()
+        >>> qc4sd.run(settings.ini, [1], files, output_dir, profile=profiler)
+        >>> profiler.get_stages()
+    """
+
+    def __init__(self, report_file=None, report_format='json', enabled=True):
+        if report_format not in PROFILE_FORMATS:
+            raise ValueError("Incorrect format of the report of the profiler '{0}', this should be"
+                             " {1}.".format(report_format, ' or '.join(PROFILE_FORMATS)))
+        self.report_file = report_file
+        self.report_format = report_format
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.start_time = time.time()
+        self.events = []
+        # directory for the events recorded in the workers
+        self.tmp_dir = tempfile.mkdtemp() if enabled else None
+
+    def __getstate__(self):
+        # don't send the events of the main process to the workers
+        state = self.__dict__.copy()
+        state['events'] = []
+        return state
+
+    @contextmanager
+    def stage(self, name, **args):
+        """Record the stage of the code inside the context
+
+            >>> with profiler.stage('read_data_band', file=sd.file_name, band=1):
+            ...     sd.get_data_band(1)
+
+        :param name: name of the stage
+        :type name: str
+        :param args: details of the stage, i.e. file and band
+        """
+        if not self.enabled:
+            yield
+            return
+        start_time = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_read, start_write = get_io_bytes()
+        try:
+            yield
+        finally:
+            read_bytes, write_bytes = get_io_bytes()
+            self.record({'name': name, 'pid': os.getpid(), 'start': start_time - self.start_time,
+                         'wall': time.perf_counter() - start_wall, 'cpu': time.process_time() - start_cpu,
+                         'read_bytes': read_bytes - start_read, 'write_bytes': write_bytes - start_write,
+                         'peak_rss': get_peak_rss(), 'args': args})
+
+    def record(self, event):
+        """Save the event, in the workers the event is appended in the
+        file of events of the worker
+
+        :param event: event of one stage
+        :type event: dict
+        """
+        if os.getpid() == self.pid:
+            self.events.append(event)
+        else:
+            with open(os.path.join(self.tmp_dir, 'events_{0}.jsonl'.format(os.getpid())), 'a') as events_file:
+                events_file.write(json.dumps(event) + '\n')
+
+    def collect(self):
+        """Collect the events recorded in the workers
+        """
+        if not self.enabled or not os.path.isdir(self.tmp_dir):
+            return
+        for events_file_name in sorted(os.listdir(self.tmp_dir)):
+            events_file = os.path.join(self.tmp_dir, events_file_name)
+            with open(events_file) as events:
+                self.events += [json.loads(line) for line in events if line.strip()]
+            os.remove(events_file)
+        self.events.sort(key=lambda event: event['start'])
+
+    def get_stages(self):
+        """Return the totals of the events by stage: number of events, wall
+        time, CPU time, bytes read and written and the peak of resident memory
+
+        :rtype: dict
+        """
+        self.collect()
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event['name'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'read_bytes': 0,
+                                                      'write_bytes': 0, 'peak_rss': 0})
+            stage['count'] += 1
+            for key in ('wall', 'cpu', 'read_bytes', 'write_bytes'):
+                stage[key] += event[key]
+            stage['peak_rss'] = max(stage['peak_rss'], event['peak_rss'])
+        return stages
+
+    def save(self, report_file=None, report_format=None):
+        """Save the report of the profiler in the file
+
+        :param report_file: file of the report, by default the file of the profiler
+        :type report_file: str
+        :param report_format: json or chrome, by default the format of the profiler
+        :type report_format: str
+        """
+        report_file = report_file or self.report_file
+        report_format = report_format or self.report_format
+        stages = self.get_stages()
+        if report_format == 'chrome':
+            # complete events (ph X) with the times in microseconds
+            report = {'traceEvents': [{'name': event['name'], 'cat': 'qc4sd', 'ph': 'X',
+                                       'ts': int(event['start'] * 1e6), 'dur': int(event['wall'] * 1e6),
+                                       'pid': event['pid'], 'tid': event['pid'],
+                                       'args': dict(event['args'], cpu=event['cpu'], read_bytes=event['read_bytes'],
+                                                    write_bytes=event['write_bytes'], peak_rss=event['peak_rss'])}
+                                      for event in self.events],
+                      'displayTimeUnit': 'ms',
+                      'otherData': {'qc4sd_version': __version__}}
+        else:
+            report = {'qc4sd_version': __version__,
+                      'created': datetime.fromtimestamp(self.start_time).isoformat(),
+                      'total_wall': time.time() - self.start_time,
+                      'stages': stages, 'events': self.events}
+        with open(report_file, 'w') as json_file:
+            json.dump(report, json_file, indent=1)
+
+    def close(self):
+        """Save the report if the file was set and delete the files
+        of the events of the workers
+        """
+        if not self.enabled:
+            return
+        self.collect()
+        if self.report_file is not None:
+            self.save()
+            print("\nProfile of the process saved in: {0}".format(self.report_file))
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+# profiler that don't record anything, used when the profile is not set
+NO_PROFILER = Profiler(enabled=False)
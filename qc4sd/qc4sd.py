@@ -14,108 +14,342 @@
 ##################################################################
 
 import os
-import gc
-from multiprocessing import cpu_count
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-from qc4sd.quality_control.quality_control import QualityControl
-from qc4sd.quality_control.quality_control_file import setup_quality_control_file
-from qc4sd.satellite_data.satellite_data import load_satellite_data, SatelliteData
+from qc4sd.lib import get_metadata_file
 
 BASE_DIR = os.path.dirname(__file__)
 DEFAULT_QCF = os.path.join(BASE_DIR, 'quality_control', 'qc_default_modis_settings.ini')
-#DEFAULT_QCF = os.path.join(BASE_DIR, 'quality_control', 'qc_default_landsat_settings.ini')
+# layouts of the output: one file with all dates as bands (stack) or one
+# file per date with a VRT of all dates as bands (dates)
+OUTPUT_LAYOUTS = ['stack', 'dates']
 
 
-def run(qcf, bands, files, output, not_overwrite=False, with_stats=False, number_of_processes=None):
+def run(qcf, bands, files, output, not_overwrite=False, with_stats=False, number_of_processes=None,
+        max_memory=None, incremental=False, cache_dir=None, cache_size='10G', with_summary=False,
+        zones=None, zones_field=None, flag_cache_dir=None, window=None, bbox=None, bbox_srs=None,
+        mask=None, profile=None, profile_format='json', metrics_file=None, metrics_port=None,
+        output_layout='stack', composite=None, composite_period='month'):
     """Main process, execute directly if imported as module.
 
         >>> from qc4sd import qc4sd
         >>> qc4sd.run(settings.ini, 1, [file1, file2])
 
-    :param qcf: quality control file or 'default'
-    :type qcf: str
+    :param qcf: quality control file or 'default', or a list of them for the parameter
+        sweep, each quality control file (variant) is saved in its own directory
+    :type qcf: str or list
     :param bands: band or bands to process
     :type bands: list
-    :param files: files to process
+    :param files: files to process, can be of different platforms, products and tiles
     :type files: list
     :param output: output directory for save results
     :type output: str
+    :param max_memory: memory budget for the process, in bytes or with units like '4G'
+    :type max_memory: int or str
+    :param incremental: append only the new dates to the existing outputs, in the dates layout
+        (the files of the new dates are written and referenced in the VRT of all dates)
+    :type incremental: bool
+    :param cache_dir: directory for the cache of results per file and band, None for disable it
+    :type cache_dir: str
+    :param cache_size: maximum size of the cache, in bytes or with units like '10G'
+    :type cache_size: int or str
+    :param with_summary: save the per pixel summary of valid observations
+    :type with_summary: bool
+    :param zones: raster of labels or vector layer of the zones for the statistics by zone
+    :type zones: str
+    :param zones_field: field of the vector layer with the label of the zones, None for the feature id
+    :type zones_field: str
+    :param flag_cache_dir: directory for the cache of the quality control bands decoded, None for disable it
+    :type flag_cache_dir: str
+    :param window: window in pixels of the data band to process as xoff,yoff,xsize,ysize, None for all
+    :type window: str or list
+    :param bbox: bounding box to process as xmin,ymin,xmax,ymax, None for all
+    :type bbox: str or list
+    :param bbox_srs: spatial reference of the bbox (i.e. EPSG:4326), None for the projection of the tile
+    :type bbox_srs: str
+    :param mask: raster or vector layer of the pixels to process, the pixels outside are set to NoData
+    :type mask: str
+    :param profile: file to save the report of the profiler of the stages of the process,
+        or a Profiler to inspect the stages after the run, None for disable it
+    :type profile: str or Profiler
+    :param profile_format: format of the report of the profiler: json or chrome (trace)
+    :type profile_format: str
+    :param metrics_file: textfile (.prom) to export the live metrics for Prometheus, None for disable it
+    :type metrics_file: str
+    :param metrics_port: port of the local HTTP endpoint (/metrics) of the live metrics, None for disable it
+    :type metrics_port: int
+    :param output_layout: layout of the output: one file with all dates as bands (stack) or one file per
+        date written in parallel as soon as each date is processed, with a VRT of all dates (dates),
+        always dates in incremental mode
+    :type output_layout: str
+    :param composite: methods of the composites of the valid pixels for each period: latest,
+        median, max or min, None for disable it
+    :type composite: list
+    :param composite_period: period of the composites: month, quarter, year or a number of days like 16d
+    :type composite_period: str
+    """
+    for _ in iter_run(qcf, bands, files, output, not_overwrite=not_overwrite, with_stats=with_stats,
+                      number_of_processes=number_of_processes, max_memory=max_memory, incremental=incremental,
+                      cache_dir=cache_dir, cache_size=cache_size, with_summary=with_summary, zones=zones,
+                      zones_field=zones_field, flag_cache_dir=flag_cache_dir, window=window, bbox=bbox,
+                      bbox_srs=bbox_srs, mask=mask, profile=profile, profile_format=profile_format,
+                      metrics_file=metrics_file, metrics_port=metrics_port, output_layout=output_layout,
+                      composite=composite, composite_period=composite_period):
+        pass
+
+
+def iter_run(qcf, bands, files, output, not_overwrite=False, with_stats=False, number_of_processes=None,
+             max_memory=None, incremental=False, cache_dir=None, cache_size='10G', with_summary=False,
+             zones=None, zones_field=None, flag_cache_dir=None, window=None, bbox=None, bbox_srs=None,
+             mask=None, profile=None, profile_format='json', metrics_file=None, metrics_port=None,
+             output_layout='stack', composite=None, composite_period='month'):
+    """Main process (see run for the parameters) yielding the result of each
+    file and band as soon as it is processed, with its date and statistics.
+    The next file is not processed until the result is consumed, then a slow
+    consumer keeps the memory bounded. The outputs are saved like run.
+
+        >>> from qc4sd import qc4sd
+        >>> for result in qc4sd.iter_run(settings.ini, 1, [file1, file2], output):
+        >>>     result.date, result.raster, result.statistics
+
+    :return: the result of each file, band and variant, the raster is
+        a memmap valid until the next result
+    :rtype: GranuleResult
+    """
+
+    # files, checked before load the heavy modules
+    check_files(files)
+
+    # the heavy modules (GDAL and joblib) are loaded after check the files
+    from qc4sd.session import Session
+
+    # the session of the run, with its own pool of workers
+    session = Session(qcf, bands, output, not_overwrite=not_overwrite, with_stats=with_stats,
+                      number_of_processes=number_of_processes, max_memory=max_memory, incremental=incremental,
+                      cache_dir=cache_dir, cache_size=cache_size, with_summary=with_summary, zones=zones,
+                      zones_field=zones_field, flag_cache_dir=flag_cache_dir, window=window, bbox=bbox,
+                      bbox_srs=bbox_srs, mask=mask, profile=profile, profile_format=profile_format,
+                      metrics_file=metrics_file, metrics_port=metrics_port, output_layout=output_layout,
+                      composite=composite, composite_period=composite_period)
+    try:
+        yield from session.iter_run(files)
+    finally:
+        # Cleanup, also if the results are not consumed until the end
+        session.close()
+
+
+async def aiter_run(*args, **kwargs):
+    """Asynchronous version of iter_run for asyncio (same parameters of run),
+    the run is processed in a thread and each result is awaited without
+    block the event loop. The next file is processed only when the
+    consumer asks for the next result (backpressure).
+
+        >>> from qc4sd import qc4sd
+        >>> async for result in qc4sd.aiter_run(settings.ini, 1, [file1, file2], output):
+        >>>     await model.update(result.date, result.raster)
+
+    :return: the result of each file, band and variant
+    :rtype: GranuleResult
     """
+    loop = asyncio.get_running_loop()
+    results = iter_run(*args, **kwargs)
+    # the generator is advanced always in the same thread
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            result = await loop.run_in_executor(executor, next, results, None)
+            if result is None:
+                break
+            yield result
+    finally:
+        # cleanup the run if the results are not consumed until the end
+        await loop.run_in_executor(executor, results.close)
+        executor.shutdown()
+
 
-    ################################
-    # check parameters
+def check_quality_control_file(qcf):
+    """Check and return the path of the quality control file
 
-    # quality control file
+    :param qcf: quality control file or 'default'
+    :type qcf: str
+    :rtype: str
+    """
     if not qcf == 'default' and not os.path.isfile(qcf):
         raise FileNotFoundError("The quality control file not exist, set"
                                 " the correct qfc or set 'default' for default "
                                 " quality control configuration.")
     if qcf == 'default':
         qcf = DEFAULT_QCF
+    return qcf
+
+
+def check_files(files):
+    """Check the files to process and return its xml files
+
+    :param files: files to process
+    :type files: list
+    :return: xml file of each file
+    :rtype: list
+    """
+    for file in files:
+        if not os.path.isfile(file):
+            raise FileNotFoundError("The file {0} not exist.".format(file))
+    xml_files = [get_metadata_file(file) for file in files]
+    for xml_file in xml_files:
+        if not os.path.isfile(xml_file):
+            raise FileNotFoundError("The xml file {0} not exist.".format(xml_file))
+    return xml_files
 
+
+def check_output_layout(output_layout):
+    """Check the layout of the output
+
+    :param output_layout: layout of the output, stack or dates
+    :type output_layout: str
+    """
+    if output_layout not in OUTPUT_LAYOUTS:
+        raise ValueError("The output layout {0} is not valid, set 'stack' for one file with all dates"
+                         " or 'dates' for one file per date.".format(output_layout))
+
+
+def get_variant_names(qcf_list):
+    """Return the names of the variants of the parameter sweep, based
+    on the name of the quality control files without extension
+
+    :param qcf_list: quality control files
+    :type qcf_list: list
+    :rtype: list
+    """
+    variant_names = []
+    for qcf in qcf_list:
+        variant_name = os.path.splitext(os.path.basename(qcf))[0]
+        if variant_name in variant_names:
+            variant_name += '_' + str(len(variant_names) + 1)
+        variant_names.append(variant_name)
+    return variant_names
+
+
+def check_bands(bands):
+    """Check and return the bands to process as list of integers
+
+    :param bands: band or bands to process
+    :type bands: int or list
+    :rtype: list
+    """
     # if pass one band as integer, like 1 not as list
     if isinstance(bands, int):
         bands = [bands]
-
-    # bands
     try:
         bands = [int(b) for b in bands]
     except:
         raise ValueError("Incorrect format or error value for 'bands', this should be"
                          " a list (int) of band or bands.")
-    # files
-    for file in files:
-        if not os.path.isfile(file):
-            raise FileNotFoundError("The file {0} not exist.".format(file))
-    # xml files
-    xml_files = [file + ".xml" for file in files]
-    for xml_file in xml_files:
-        if not os.path.isfile(xml_file):
-            raise FileNotFoundError("The xml file {0} not exist.".format(xml_file))
-    # output
-    if not os.path.isdir(output):
-        raise NotADirectoryError("The output directory {0} not exist.".format(output))
-
-    # set number_of_processes
-    if number_of_processes is None:
-        number_of_processes = cpu_count()
-
-    config_run = {'qcf': qcf, 'bands': bands, 'files': files, 'xml_files': xml_files, 'output': output}
-
-    ################################
-    # init message
-
-    print("\nQC4SD - Quality Control Algorithm for Satellite Data")
-    print("\nConfiguration run:")
-    print("\tquality control file: {0}".format(os.path.basename(config_run['qcf'])))
-    print("\timages to process: {0}".format(len(config_run['files'])))
-    print("\tband(s) to process: {0}".format(','.join([str(b) for b in config_run['bands']])))
-
-    ################################
-    # process
-
-    # setup and set the input or default quality control file
-    config_run['quality_control_file'] = setup_quality_control_file(config_run['qcf'])
-
-    # load all input files and setup data
-    load_satellite_data(config_run)
-
-    # process the quality control per band and save result
-    for band in bands:
-        qc = QualityControl(config_run['quality_control_file'], band, with_stats, number_of_processes)
-        # check if the file exist and continue if not_overwrite was set (-c argument)
-        if not_overwrite and os.path.isfile(os.path.join(config_run['output'], qc.output_filename)):
-            print("\nThe file {} already exist, continue.".format(qc.output_filename))
-            continue
-        qc.process()
-        qc.save_results(config_run['output'])
-        if with_stats:
-            qc.save_statistics(config_run['output'])
-
-    print("\nProcess completed!\n")
-    # Cleanup
-    del config_run, files, qc
-    SatelliteData.list = []
-    QualityControl.list = []
-    # force run garbage collector memory
-    gc.collect()
+    return bands
+
+
+def setup_quality_control(groups, config_run):
+    """Create the quality control for each group of satellite data and
+    band to process, except if the output exist and not overwrite was
+    set or if the output is updated with all dates in incremental mode.
+
+    :param groups: satellite data grouped by (platform, product, tile)
+    :type groups: dict
+    :param config_run: configuration of the run
+    :type config_run: dict
+    :return: quality control instances to process
+    :rtype: list
+    """
+    from qc4sd.quality_control.quality_control import QualityControl
+
+    qc_list = []
+    # the variants of the parameter sweep are processed with the first quality control
+    variants = config_run.get('variants') or [(None, config_run['quality_control_file'])]
+    for sd_list in groups.values():
+        for band in config_run['bands']:
+            qc, *qc_variants = [
+                QualityControl(quality_control_file, band, sd_list, config_run['with_stats'],
+                               config_run['number_of_processes'], config_run['memory_budget'],
+                               config_run['result_cache'], config_run['with_summary'], config_run['zones'],
+                               config_run['flag_cache'], variant_name, config_run.get('subset'),
+                               config_run.get('mask'), config_run.get('profiler'),
+                               config_run.get('output_layout', 'stack'), config_run.get('writer'),
+                               config_run.get('composite'), config_run.get('composite_period', 'month'))
+                for variant_name, quality_control_file in variants]
+            qc.variants = qc_variants
+            # check if the subset to process intersect the tile
+            if qc.window is not None and 0 in (qc.window.xsize, qc.window.ysize):
+                print("\nThe {0} don't intersect the tile {1}, continue.".format(config_run['subset'], qc.tile))
+                continue
+            # check if the file exist and continue if not_overwrite was set (-c argument)
+            if config_run['not_overwrite'] and os.path.isfile(os.path.join(config_run['output'], qc.output_filename)):
+                print("\nThe file {} already exist, continue.".format(qc.output_filename))
+                continue
+            # process only the new dates if incremental was set (-i argument)
+            if config_run['incremental'] and qc.set_existing_dates(config_run['output']) == 0:
+                print("\nThe file {} is already updated with all dates, continue.".format(qc.output_filename))
+                continue
+            qc_list.append(qc)
+    return qc_list
+
+
+def get_number_of_processes(qc_list, config_run):
+    """Number of processes for the pool of workers, limited for the
+    memory budget of the largest image to process of all groups
+
+    :rtype: int
+    """
+    number_of_processes = config_run['number_of_processes']
+    if qc_list and config_run['memory_budget'] is not None:
+        number_of_processes = min(qc.plan(sd, number_of_processes)[0] for qc in qc_list for sd in qc.sd_list)
+    return number_of_processes
+
+
+def process_quality_control(qc_list, parallel, config_run):
+    """Process the quality control per group and band and save the
+    results, all of them share the same pool of workers
+
+    :param qc_list: quality control instances to process
+    :type qc_list: list
+    :param parallel: pool of workers
+    :type parallel: WorkerPool
+    :param config_run: configuration of the run
+    :type config_run: dict
+    """
+    for _ in iter_process_quality_control(qc_list, parallel, config_run):
+        pass
+
+
+def iter_process_quality_control(qc_list, parallel, config_run):
+    """Process the quality control per group and band and save the
+    results (see process_quality_control), yielding the result of
+    each file as soon as it is processed
+
+    :param qc_list: quality control instances to process
+    :type qc_list: list
+    :param parallel: pool of workers
+    :type parallel: WorkerPool
+    :param config_run: configuration of the run
+    :type config_run: dict
+    :rtype: GranuleResult
+    """
+    config_run['metrics'].add_queued(qc_list, parallel.n_jobs)
+    for qc in qc_list:
+        yield from qc.iter_process(parallel, config_run['output'], config_run['metrics'])
+        for variant in [qc] + qc.variants:
+            output_dir = variant.get_output_dir(config_run['output'])
+            stage_args = {'file': variant.output_filename, 'band': variant.band}
+            with qc.profiler.stage('save_results', **stage_args):
+                variant.save_results(output_dir)
+            if config_run['with_summary']:
+                with qc.profiler.stage('save_summary', **stage_args):
+                    variant.save_summary(output_dir)
+            if config_run.get('composite'):
+                with qc.profiler.stage('save_composites', **stage_args):
+                    variant.save_composites(output_dir)
+            if config_run['with_stats']:
+                with qc.profiler.stage('save_statistics', **stage_args):
+                    variant.save_statistics(output_dir)
+    # the peaks of memory of all the run
+    if config_run['memory_budget'] is not None:
+        print(config_run['memory_budget'].report())
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+from collections import Counter
+from datetime import datetime
+from joblib import load, dump
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from qc4sd.quality_control.writer import OUTPUT_OPTIONS, write_vrt
+
+# methods of the composite of the valid pixels of each period: the latest valid,
+# the median of the valid and the maximum or minimum valid value of the band
+COMPOSITE_METHODS = ['latest', 'median', 'max', 'min']
+# periods of the composites, or a number of days from the first day of each
+# year with the suffix d (i.e. 16d like the 16 days composites of MODIS)
+COMPOSITE_PERIODS = ['month', 'quarter', 'year']
+# rows of each block to update the accumulators
+BLOCK_ROWS = 512
+# maximum values (dates x pixels) of each block to compute the median in memory (float64)
+MEDIAN_BLOCK_VALUES = 2**23
+# maximum days of the periods of the median, the median is not a running reducer and
+# it holds the dates of the period (a histogram of each pixel of the int16 reflectance
+# is larger than the dates), then it is bounded to periods of at most one month
+MEDIAN_MAX_DAYS = 31
+
+
+def check_composite(methods, period):
+    """Check the methods and the period of the composites
+
+    :param methods: methods of the composites
+    :type methods: list
+    :param period: period of the composites
+    :type period: str
+    """
+    for method in methods:
+        if method not in COMPOSITE_METHODS:
+            raise ValueError("The composite method {0} is not valid, set one or several of: {1}."
+                             .format(method, ', '.join(COMPOSITE_METHODS)))
+    if period not in COMPOSITE_PERIODS and not (period.endswith('d') and period[:-1].isdigit()
+                                                and int(period[:-1]) > 0):
+        raise ValueError("The composite period {0} is not valid, set {1} or a number of days"
+                         " like 16d.".format(period, ', '.join(COMPOSITE_PERIODS)))
+    if 'median' in methods and not (period == 'month' or (period.endswith('d') and
+                                                          int(period[:-1]) <= MEDIAN_MAX_DAYS)):
+        raise ValueError("The median composite holds the dates of the period, it is only supported for"
+                         " periods of at most {0} days: month or a number of days like 16d.".format(MEDIAN_MAX_DAYS))
+
+
+def get_period(date, period):
+    """Return the label of the period of the date, the labels of the
+    periods are sorted chronologically: 2015-02 (month), 2015-Q1
+    (quarter), 2015 (year) or 2015033 (first day of the n days)
+
+    :param date: date as year and jday (i.e. 2015034)
+    :type date: str
+    :param period: period of the composites
+    :type period: str
+    :rtype: str
+    """
+    dt = datetime.strptime(str(date), '%Y%j')
+    if period == 'month':
+        return '{0}-{1:02d}'.format(dt.year, dt.month)
+    if period == 'quarter':
+        return '{0}-Q{1}'.format(dt.year, (dt.month - 1) // 3 + 1)
+    if period == 'year':
+        return str(dt.year)
+    n_days = int(period[:-1])
+    first_jday = (dt.timetuple().tm_yday - 1) // n_days * n_days + 1
+    return '{0}{1:03d}'.format(dt.year, first_jday)
+
+
+class Composite:
+    """Composites of the valid pixels for each period (i.e. monthly), computed
+    with running reducers updated by blocks as each date is processed (in
+    chronological order), without hold the stack in memory. Only the period
+    in progress is held (in memmap files): one accumulator for the latest,
+    maximum and minimum and the dates of the period for the median. Each
+    period is written in the composite files as soon as it is complete.
+
+    The median is not a running reducer: its memmap holds all the dates of
+    the period in disk (dates x rows x cols of the data type, i.e. 31 dates
+    of a month of MOD09GQ at 4800x4800 int16 are 1.3GiB), then it is only
+    supported for periods up to MEDIAN_MAX_DAYS days, and it is computed
+    by blocks of rows of at most MEDIAN_BLOCK_VALUES values in memory. The
+    NoData value of the composites is the one of the first date of each
+    period, the valid pixels of each date are found with its own NoData.
+
+    In the dates layout each period is saved in its own file, with a VRT of
+    all periods for each method. In incremental mode only the periods of the
+    new dates are saved again: the latest, maximum and minimum continue from
+    the saved period when the new dates are after the existing dates of the
+    period, and the existing dates of the period are read again for the
+    median (or for all methods if a new date is before them), then the cost
+    is bounded by the dates of one period and not by the whole series.
+    """
+
+    def __init__(self, methods, period, dates, rows, cols, composite_files, output_properties,
+                 output_layout='stack', existing_dates=None, existing_periods=None):
+        """
+        :param methods: methods of the composites
+        :type methods: list
+        :param period: period of the composites
+        :type period: str
+        :param dates: dates (year and jday) to update
+        :type dates: list
+        :param composite_files: file to save the composite of each method (the VRT in the dates layout)
+        :type composite_files: dict
+        :param output_properties: geotransform, projection and data type of the output
+        :type output_properties: tuple
+        :param output_layout: one file for each method with the periods as bands (stack) or one
+            file for each method and period with a VRT of all periods (dates)
+        :type output_layout: str
+        :param existing_dates: bands of the dates of the existing output as (date, file, band,
+            NoData value) in incremental mode
+        :type existing_dates: list
+        :param existing_periods: bands of the periods of the existing composites of each method
+            as (period, file, band, NoData value) in incremental mode, None if they not exist
+            and the periods of all existing dates are saved
+        :type existing_periods: dict
+        """
+        self.methods = methods
+        self.period = period
+        self.rows = rows
+        self.cols = cols
+        self.composite_files = composite_files
+        self.output_properties = output_properties
+        self.output_layout = output_layout
+        # the periods to save (bands of the composite files)
+        existing_dates = sorted(existing_dates or [], key=lambda band: band[0])
+        periods = set(get_period(date, period) for date in dates)
+        if existing_periods is None:
+            periods.update(get_period(date, period) for date, _, _, _ in existing_dates)
+            existing_periods = {}
+        self.periods = sorted(periods)
+        # the existing dates of the periods to save, updated again with the new dates
+        self.existing_dates = [band for band in existing_dates if get_period(band[0], period) in periods]
+        # the existing periods of each method by label, the periods saved again are replaced
+        self.existing_periods = dict((method, dict((band[0], band) for band in existing_periods.get(method, [])))
+                                     for method in methods)
+        # the number of dates of each period
+        self.dates_by_period = Counter(get_period(date, period) for date in dates)
+        self.dates_by_period.update(get_period(date, period) for date, _, _, _ in self.existing_dates)
+        # accumulators of the period in progress saved in memmap files, created with the first raster
+        self.tmp_folder = tempfile.mkdtemp()
+        self.accumulators = {}
+        self.current_period = None
+        self.n_dates = 0
+        self.nodata_value = None
+        # the existing dates of the period in progress to update, the methods to update
+        # with them and the saved periods of the methods that continue from them
+        self.pending_dates = []
+        self.pending_methods = []
+        self.saved_accumulators = {}
+        # the periods saved and its bands of each method (dates layout)
+        self.periods_saved = []
+        self.saved_periods = dict((method, []) for method in methods)
+
+        if output_layout == 'dates':
+            return
+        # create the composite files, one band for each period
+        geotransform, projection, data_type = output_properties
+        driver = gdal.GetDriverByName('GTiff')
+        for method in self.methods:
+            outRaster = driver.Create(composite_files[method], cols, rows, len(self.periods), data_type,
+                                      OUTPUT_OPTIONS)
+            outRaster.SetMetadataItem('PERIODS', ','.join(self.periods))
+            outRaster.SetMetadataItem('COMPOSITE', '{0} {1}'.format(method, period))
+            outRaster.SetGeoTransform(geotransform)
+            outRaster.SetProjection(projection)
+            outRaster = None
+
+    def get_period_file(self, method, period):
+        """Return the file of the composite of the method for the period (dates layout)
+
+        :param method: method of the composite
+        :type method: str
+        :param period: label of the period
+        :type period: str
+        :rtype: path
+        """
+        return "{0}_{1}.tif".format(os.path.splitext(self.composite_files[method])[0], period)
+
+    def start_period(self, period, first_date=None):
+        """Start the new period, its accumulators are created with the first
+        raster (see start_accumulators). The existing dates of the period
+        (incremental mode) are pending to update in chronological order with
+        the new dates, except for the latest, maximum and minimum that
+        continue from the saved period if all new dates are after them.
+
+        :param period: label of the period
+        :type period: str
+        :param first_date: first new date of the period, None if it has only existing dates
+        :type first_date: str
+        """
+        self.current_period = period
+        self.n_dates = 0
+        self.pending_dates = [band for band in self.existing_dates if get_period(band[0], self.period) == period]
+        self.pending_methods = list(self.methods)
+        self.saved_accumulators = {}
+        # the NoData of the period is the one of its first date, existing or new
+        if self.pending_dates and (first_date is None or self.pending_dates[0][0] < first_date):
+            self.nodata_value = self.pending_dates[0][3]
+        if first_date is not None and self.pending_dates and self.pending_dates[-1][0] < first_date:
+            for method in self.methods:
+                if method != 'median' and period in self.existing_periods[method]:
+                    self.saved_accumulators[method] = self.existing_periods[method][period]
+                    self.pending_methods.remove(method)
+            if not self.pending_methods:
+                self.pending_dates = []
+
+    def start_accumulators(self, dtype):
+        """Start the accumulators of the period in progress, the latest, maximum
+        and minimum start as NoData (or from the saved period) and the median
+        hold the dates of the period
+
+        :param dtype: data type of the rasters
+        :type dtype: numpy.dtype
+        """
+        for method in self.methods:
+            mmap_file = os.path.join(self.tmp_folder, method)
+            if method == 'median':
+                shape = (self.dates_by_period[self.current_period], self.rows, self.cols)
+            else:
+                shape = (self.rows, self.cols)
+            dump(np.full(shape, self.nodata_value, dtype=dtype), mmap_file, compress=0)
+            self.accumulators[method] = load(mmap_file, mmap_mode='r+')
+            if method in self.saved_accumulators:
+                _, _, _, nodata_value = self.saved_accumulators[method]
+                saved = read_band(self.saved_accumulators[method])
+                self.accumulators[method][:] = np.where(saved == nodata_value, self.nodata_value, saved)
+                del saved
+
+    def update(self, date, raster, nodata_value):
+        """Update the accumulators with the raster checked for the date,
+        the dates must be updated in chronological order. When the date is
+        of a new period the previous period is saved.
+
+        :param date: date of the raster (year and jday)
+        :type date: str
+        :param raster: raster checked (QC)
+        :type raster: ndarray
+        :param nodata_value: NoData value of the raster
+        :type nodata_value: float
+        """
+        period = get_period(date, self.period)
+        if period != self.current_period:
+            self.save_period()
+            self.save_existing_periods(before=period)
+            self.nodata_value = nodata_value
+            self.start_period(period, date)
+        # the existing dates of the period before the date
+        self.update_existing(date)
+        self.accumulate(raster, nodata_value, self.methods)
+
+    def update_existing(self, date=None):
+        """Update the accumulators of the pending methods with the existing
+        dates of the period before the date (all if date is None)
+
+        :param date: date (year and jday)
+        :type date: str
+        """
+        while self.pending_dates and (date is None or self.pending_dates[0][0] < date):
+            band = self.pending_dates.pop(0)
+            self.accumulate(read_band(band), band[3], self.pending_methods)
+
+    def accumulate(self, raster, nodata_value, methods):
+        """Update the accumulators of the methods with the raster of one date
+
+        :param raster: raster checked (QC)
+        :type raster: ndarray
+        :param nodata_value: NoData value of the raster
+        :type nodata_value: float
+        :param methods: methods to update
+        :type methods: list
+        """
+        if not self.accumulators:
+            self.start_accumulators(raster.dtype)
+        # the valid pixels with the NoData of the date, the accumulators
+        # without valid values yet have the NoData of the period
+        acc = self.accumulators
+        for y in range(0, self.rows, BLOCK_ROWS):
+            block = slice(y, y + BLOCK_ROWS)
+            raster_block = raster[block]
+            valid = raster_block != nodata_value
+            if not valid.any():
+                continue
+            for method in methods:
+                if method == 'median':
+                    acc['median'][self.n_dates, block][valid] = raster_block[valid]
+                    continue
+                acc_block = acc[method][block]
+                to_update = valid
+                if method == 'max':
+                    to_update = valid & ((acc_block == self.nodata_value) | (raster_block > acc_block))
+                elif method == 'min':
+                    to_update = valid & ((acc_block == self.nodata_value) | (raster_block < acc_block))
+                acc_block[to_update] = raster_block[to_update]
+        self.n_dates += 1
+
+    def get_median(self, block):
+        """Return the median of the valid values of the dates of the period
+        for the block of rows, NoData if the pixel has not valid values
+
+        :param block: block of rows
+        :type block: slice
+        :rtype: ndarray
+        """
+        stack = self.accumulators['median'][:self.n_dates, block]
+        values = stack.astype(np.float64)
+        values[stack == self.nodata_value] = np.nan
+        with warnings.catch_warnings():
+            # all-NaN slice for the pixels without valid values
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(values, axis=0)
+        if np.issubdtype(stack.dtype, np.integer):
+            median = np.round(median)
+        return np.where(np.isnan(median), self.nodata_value, median).astype(stack.dtype)
+
+    def write_period(self, outband, method):
+        """Write the composite of the method of the period in progress in the band
+
+        :param outband: band of the composite file
+        :type outband: gdal.Band
+        :param method: method of the composite
+        :type method: str
+        """
+        outband.SetDescription(self.current_period)
+        if method == 'median':
+            # the rows of each block for the dates of the period in memory
+            median_rows = max(1, MEDIAN_BLOCK_VALUES // (max(self.n_dates, 1) * self.cols))
+            for y in range(0, self.rows, median_rows):
+                block = slice(y, y + median_rows)
+                outband.WriteArray(self.get_median(block), 0, y)
+        else:
+            outband.WriteArray(self.accumulators[method])
+        outband.SetNoDataValue(self.nodata_value)
+
+    def save_period(self):
+        """Save the period in progress in its band of the composite files
+        (or in its own files in the dates layout) and release its accumulators
+        """
+        if self.current_period is None:
+            return
+        # the existing dates of the period after the last new date
+        self.update_existing()
+        for method in self.methods:
+            if self.output_layout == 'dates':
+                # write in a hidden file and replace the existing period at the end
+                geotransform, projection, data_type = self.output_properties
+                period_file = self.get_period_file(method, self.current_period)
+                tmp_file = os.path.join(os.path.dirname(period_file), "." + os.path.basename(period_file))
+                gdal_dataset = gdal.GetDriverByName('GTiff').Create(tmp_file, self.cols, self.rows, 1, data_type,
+                                                                    OUTPUT_OPTIONS)
+                gdal_dataset.SetMetadataItem('PERIODS', self.current_period)
+                gdal_dataset.SetMetadataItem('COMPOSITE', '{0} {1}'.format(method, self.period))
+                gdal_dataset.SetGeoTransform(geotransform)
+                gdal_dataset.SetProjection(projection)
+                outband = gdal_dataset.GetRasterBand(1)
+                self.write_period(outband, method)
+                outband = None
+                gdal_dataset = None
+                os.replace(tmp_file, period_file)
+                self.saved_periods[method].append((self.current_period, period_file, 1, self.nodata_value))
+            else:
+                gdal_dataset = gdal.Open(self.composite_files[method], gdal.GA_Update)
+                outband = gdal_dataset.GetRasterBand(self.periods.index(self.current_period) + 1)
+                self.write_period(outband, method)
+                outband = None
+                gdal_dataset = None
+        self.periods_saved.append(self.current_period)
+        self.accumulators = {}
+        self.current_period = None
+
+    def save_existing_periods(self, before=None):
+        """Save the periods to save with only existing dates (before the
+        period), when the existing composites not exist (incremental mode)
+
+        :param before: label of the period, None for all periods
+        :type before: str
+        """
+        for period in self.periods:
+            if period not in self.periods_saved and (before is None or period < before):
+                self.start_period(period)
+                self.save_period()
+
+    def close(self):
+        """Save the last periods, the VRT of the periods of each method in the
+        dates layout and delete the memmap files of the accumulators
+        """
+        self.save_period()
+        self.save_existing_periods()
+        if self.output_layout == 'dates':
+            for method in self.methods:
+                saved = [period for period, _, _, _ in self.saved_periods[method]]
+                bands = [band for period, band in self.existing_periods[method].items() if period not in saved]
+                write_vrt(self.composite_files[method], bands + self.saved_periods[method], self.rows, self.cols,
+                          self.output_properties, 'PERIODS', {'COMPOSITE': '{0} {1}'.format(method, self.period)})
+        shutil.rmtree(self.tmp_folder, ignore_errors=True)
+
+
+def read_band(band):
+    """Read the raster of the band of an output file
+
+    :param band: band as (label, file, band of the file, NoData value)
+    :type band: tuple
+    :rtype: ndarray
+    """
+    _, band_file, nband, _ = band
+    gdal_dataset = gdal.Open(band_file, gdal.GA_ReadOnly)
+    raster = gdal_dataset.GetRasterBand(nband).ReadAsArray()
+    del gdal_dataset
+    return raster
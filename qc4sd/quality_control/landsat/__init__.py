@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import numpy as np
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from qc4sd.quality_control.landsat.products import get_product
+
+
+class LandsatQC:
+    """Quality control class for Landsat Collection 2 files. One instance
+    represent one band of quality control (QA_PIXEL or QA_RADSAT) for
+    specific type of Landsat products. The quality control band is not
+    loaded in memory, it is read by blocks of rows in the check of each
+    chunk, and the bit fields are checked with the kernel generated from
+    the layout of the band for each distinct value of the block.
+    """
+
+    def __init__(self, sd_shortname, id_name, qc_name):
+        self.sd_shortname = sd_shortname
+        self.id_name = id_name
+        self.qc_name = qc_name
+        # the quality control bands has the same resolution of the data bands
+        self.scale_resolution = 1
+        # raster for quality control band, only for decode it in the flag cache
+        self.quality_control_raster = None
+        # window of the data band to process (xoff, yoff, xsize, ysize) or None for all
+        self.window = None
+        self.raster_offset = (0, 0)
+
+        # the product, the full name and the kernel (rules) of this quality control
+        # band are resolved once in the registry of products (see products)
+        product = get_product(self.sd_shortname)
+        self.section = product.section
+        self.full_name = product.qc_bands[self.id_name].full_name
+        self.kernel = product.get_kernel(self.id_name)
+
+    def load(self, read_window=None, read_windows=None):
+        """The quality control band is read by blocks of rows when each
+        chunk is checked (see get_block), it is not loaded in memory
+
+        :param read_window: window of the data band to read (not used)
+        :type read_window: Window
+        :param read_windows: windows of the data band to read (not used)
+        :type read_windows: list
+        """
+        pass
+
+    def release(self):
+        """Free the memory of the raster of the quality control band
+        """
+        self.quality_control_raster = None
+
+    def get_nbytes(self):
+        """Return the size in bytes of the raster of the quality control
+        band, based on its shape and data type, without read it
+
+        :rtype: int
+        """
+        gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
+        gdal_band_qc = gdal_dataset_qc.GetRasterBand(1)
+        nbytes = gdal_dataset_qc.RasterXSize * gdal_dataset_qc.RasterYSize * \
+            gdal.GetDataTypeSize(gdal_band_qc.DataType) // 8
+        del gdal_band_qc, gdal_dataset_qc
+        return nbytes
+
+    def get_check_settings(self, qcf):
+        """Return the statistics of invalid pixels initialized (zero count
+        for each item of this quality control band in the quality control
+        file) and if this quality control band need to be checked with the
+        quality control file. They are kept by the quality control of each
+        quality control file (see QualityControl), not in this instance that
+        is shared by all the quality control files of the parameter sweep.
+
+        :param qcf: quality control file
+        :type qcf: configparse
+        :return: invalid pixels by item and need check
+        :rtype: tuple
+        """
+        # create and init the statistics fields dictionary to zero count value,
+        # for specific quality control band (id_name) that belonging this instance
+        keys_from_qcf = list(qcf[self.section].keys())
+        invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name+'_'))
+
+        # verification if this quality band type need to check:
+        # if all items of this qc type in qcf are True, this means
+        # that this qc don't need to be check, all pass this qc
+        need_check = True
+        single_qcf_values = set([v for k, v in qcf[self.section].items() if k.startswith(self.id_name+'_')])
+        if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
+            need_check = False
+        return invalid_pixels, need_check
+
+    def decode_flags(self):
+        """Return the quality control band decoded in planes of bit
+        fields (uint8) by name, see the layout module
+
+        :rtype: dict
+        """
+        gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
+        self.quality_control_raster = gdal_dataset_qc.ReadAsArray()
+        del gdal_dataset_qc
+        return self.kernel.decode(self.quality_control_raster)
+
+    def get_block(self, rows, cols, raster=None):
+        """Return the values of the quality control band for the block of
+        rows of the data band (in the window), read from the file only the
+        block, or from the raster of all tile if it is given (flag cache)
+        or if it is in memory (see arrays).
+
+        :param rows: rows of the data band (in the window)
+        :type rows: range
+        :param cols: number of columns of the data band (in the window)
+        :type cols: int
+        :param raster: raster of all tile of the quality control band
+        :type raster: ndarray
+        :rtype: ndarray
+        """
+        window_y, window_x = (self.window.yoff, self.window.xoff) if self.window is not None else (0, 0)
+        if raster is None:
+            raster = self.quality_control_raster
+        if raster is not None:
+            return raster[rows.start + window_y:rows.stop + window_y, window_x:window_x + cols]
+        gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
+        block = gdal_dataset_qc.GetRasterBand(1).ReadAsArray(window_x, rows.start + window_y, cols, len(rows))
+        del gdal_dataset_qc
+        return block
+
+    def read_block(self, rows, cols, pixels_to_check, planes=None):
+        """Read the pixels to check in the block of rows of the data band,
+        as the distinct values of the quality control band and the index of
+        the value of each pixel or, if the planes of bit fields are given,
+        as the values of the planes for each pixel.
+
+        :param rows: rows of the data band
+        :type rows: range
+        :param cols: number of columns of the data band
+        :type cols: int
+        :param pixels_to_check: pixels to check in the block
+        :type pixels_to_check: ndarray
+        :param planes: planes of bit fields of this quality control band (see decode_flags)
+        :type planes: dict
+        :return: block to check (see check_block)
+        :rtype: tuple or dict
+        """
+        if planes is not None:
+            return dict((plane_name, self.get_block(rows, cols, plane)[pixels_to_check])
+                        for plane_name, plane in planes.items())
+        return np.unique(self.get_block(rows, cols)[pixels_to_check], return_inverse=True)
+
+    def check_block(self, block, band, qcf, with_stats):
+        """Check the pixels of the block read, the bit fields of each distinct
+        value of the quality control band (or of the planes of bit fields) are
+        checked with the table of pass or not pass for each value of the field,
+        see the kernel of the layout module. The same block can be checked
+        with several quality control files.
+
+        :param block: block read (see read_block)
+        :type block: tuple or dict
+        :param band: band of data to process
+        :type band: int
+        :param qcf: quality control file
+        :type qcf: configparse
+        :param with_stats: count the invalid flags of each value
+        :type with_stats: bool
+        :return: for each check the index of the value of each pixel to check,
+            pass or not pass for each value and the invalid flags of each value
+        :rtype: list
+        """
+        if isinstance(block, dict):
+            return self.kernel.check_planes(block, band, qcf)
+
+        qc_values, qc_inverse = block
+        values_pass, values_invalid_pixels = self.kernel.check_values(qc_values, band, qcf)
+        return [(qc_inverse.ravel(), values_pass, values_invalid_pixels)]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from collections import namedtuple
+
+from qc4sd.quality_control.layout import Field, BitLayout, Kernel
+
+# Quality control band of one product: the id name, the full name, the tag of
+# the file of the band in the metadata file (MTL) and the layout of the bit fields
+# with the offsets counted from the least significant bit like the documentation
+# of Landsat, the kernel (rules) is generated from the layout (see layout module).
+QcBand = namedtuple('QcBand', ['id_name', 'full_name', 'file_tag', 'layout'])
+
+# Pixel Quality Assessment (QA_PIXEL) of Landsat 8 and 9 Collection 2
+PIXEL_LAYOUT = BitLayout(16, [
+    Field('pixel_fill_', 0, 1), Field('pixel_dilated_cloud_', 1, 1), Field('pixel_cirrus_', 2, 1),
+    Field('pixel_cloud_', 3, 1), Field('pixel_cloud_shadow_', 4, 1), Field('pixel_snow_', 5, 1),
+    Field('pixel_clear_', 6, 1), Field('pixel_water_', 7, 1), Field('pixel_cloud_confidence_', 8, 2),
+    Field('pixel_cloud_shadow_confidence_', 10, 2), Field('pixel_snow_ice_confidence_', 12, 2),
+    Field('pixel_cirrus_confidence_', 14, 2)], msb_first=False)
+
+# Radiometric Saturation and Terrain Occlusion (QA_RADSAT) of Landsat 8 and 9
+# Collection 2, the saturation of the reflective bands 1 to 7 in the bits 0 to 6
+RADSAT_LAYOUT = BitLayout(16, [
+    Field('radsat_saturation_', 0, 1, band_stride=1, n_bands=7),
+    Field('radsat_terrain_occlusion_', 11, 1)], msb_first=False)
+
+
+class Product:
+    """Landsat product registered: the section in the quality control
+    file, the short names of the product and its quality control bands.
+    """
+
+    def __init__(self, section, shortnames, qc_bands):
+        self.section = section
+        self.shortnames = shortnames
+        self.qc_bands = dict((qc_band.id_name, qc_band) for qc_band in qc_bands)
+
+    def get_kernel(self, id_name):
+        """Return the kernel of the quality control for the quality
+        control band of this product, generated from its layout
+
+        :param id_name: id name of the quality control band
+        :type id_name: str
+        :rtype: Kernel
+        """
+        return Kernel(self.section, id_name, self.qc_bands[id_name].layout)
+
+
+# registry of the products by short name
+PRODUCTS = {}
+
+
+def register(product):
+    """Register the product for all its short names
+
+    :param product: product to register
+    :type product: Product
+    """
+    for shortname in product.shortnames:
+        PRODUCTS[shortname] = product
+
+
+def get_product(shortname):
+    """Return the product registered for the short name
+
+    :param shortname: short name of the product, i.e. LC08_L2SP
+    :type shortname: str
+    :rtype: Product
+    """
+    if shortname not in PRODUCTS:
+        raise NotImplementedError("Product {0} not implemented or not supported".format(shortname))
+    return PRODUCTS[shortname]
+
+
+# [LANDSAT_C2L2] ###################################################
+# for Landsat 8 and 9 OLI/TIRS Collection 2 Level-2, surface reflectance
+# and surface temperature (L2SP) or only surface reflectance (L2SR)
+register(Product('LANDSAT_C2L2', ['LC08_L2SP', 'LC09_L2SP', 'LC08_L2SR', 'LC09_L2SR'], [
+    QcBand('pixel', 'Pixel Quality Assessment', 'FILE_NAME_QUALITY_L1_PIXEL', PIXEL_LAYOUT),
+    QcBand('radsat', 'Radiometric Saturation and Terrain Occlusion', 'FILE_NAME_QUALITY_L1_RADIOMETRIC_SATURATION',
+           RADSAT_LAYOUT)]))
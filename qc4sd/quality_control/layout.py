@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import numpy as np
+from collections import Counter, namedtuple
+
+# Layouts of the quality control bands declared as data, the kernels that check
+# the quality control bands (by distinct values or by planes of bit fields) are
+# generated from the layout, see Kernel.
+
+# bit field of a quality control band: prefix of the items in the quality control
+# file, offset of the first bit and width (number of bits). The fields repeated for
+# each data band (i.e. data quality of each band) have the stride of the offset for
+# each band and the number of bands, the field of the band is at offset + (band - 1) * stride
+Field = namedtuple('Field', ['prefix', 'offset', 'width', 'band_stride', 'n_bands'])
+Field.__new__.__defaults__ = (0, 0)
+
+# layout of a quality control band of bit fields: the number of bits, the fields and
+# the order of the offsets, from the most significant bit (like the binary strings of
+# the original rules for MODIS) or from the least significant bit (like Landsat)
+BitLayout = namedtuple('BitLayout', ['num_bits', 'fields', 'msb_first'])
+
+# layout of a quality control band of values (i.e. angles) that pass in the
+# range of the items <id name>_min and <id name>_max of the quality control
+# file, the values of the band are multiplied by the scale
+RangeLayout = namedtuple('RangeLayout', ['scale'])
+
+
+def get_fields(layout, band):
+    """Return the bit fields of the layout to check for the band, as (name
+    of the plane, prefix, shift from the least significant bit, width)
+
+    :param layout: layout of the quality control band
+    :type layout: BitLayout
+    :param band: band of data to process
+    :type band: int
+    :rtype: list
+    """
+    fields = []
+    for field in layout.fields:
+        offset = field.offset
+        plane_name = field.prefix.rstrip('_')
+        if field.n_bands:
+            # the field of the band, not checked for the bands without it
+            if band > field.n_bands:
+                continue
+            offset += (band - 1) * field.band_stride
+            plane_name = '{0}b{1:02d}'.format(field.prefix, band)
+        shift = layout.num_bits - offset - field.width if layout.msb_first else offset
+        fields.append((plane_name, field.prefix, shift, field.width))
+    return fields
+
+
+class Kernel:
+    """Kernel of the quality control band generated from its layout for one
+    product (section of the quality control file). The fields are extracted
+    with bit masks and checked with a table (LUT) of pass or not pass for
+    each value of the field, built with the quality control file only for
+    the values in the block.
+    """
+
+    def __init__(self, section, id_name, layout):
+        self.section = section
+        self.id_name = id_name
+        self.layout = layout
+
+    def get_table(self, prefix, width, values, qcf):
+        """Return the table of pass or not pass for each value of the field,
+        the items of the quality control file are read only for the values
+
+        :param values: values of the field to check
+        :type values: list
+        :rtype: ndarray
+        """
+        table = np.ones(2**width, dtype=bool)
+        for value in values:
+            if qcf.getboolean(self.section, prefix + format(value, '0{0}b'.format(width))) is False:
+                table[value] = False
+        return table
+
+    def check_range(self, qc_values, qcf):
+        """Check the values (scaled) in the range of the quality control file
+
+        :return: pass or not pass for each value and the invalid flags of each value
+        :rtype: tuple
+        """
+        qc_values = qc_values * self.layout.scale
+        values_pass = np.ones(len(qc_values), dtype=bool)
+        values_invalid_pixels = [Counter() for _ in range(len(qc_values))]
+        for flag, values_fail in ((self.id_name + '_min', qc_values < qcf.getfloat(self.section, self.id_name + '_min')),
+                                  (self.id_name + '_max', qc_values > qcf.getfloat(self.section, self.id_name + '_max'))):
+            values_pass &= ~values_fail
+            for idx in np.flatnonzero(values_fail).tolist():
+                values_invalid_pixels[idx][flag] += 1
+        return values_pass, values_invalid_pixels
+
+    def check_values(self, qc_values, band, qcf):
+        """Check the distinct values of the quality control band, the
+        fields of all values are extracted and checked at once
+
+        :param qc_values: distinct values of the quality control band
+        :type qc_values: ndarray
+        :param band: band of data to process
+        :type band: int
+        :param qcf: quality control file
+        :type qcf: configparse
+        :return: pass or not pass for each value and the invalid flags of each value
+        :rtype: tuple
+        """
+        if isinstance(self.layout, RangeLayout):
+            return self.check_range(qc_values, qcf)
+        qc_values = qc_values.astype(np.int64)
+        values_pass = np.ones(len(qc_values), dtype=bool)
+        values_invalid_pixels = [Counter() for _ in range(len(qc_values))]
+        for plane_name, prefix, shift, width in get_fields(self.layout, band):
+            field_values = (qc_values >> shift) & (2**width - 1)
+            table = self.get_table(prefix, width, np.unique(field_values).tolist(), qcf)
+            values_fail = ~table[field_values]
+            values_pass &= ~values_fail
+            for idx in np.flatnonzero(values_fail).tolist():
+                values_invalid_pixels[idx][prefix + format(int(field_values[idx]), '0{0}b'.format(width))] += 1
+        return values_pass, values_invalid_pixels
+
+    def decode(self, qc_raster):
+        """Decode the raster of the quality control band in planes of bit
+        fields (uint8), for the fields of each band one plane for each
+        band. The quality control bands of ranges (angles) are not decoded
+        and saved as the original values.
+
+        :param qc_raster: raster of the quality control band
+        :type qc_raster: ndarray
+        :return: planes by name
+        :rtype: dict
+        """
+        if isinstance(self.layout, RangeLayout):
+            return {self.id_name: qc_raster}
+        n_bands = max([field.n_bands for field in self.layout.fields] + [1])
+        planes = {}
+        for band in range(1, n_bands + 1):
+            for plane_name, prefix, shift, width in get_fields(self.layout, band):
+                if plane_name not in planes:
+                    planes[plane_name] = ((qc_raster >> shift) & (2**width - 1)).astype(np.uint8)
+        return planes
+
+    def check_planes(self, planes, band, qcf):
+        """Check the planes of the quality control band (block of pixels to
+        check), each field is checked with the table of pass or not pass for
+        each value of the field in the block.
+
+        :param planes: pixels to check of the planes by name
+        :type planes: dict
+        :param band: band of data to process
+        :type band: int
+        :param qcf: quality control file
+        :type qcf: configparse
+        :return: for each field the value of the pixels, pass or not pass for
+            each value and the invalid flags of each value
+        :rtype: list
+        """
+        if isinstance(self.layout, RangeLayout):
+            qc_values, qc_inverse = np.unique(planes[self.id_name], return_inverse=True)
+            values_pass, values_invalid_pixels = self.check_range(qc_values, qcf)
+            return [(qc_inverse.ravel(), values_pass, values_invalid_pixels)]
+
+        checks = []
+        for plane_name, prefix, shift, width in get_fields(self.layout, band):
+            plane = planes[plane_name]
+            values = np.flatnonzero(np.bincount(plane, minlength=2**width)).tolist()
+            values_pass = self.get_table(prefix, width, values, qcf)
+            values_invalid_pixels = [Counter() for _ in range(2**width)]
+            for value in values:
+                if not values_pass[value]:
+                    values_invalid_pixels[value][prefix + format(value, '0{0}b'.format(width))] += 1
+            checks.append((plane, values_pass, values_invalid_pixels))
+        return checks
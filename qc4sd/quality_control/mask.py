@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from qc4sd.cache import file_identity
+from qc4sd.subset import Window
+from qc4sd.quality_control.zones import ZONES_NODATA, get_grid, rasterize, save_array
+
+
+class Mask:
+    """Exclusion mask of the pixels to process (i.e. land, area of interest or
+    forest/non-forest baseline), from a raster or a vector layer of polygons.
+    The pixels inside the polygons or with values different to zero (and to
+    the NoData of the raster) are processed, the pixels outside of the mask
+    are set to NoData without check the quality control. The mask is aligned
+    (rasterized or resampled) once for each grid of the data band (tile and
+    resolution) and cached in files.
+    """
+
+    def __init__(self, mask_file, cache_dir=None):
+        if not os.path.isfile(mask_file):
+            raise FileNotFoundError("The mask file {0} not exist.".format(mask_file))
+        self.mask_file = mask_file
+        # without cache dir the masks are saved in a temporal dir for this run
+        self.temporal_cache = cache_dir is None
+        self.cache_dir = tempfile.mkdtemp() if cache_dir is None else cache_dir
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # masks loaded for each grid
+        self.grids = {}
+
+    def get(self, sd, band):
+        """Return the mask (memmap of bool) in the grid of the data band of
+        the satellite data, True for the pixels to process.
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :param band: band to process
+        :type band: int
+        :rtype: ndarray
+        """
+        geotransform, projection, cols, rows = get_grid(sd, band)
+        grid = [file_identity(self.mask_file), 'mask', repr(geotransform), projection, str(cols), str(rows)]
+        key = hashlib.sha1('|'.join(grid).encode('utf-8')).hexdigest()
+        if key in self.grids:
+            return self.grids[key]
+
+        mask_file = os.path.join(self.cache_dir, 'mask_' + key + '.npy')
+        if not os.path.isfile(mask_file):
+            mask_raster = rasterize(self.mask_file, geotransform, projection, cols, rows, burn_value=1)
+            save_array((mask_raster != ZONES_NODATA) & (mask_raster != 0), mask_file)
+            del mask_raster
+
+        self.grids[key] = np.load(mask_file, mmap_mode='r')
+        return self.grids[key]
+
+    def close(self):
+        """Delete the masks of the temporal cache
+        """
+        self.grids = {}
+        if self.temporal_cache:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def get_mask_window(mask_raster, window=None):
+    """Return the window (in pixels of the data band) of the bounding box
+    of the pixels to process of the mask, inside of the window to process,
+    or None if the mask has not pixels to process.
+
+    :param mask_raster: mask of the data band (or of the window)
+    :type mask_raster: ndarray
+    :param window: window of the mask raster in the data band, None for all
+    :type window: Window
+    :rtype: Window
+    """
+    rows = np.flatnonzero(mask_raster.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask_raster.any(axis=0))
+    xoff, yoff = (window.xoff, window.yoff) if window is not None else (0, 0)
+    return Window(xoff + int(cols[0]), yoff + int(rows[0]),
+                  int(cols[-1] - cols[0]) + 1, int(rows[-1] - rows[0]) + 1)
+
+
+def get_mask_windows(mask_raster, x_chunks, window=None):
+    """Return the window (see get_mask_window) of the pixels to process of
+    the mask in each chunk of rows, or None for the chunks without pixels
+    to process, these chunks are not read nor checked.
+
+    :param mask_raster: mask of the data band (or of the window)
+    :type mask_raster: ndarray
+    :param x_chunks: chunks of rows of the mask raster
+    :type x_chunks: list
+    :param window: window of the mask raster in the data band, None for all
+    :type window: Window
+    :rtype: list
+    """
+    xoff, yoff = (window.xoff, window.yoff) if window is not None else (0, 0)
+    return [get_mask_window(mask_raster[x_chunk.start:x_chunk.stop],
+                            Window(xoff, yoff + x_chunk.start, mask_raster.shape[1], len(x_chunk)))
+            for x_chunk in x_chunks]
@@ -5,231 +5,237 @@
 #  Authors: Xavier Corredor Llano
 #  Email: xcorredorl at ideam.gov.co
 
+import numpy as np
 try:
     from osgeo import gdal
 except ImportError:
     import gdal
 
-from qc4sd.quality_control.modis import mxd09a1, mxd09q1, mxd09ga, mxd09gq
+from qc4sd.quality_control.modis.products import get_product
 
 
 class ModisQC:
     """Quality control class for MODIS files. One instance represent
     one band of quality control for specific type of MODIS products.
     Each type of MODIS products has different bands of quality control
-    and rules for check the quality control for one pixel.
+    and rules for check the quality control, the rules are generated
+    from the layout of each quality control band (see flags).
     """
 
-    def __init__(self, sd_shortname, id_name, qc_name, num_bits=None, scale_resolution=1):
+    def __init__(self, sd_shortname, id_name, qc_name, scale_resolution=1):
         self.sd_shortname = sd_shortname
         self.id_name = id_name
         self.qc_name = qc_name
-        self.num_bits = num_bits
         # scale_resolution is the different resolution between quality control band and
         # the data band, 0.5 mean that data band is the double resolution of qc band
         self.scale_resolution = scale_resolution
-        # get raster for quality control band
+        # raster for quality control band, it is loaded only when the
+        # file is processed and released after that (see load/release)
+        self.quality_control_raster = None
+        # window of the data band to process (xoff, yoff, xsize, ysize) or None for
+        # all, and offset (rows, cols) of the block read of the quality control band
+        self.window = None
+        self.raster_offset = (0, 0)
+
+        # the product, the full name and the kernel (rules) of this quality control
+        # band are resolved once in the registry of products (see products)
+        product = get_product(self.sd_shortname)
+        qc_band = product.qc_bands[self.id_name]
+        self.section = product.section
+        self.full_name = qc_band.full_name
+        self.full_range = qc_band.full_range
+        self.kernel = product.get_kernel(self.id_name)
+
+    def load(self, read_window=None, read_windows=None):
+        """Read the raster of the quality control band in memory, only
+        the block that covers the window of the data band if it is set
+
+        :param read_window: window of the data band to read (inside of the window
+            to process, i.e. the pixels to process of the mask), None for the window
+        :type read_window: Window
+        :param read_windows: windows inside of the read window (i.e. the pixels
+            to process of the mask in each chunk), only these windows are read, the
+            rest of the block is zero (not read nor resident in memory), None for
+            read all the block, the windows None are skipped
+        :type read_windows: list
+        """
+        if read_window is None:
+            read_window = self.window
+        if self.quality_control_raster is None:
+            gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
+            if read_window is None:
+                self.raster_offset = (0, 0)
+                self.quality_control_raster = gdal_dataset_qc.ReadAsArray()
+            else:
+                # the window at the resolution of the quality control band
+                qc_xoff, qc_yoff, qc_xsize, qc_ysize = self.get_qc_window(read_window)
+                self.raster_offset = (qc_yoff, qc_xoff)
+                if read_windows is None:
+                    self.quality_control_raster = gdal_dataset_qc.ReadAsArray(qc_xoff, qc_yoff, qc_xsize, qc_ysize)
+                else:
+                    for window in read_windows:
+                        if window is None:
+                            continue
+                        xoff, yoff, xsize, ysize = self.get_qc_window(window)
+                        block = gdal_dataset_qc.ReadAsArray(xoff, yoff, xsize, ysize)
+                        if self.quality_control_raster is None:
+                            self.quality_control_raster = np.zeros((qc_ysize, qc_xsize), dtype=block.dtype)
+                        self.quality_control_raster[yoff - qc_yoff:yoff - qc_yoff + ysize,
+                                                    xoff - qc_xoff:xoff - qc_xoff + xsize] = block
+                        del block
+            del gdal_dataset_qc
+
+    def get_qc_window(self, window):
+        """Return the window of the data band at the resolution of the
+        quality control band, as (xoff, yoff, xsize, ysize)
+
+        :param window: window of the data band
+        :type window: Window
+        :rtype: tuple
+        """
+        xoff, yoff, xsize, ysize = window
+        qc_xoff = int(xoff * self.scale_resolution)
+        qc_yoff = int(yoff * self.scale_resolution)
+        qc_xsize = int((xoff + xsize - 1) * self.scale_resolution) + 1 - qc_xoff
+        qc_ysize = int((yoff + ysize - 1) * self.scale_resolution) + 1 - qc_yoff
+        return qc_xoff, qc_yoff, qc_xsize, qc_ysize
+
+    def release(self):
+        """Free the memory of the raster of the quality control band
+        """
+        self.quality_control_raster = None
+
+    def get_nbytes(self):
+        """Return the size in bytes of the raster of the quality control
+        band, based on its shape and data type, without read it
+
+        :rtype: int
+        """
         gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
-        self.quality_control_raster = gdal_dataset_qc.ReadAsArray()
-        del gdal_dataset_qc
-        # statistics for invalid pixel in respective field
-        self.invalid_pixels = {}
-        # this quality band need to be check
-        self.need_check = True
-
-        # [MXD09A1] ########################################################
-        # for MOD09A1 and MYD09A1 (Collection 6)
-        if self.sd_shortname in ['MOD09A1', 'MYD09A1']:
-
-            # set the full name for this quality control band
-            if self.id_name == 'rbq': self.full_name = 'Reflectance Band Quality'
-            if self.id_name == 'sza': self.full_name = 'Solar Zenith Angle'
-            if self.id_name == 'vza': self.full_name = 'View/Sensor Zenith Angle'
-            if self.id_name == 'rza': self.full_name = 'Relative Zenith Angle'
-            if self.id_name == 'sf':  self.full_name = 'Reflectance State QA flags'
-
-        # [MXD09Q1] ########################################################
-        # for MOD09Q1 and MYD09Q1 (Collection 6)
-        if self.sd_shortname in ['MOD09Q1', 'MYD09Q1']:
-
-            # set the full name for this quality control band
-            if self.id_name == 'sf':  self.full_name = 'Reflectance State QA flags'
-            if self.id_name == 'rbq': self.full_name = 'Reflectance Band Quality'
-
-        # [MXD09GA] ########################################################
-        # for MOD09GA and MYD09GA (Collection 6)
-        if self.sd_shortname in ['MOD09GA', 'MYD09GA']:
-
-            # set the full name for this quality control band
-            if self.id_name == 'rbq': self.full_name = 'Reflectance Band Quality'
-            if self.id_name == 'sf':  self.full_name = 'Reflectance State QA flags'
-            if self.id_name == 'sza': self.full_name = 'Solar Zenith Angle'
-            if self.id_name == 'vza': self.full_name = 'View/Sensor Zenith Angle'
-
-        # [MXD09GQ] ########################################################
-        # for MOD09GQ and MYD09GQ (Collection 6)
-        if self.sd_shortname in ['MOD09GQ', 'MYD09GQ']:
-
-            # set the full name for this quality control band
-            if self.id_name == 'rbq': self.full_name = 'Reflectance Band Quality'
-            if self.id_name == 'sf':  self.full_name = 'Reflectance State QA flags'
-            if self.id_name == 'sza': self.full_name = 'Solar Zenith Angle'
-            if self.id_name == 'vza': self.full_name = 'View/Sensor Zenith Angle'
-
-    def init_statistics(self, qcf):
-        """Configure and initialize statistics values. This need to be
-        called for restart statistics for process quality control check
-        for each new satellite data.
+        gdal_band_qc = gdal_dataset_qc.GetRasterBand(1)
+        nbytes = gdal_dataset_qc.RasterXSize * gdal_dataset_qc.RasterYSize * \
+            gdal.GetDataTypeSize(gdal_band_qc.DataType) // 8
+        del gdal_band_qc, gdal_dataset_qc
+        return nbytes
+
+    def get_check_settings(self, qcf):
+        """Return the statistics of invalid pixels initialized (zero count
+        for each item of this quality control band in the quality control
+        file) and if this quality control band need to be checked with the
+        quality control file. They are kept by the quality control of each
+        quality control file (see QualityControl), not in this instance that
+        is shared by all the quality control files of the parameter sweep.
 
         :param qcf: quality control file
         :type qcf: configparse
+        :return: invalid pixels by item and need check
+        :rtype: tuple
         """
-        # [MXD09A1] ########################################################
-        # for MOD09A1 and MYD09A1
-        if self.sd_shortname in ['MOD09A1', 'MYD09A1']:
-
-            # create and init the statistics fields dictionary to zero count value,
-            # for specific quality control band (id_name) that belonging this instance
-            keys_from_qcf = list(qcf['MXD09A1'].keys())
-            self.invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name+'_'))
-
-            # verification if this quality band type need to check:
-            # if all items of this qc type in qcf are True, this means
-            # that this qc don't need to be check, all pass this qc
-            single_qcf_values = set([v for k,v in qcf['MXD09A1'].items() if k.startswith(self.id_name+'_')])
-            if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
-                self.need_check = False
-            if self.id_name == 'sza' or self.id_name == 'vza':
-                if qcf.getint('MXD09A1', self.id_name+'_min') == 0 and qcf.getint('MXD09A1', self.id_name+'_max') == 180:
-                    self.need_check = False
-            if self.id_name == 'rza':
-                if qcf.getint('MXD09A1', self.id_name+'_min') == -180 and qcf.getint('MXD09A1', self.id_name+'_max') == 180:
-                    self.need_check = False
-
-        # [MXD09Q1] ########################################################
-        # for MOD09Q1 and MYD09Q1
-        if self.sd_shortname in ['MOD09Q1', 'MYD09Q1']:
-
-            # create and init the statistics fields dictionary to zero count value,
-            # for specific quality control band (id_name) that belonging this instance
-            keys_from_qcf = list(qcf['MXD09Q1'].keys())
-            self.invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name+'_'))
-
-            # verification if this quality band type need to check:
-            # if all items of this qc type in qcf are True, this means
-            # that this qc don't need to be check, all pass this qc
-            single_qcf_values = set([v for k,v in qcf['MXD09Q1'].items() if k.startswith(self.id_name+'_')])
-            if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
-                self.need_check = False
-
-        # [MXD09GA] ########################################################
-        # for MOD09GA and MYD09GA
-        if self.sd_shortname in ['MOD09GA', 'MYD09GA']:
-
-            # create and init the statistics fields dictionary to zero count value,
-            # for specific quality control band (id_name) that belonging this instance
-            keys_from_qcf = list(qcf['MXD09GA'].keys())
-            self.invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name+'_'))
-
-            # verification if this quality band type need to check:
-            # if all items of this qc type in qcf are True, this means
-            # that this qc don't need to be check, all pass this qc
-            single_qcf_values = set([v for k,v in qcf['MXD09GA'].items() if k.startswith(self.id_name+'_')])
-            if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
-                self.need_check = False
-            if self.id_name == 'sza' or self.id_name == 'vza':
-                if qcf.getint('MXD09GA', self.id_name + '_min') == 0 and qcf.getint('MXD09GA', self.id_name + '_max') == 180:
-                    self.need_check = False
-
-        # [MXD09GQ] ########################################################
-        # for MOD09GQ and MYD09GQ
-        if self.sd_shortname in ['MOD09GQ', 'MYD09GQ']:
-
-            # create and init the statistics fields dictionary to zero count value,
-            # for specific quality control band (id_name) that belonging this instance
-            keys_from_qcf = list(qcf['MXD09GQ'].keys())
-            self.invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name + '_'))
-
-            # verification if this quality band type need to check:
-            # if all items of this qc type in qcf are True, this means
-            # that this qc don't need to be check, all pass this qc
-            single_qcf_values = set([v for k, v in qcf['MXD09GQ'].items() if k.startswith(self.id_name + '_')])
-            if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
-                self.need_check = False
-
-    def quality_control_check(self, x, y, band, qcf, with_stats):
-        """Check if the specific pixel in x and y position pass or not
-        pass all quality controls, this is evaluate with the quality
-        control value for the respective pixel position. The quality
-        controls is evaluate based on the quality control file.
-
-        :param x: raster position in x for the pixel
-        :type x: int
-        :param y: raster position in y for the pixel
-        :type y: int
+        # create and init the statistics fields dictionary to zero count value,
+        # for specific quality control band (id_name) that belonging this instance
+        keys_from_qcf = list(qcf[self.section].keys())
+        invalid_pixels = dict((k, 0) for k in keys_from_qcf if k.startswith(self.id_name+'_'))
+
+        # verification if this quality band type need to check:
+        # if all items of this qc type in qcf are True, this means
+        # that this qc don't need to be check, all pass this qc
+        need_check = True
+        single_qcf_values = set([v for k, v in qcf[self.section].items() if k.startswith(self.id_name+'_')])
+        if len(single_qcf_values) == 1 and single_qcf_values.pop() == 'true':
+            need_check = False
+        # the angles with the range of all values pass all pixels
+        if self.full_range is not None:
+            if (qcf.getint(self.section, self.id_name+'_min'),
+                    qcf.getint(self.section, self.id_name+'_max')) == self.full_range:
+                need_check = False
+        return invalid_pixels, need_check
+
+    def decode_flags(self):
+        """Return the quality control band decoded in planes of bit
+        fields (uint8) by name, see the layout module. The planes are of all
+        tile without the window to process, they are cached for all windows.
+
+        :rtype: dict
+        """
+        gdal_dataset_qc = gdal.Open(self.qc_name, gdal.GA_ReadOnly)
+        qc_raster = gdal_dataset_qc.ReadAsArray()
+        del gdal_dataset_qc
+        return self.kernel.decode(qc_raster)
+
+    def get_block(self, rows, cols, raster=None):
+        """Return the values of the quality control band (or the plane of
+        it) for the block of rows of the data band, the positions of the data
+        band (in the window) are mapped to the resolution of the quality
+        control band. The positions outside of the block read (masked
+        pixels) get the values of the nearest edge of the block.
+
+        :param rows: rows of the data band (in the window)
+        :type rows: range
+        :param cols: number of columns of the data band (in the window)
+        :type cols: int
+        :param raster: raster of all tile at the resolution of the quality control
+            band, by default the raster (block read) of the quality control band
+        :type raster: ndarray
+        :rtype: ndarray
+        """
+        if raster is None:
+            raster = self.quality_control_raster
+            offset_y, offset_x = self.raster_offset
+        else:
+            offset_y, offset_x = 0, 0
+        window_y, window_x = (self.window.yoff, self.window.xoff) if self.window is not None else (0, 0)
+        row_start, col_start = rows.start + window_y - offset_y, window_x - offset_x
+        if self.scale_resolution == 1 and row_start >= 0 and col_start >= 0 and \
+                row_start + len(rows) <= raster.shape[0] and col_start + cols <= raster.shape[1]:
+            return raster[row_start:row_start + len(rows), col_start:col_start + cols]
+        qc_rows = ((np.arange(rows.start, rows.stop) + window_y) * self.scale_resolution).astype(int) - offset_y
+        qc_cols = ((np.arange(cols) + window_x) * self.scale_resolution).astype(int) - offset_x
+        return raster[np.ix_(np.clip(qc_rows, 0, raster.shape[0] - 1), np.clip(qc_cols, 0, raster.shape[1] - 1))]
+
+    def read_block(self, rows, cols, pixels_to_check, planes=None):
+        """Read the pixels to check in the block of rows of the data band,
+        as the distinct values of the quality control band and the index of
+        the value of each pixel or, if the planes of bit fields are given,
+        as the values of the planes for each pixel.
+
+        :param rows: rows of the data band
+        :type rows: range
+        :param cols: number of columns of the data band
+        :type cols: int
+        :param pixels_to_check: pixels to check in the block
+        :type pixels_to_check: ndarray
+        :param planes: planes of bit fields of this quality control band (see decode_flags)
+        :type planes: dict
+        :return: block to check (see check_block)
+        :rtype: tuple or dict
+        """
+        if planes is not None:
+            return dict((plane_name, self.get_block(rows, cols, plane)[pixels_to_check])
+                        for plane_name, plane in planes.items())
+        return np.unique(self.get_block(rows, cols)[pixels_to_check], return_inverse=True)
+
+    def check_block(self, block, band, qcf, with_stats):
+        """Check the pixels of the block read, the bit fields of each distinct
+        value of the quality control band (or of the planes of bit fields) are
+        checked with the table of pass or not pass for each value of the field,
+        see the kernel of the layout module. The same block can be checked
+        with several quality control files.
+
+        :param block: block read (see read_block)
+        :type block: tuple or dict
         :param band: band of data to process
         :type band: int
         :param qcf: quality control file
-        :type qcf:
-        :return: check list
-        :rtype: dict
-        :param with_stats: make graphic stats of invalid pixels
+        :type qcf: configparse
+        :param with_stats: count the invalid flags of each value
         :type with_stats: bool
+        :return: for each check the index of the value of each pixel to check,
+            pass or not pass for each value and the invalid flags of each value
+        :rtype: list
         """
-        # pass the qc if this quality band don't need to be check
-        if self.need_check is False:
-            return True
-
-        # apply the scale factor resolution different between data and qc
-        qc_x = int(x * self.scale_resolution)
-        qc_y = int(y * self.scale_resolution)
-
-        # get the pixel value for specific band of quality control
-        qc_pixel_value = self.quality_control_raster.item((qc_x, qc_y))
-
-        # [MXD09A1] ########################################################
-        # for MOD09A1 and MYD09A1 (Collection 6)
-        if self.sd_shortname in ['MOD09A1', 'MYD09A1']:
-            # switch case for quality control band
-            quality_control_band = {
-                'rbq': mxd09a1.rbq,
-                'sza': mxd09a1.sza,
-                'vza': mxd09a1.vza,
-                'rza': mxd09a1.rza,
-                'sf': mxd09a1.sf,
-            }
-            return quality_control_band[self.id_name](self, qcf, band, qc_pixel_value, with_stats)
-
-        # [MXD09Q1] ########################################################
-        # for MOD09Q1 and MYD09Q1 (Collection 6)
-        if self.sd_shortname in ['MOD09Q1', 'MYD09Q1']:
-            # switch case for quality control band
-            quality_control_band = {
-                'sf': mxd09q1.sf,
-                'rbq': mxd09q1.rbq,
-            }
-            return quality_control_band[self.id_name](self, qcf, band, qc_pixel_value, with_stats)
-
-        # [MXD09GA] ########################################################
-        # for MOD09GA and MYD09GA (Collection 6)
-        if self.sd_shortname in ['MOD09GA', 'MYD09GA']:
-            # switch case for quality control band
-            quality_control_band = {
-                'rbq': mxd09ga.rbq,
-                'sf': mxd09ga.sf,
-                'sza': mxd09ga.sza,
-                'vza': mxd09ga.vza,
-            }
-            return quality_control_band[self.id_name](self, qcf, band, qc_pixel_value, with_stats)
-
-        # [MXD09GQ] ########################################################
-        # for MOD09GQ and MYD09GQ (Collection 6)
-        if self.sd_shortname in ['MOD09GQ', 'MYD09GQ']:
-            # switch case for quality control band
-            quality_control_band = {
-                'rbq': mxd09gq.rbq,
-                'sf': mxd09gq.sf,
-                'sza': mxd09gq.sza,
-                'vza': mxd09gq.vza,
-            }
-            return quality_control_band[self.id_name](self, qcf, band, qc_pixel_value, with_stats)
\ No newline at end of file
+        if isinstance(block, dict):
+            return self.kernel.check_planes(block, band, qcf)
+
+        qc_values, qc_inverse = block
+        values_pass, values_invalid_pixels = self.kernel.check_values(qc_values, band, qcf)
+        return [(qc_inverse.ravel(), values_pass, values_invalid_pixels)]
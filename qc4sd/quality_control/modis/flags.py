@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from qc4sd.quality_control.layout import Field, BitLayout, RangeLayout
+
+# Layouts of the quality control bands of MODIS, the kernels (rules) of each
+# quality control band are generated from the layout (see layout module). The
+# offsets of the fields are counted from the most significant bit like the
+# binary strings of the original rules of MODIS.
+
+# Reflectance State QA flags (sf), the same for all products
+SF_LAYOUT = BitLayout(16, [
+    Field('sf_cloud_state_', 0, 2), Field('sf_cloud_shadow_', 2, 1), Field('sf_land_water_', 3, 3),
+    Field('sf_aerosol_quantity_', 6, 2), Field('sf_cirrus_detected_', 8, 2),
+    Field('sf_internal_cloud_algorithm_', 10, 1), Field('sf_internal_fire_algorithm_', 11, 1),
+    Field('sf_mod35_snow_ice_', 12, 1), Field('sf_pixel_adjacent_to_cloud_', 13, 1),
+    Field('sf_salt_pan_', 14, 1), Field('sf_internal_snow_mask_', 15, 1)], msb_first=True)
+
+# Reflectance Band Quality (rbq) of 500m (32 bits) with the data quality of the bands 1 to 7
+RBQ_500M_LAYOUT = BitLayout(32, [
+    Field('rbq_modland_qa_', 0, 2), Field('rbq_data_quality_', 2, 4, band_stride=4, n_bands=7),
+    Field('rbq_atcorr_', 30, 1), Field('rbq_adjcorr_', 31, 1)], msb_first=True)
+
+# Reflectance Band Quality (rbq) of 250m (16 bits) with the data quality of the bands 1 and 2
+RBQ_250M_FIELDS = [
+    Field('rbq_modland_qa_', 0, 2), Field('rbq_data_quality_', 4, 4, band_stride=4, n_bands=2),
+    Field('rbq_atcorr_', 12, 1), Field('rbq_adjcorr_', 13, 1)]
+
+# the angles (sza, vza, rza) in hundredths of degree
+ANGLE_LAYOUT = RangeLayout(0.01)
+
+# layouts for each product (section in the quality control file) and quality control band
+LAYOUTS = {
+    'MXD09A1': {'rbq': RBQ_500M_LAYOUT, 'sf': SF_LAYOUT,
+                'sza': ANGLE_LAYOUT, 'vza': ANGLE_LAYOUT, 'rza': ANGLE_LAYOUT},
+    'MXD09Q1': {'rbq': BitLayout(16, RBQ_250M_FIELDS + [Field('rbq_difforbit_', 14, 1)], msb_first=True),
+                'sf': SF_LAYOUT},
+    'MXD09GA': {'rbq': RBQ_500M_LAYOUT, 'sf': SF_LAYOUT,
+                'sza': ANGLE_LAYOUT, 'vza': ANGLE_LAYOUT},
+    'MXD09GQ': {'rbq': BitLayout(16, RBQ_250M_FIELDS, msb_first=True), 'sf': SF_LAYOUT,
+                'sza': ANGLE_LAYOUT, 'vza': ANGLE_LAYOUT},
+}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from collections import namedtuple
+
+from qc4sd.quality_control.layout import Kernel
+from qc4sd.quality_control.modis.flags import LAYOUTS
+
+# Quality control band of one product: the id name, the full name, the pattern of
+# the name of the subdataset, the scale of the resolution against the data band,
+# the range of the angles that pass all the pixels (this band don't need to be
+# check) and the product of the file with the subdataset if it is not the same
+# file (i.e. MXD09GA for MXD09GQ). The bit fields are in the layouts (see flags).
+QcBand = namedtuple('QcBand', ['id_name', 'full_name', 'pattern', 'scale_resolution', 'full_range', 'source'])
+QcBand.__new__.__defaults__ = (1, None, None)
+
+
+class Product:
+    """MODIS product registered: the section in the quality control file,
+    the short names of the product (Terra and Aqua) and the quality control
+    bands, the kernels (rules) of each quality control band are generated
+    from its layout (see flags).
+    """
+
+    def __init__(self, section, shortnames, qc_bands):
+        self.section = section
+        self.shortnames = shortnames
+        self.qc_bands = dict((qc_band.id_name, qc_band) for qc_band in qc_bands)
+
+    def get_kernel(self, id_name):
+        """Return the kernel of the quality control for the quality
+        control band of this product, generated from its layout
+
+        :param id_name: id name of the quality control band
+        :type id_name: str
+        :rtype: Kernel
+        """
+        return Kernel(self.section, id_name, LAYOUTS[self.section][id_name])
+
+
+# registry of the products by short name
+PRODUCTS = {}
+
+
+def register(product):
+    """Register the product for all its short names
+
+    :param product: product to register
+    :type product: Product
+    """
+    for shortname in product.shortnames:
+        PRODUCTS[shortname] = product
+
+
+def get_product(shortname):
+    """Return the product registered for the short name
+
+    :param shortname: short name of the product, i.e. MOD09A1
+    :type shortname: str
+    :rtype: Product
+    """
+    if shortname not in PRODUCTS:
+        raise NotImplementedError("Product {0} not implemented or not supported".format(shortname))
+    return PRODUCTS[shortname]
+
+
+# [MXD09A1] ########################################################
+# for MOD09A1 and MYD09A1 (Collection 6)
+register(Product('MXD09A1', ['MOD09A1', 'MYD09A1'], [
+    QcBand('rbq', 'Reflectance Band Quality', '_qc_'),
+    QcBand('sza', 'Solar Zenith Angle', 'szen', full_range=(0, 180)),
+    QcBand('vza', 'View/Sensor Zenith Angle', 'vzen', full_range=(0, 180)),
+    QcBand('rza', 'Relative Zenith Angle', 'raz', full_range=(-180, 180)),
+    QcBand('sf', 'Reflectance State QA flags', '_state_')]))
+
+# [MXD09Q1] ########################################################
+# for MOD09Q1 and MYD09Q1 (Collection 6)
+register(Product('MXD09Q1', ['MOD09Q1', 'MYD09Q1'], [
+    QcBand('sf', 'Reflectance State QA flags', '_state_'),
+    QcBand('rbq', 'Reflectance Band Quality', '_qc_')]))
+
+# [MXD09GA] ########################################################
+# for MOD09GA and MYD09GA (Collection 6), the angles and state at 1km
+register(Product('MXD09GA', ['MOD09GA', 'MYD09GA'], [
+    QcBand('rbq', 'Reflectance Band Quality', 'QC_500m'),
+    QcBand('sf', 'Reflectance State QA flags', 'state_1km', scale_resolution=0.5),
+    QcBand('sza', 'Solar Zenith Angle', 'SolarZenith', scale_resolution=0.5, full_range=(0, 180)),
+    QcBand('vza', 'View/Sensor Zenith Angle', 'SensorZenith', scale_resolution=0.5, full_range=(0, 180))]))
+
+# [MXD09GQ] ########################################################
+# for MOD09GQ and MYD09GQ (Collection 6), the angles and state at 1km
+# are read from the MXD09GA file of the same date
+register(Product('MXD09GQ', ['MOD09GQ', 'MYD09GQ'], [
+    QcBand('rbq', 'Reflectance Band Quality', 'QC_250m'),
+    QcBand('sf', 'Reflectance State QA flags', 'state_1km', scale_resolution=0.25, source='MXD09GA'),
+    QcBand('sza', 'Solar Zenith Angle', 'SolarZenith', scale_resolution=0.25, source='MXD09GA'),
+    QcBand('vza', 'View/Sensor Zenith Angle', 'SensorZenith', scale_resolution=0.25, source='MXD09GA')]))
@@ -7,451 +7,876 @@
 
 import os
 import gc
+import time
 import tempfile
 import osr
-import resource
 import shutil
-from joblib import Parallel, delayed
+import numpy as np
+from collections import Counter, namedtuple
+from joblib import delayed
 from joblib import load, dump
-from subprocess import call
-from copy import deepcopy
-from math import ceil, floor, isnan
 try:
     from osgeo import gdal
 except ImportError:
     import gdal
 
-gdal.PushErrorHandler('CPLQuietErrorHandler')  # quiet the gdal warnings/errors messages
-
-from qc4sd.lib import fix_zeros, chunks, merge_dicts, repulsive_items_list
-from qc4sd.satellite_data.satellite_data import SatelliteData
+from qc4sd.lib import fix_zeros, chunks, merge_dicts
+from qc4sd.scheduler import default_rows_per_chunk
+from qc4sd.quality_control.statistics import write_statistics, read_statistics, plot_statistics, write_disagreement
+from qc4sd.quality_control.summary import Summary
+from qc4sd.quality_control.composite import Composite, read_band
+from qc4sd.quality_control.zones import merge_zonal_statistics, write_zonal_statistics
+from qc4sd.quality_control.mask import get_mask_window, get_mask_windows
+from qc4sd.quality_control.writer import OUTPUT_OPTIONS, write_vrt, read_vrt_bands
+from qc4sd.subset import Window, get_geotransform
+from qc4sd.profiler import NO_PROFILER
+
+# result of the quality control of one file (granule) for one band: the file, the
+# band, the date (year and jday), the name of the variant of the parameter sweep
+# (None without it), the raster checked (memmap), its NoData value and the
+# statistics of invalid pixels (None without statistics)
+GranuleResult = namedtuple('GranuleResult', ['file', 'band', 'date', 'variant', 'raster', 'nodata_value',
+                                             'statistics'])
 
 
 class QualityControl:
-    """Process the quality control for all input file for one
-    band with the quality control settings based on quality control
-    file.
+    """Process the quality control for all input file of one group
+    (same platform, product and tile) for one band with the quality
+    control settings based on quality control file.
     """
-    # save all instances
-    list = []
 
-    def __init__(self, quality_control_file, band, with_stats, number_of_processes):
-        QualityControl.list.append(self)
+    def __init__(self, quality_control_file, band, sd_list, with_stats, number_of_processes, memory_budget=None,
+                 result_cache=None, with_summary=False, zones=None, flag_cache=None, variant_name=None,
+                 subset=None, mask=None, profiler=None, output_layout='stack', writer=None,
+                 composite=None, composite_period='month'):
         self.band = band
         self.band_name = 'band'+fix_zeros(band, 2)
 
+        # satellite data to process sorted chronologically (group of same platform, product and tile)
+        self.sd_list = sd_list
+        self.shortname = sd_list[0].shortname
+        self.tile = sd_list[0].tile
+        # window in pixels of the data band to process (Window) or None for all the tile
+        self.window = subset.get_window(sd_list[0], band) if subset is not None else None
+
         self.qcf = quality_control_file
         self.with_stats = with_stats
         self.number_of_processes = number_of_processes
+        # admission control for the memory (MemoryBudget) or None for unlimited
+        self.memory_budget = memory_budget
+        # cache of the results for each file (ResultCache) or None for disable it
+        self.result_cache = result_cache
+        # cache of the quality control bands decoded in planes (FlagCache) or None for disable it
+        self.flag_cache = flag_cache
+        self.flag_planes = None
+        # per pixel summary of valid observations (Summary), it is created in process
+        self.with_summary = with_summary
+        self.summary = None
+        self.rebuild_summary = False
+        # methods of the composites of the valid pixels for each period (Composite)
+        # or None, the composites are created in process
+        self.composite_methods = composite
+        self.composite_period = composite_period
+        self.composite = None
+        # zones for the statistics of invalid pixels by zone (Zones) or None
+        self.zones = zones
+        self.zones_raster = None
+        self.zones_labels = None
+        # exclusion mask of the pixels to process (Mask) or None
+        self.mask = mask
+        self.mask_raster = None
+        # profiler of the stages of the process (Profiler)
+        self.profiler = profiler if profiler is not None else NO_PROFILER
+        # name of the quality control file in the parameter sweep, the variants
+        # (QualityControl) are processed at the same time with this instance
+        self.variant_name = variant_name
+        self.variants = []
+        # bands of the existing output as (date, file, band, NoData value) and its
+        # dates (year and jday), the new dates are appended (incremental mode)
+        self.existing_bands = []
+        self.existing_dates = []
 
         self.qc_check_lists = {}
 
         self.output_driver = None
+        # date (year and jday) and memmap file of each raster checked, or the
+        # file of the date and its NoData value in the dates layout
         self.output_bands = []
-        self.output_filename = "{0}_{1}_band{2}.tif".format(SatelliteData.tile, SatelliteData.shortname, fix_zeros(band, 2))
+        # layout of the output: one file with all dates (stack) or one file per date
+        # written by the writers (DatesWriter) as soon as each date is processed and
+        # a VRT with all dates as bands (dates)
+        self.output_layout = output_layout
+        self.writer = writer
+        self.write_futures = []
+        self.output_properties = None
+        self.output_filename = "{0}_{1}_band{2}.{3}".format(self.tile, self.shortname, fix_zeros(band, 2),
+                                                            'vrt' if output_layout == 'dates' else 'tif')
+        # file of statistics of invalid pixels per date and flag (csv)
+        self.statistics_filename = "{0}_{1}_band{2}_stats.csv".format(self.tile, self.shortname, fix_zeros(band, 2))
+        # file of per pixel summary of valid observations
+        self.summary_filename = "{0}_{1}_band{2}_summary.tif".format(self.tile, self.shortname, fix_zeros(band, 2))
+        # file of statistics of invalid pixels per date, zone and flag (csv)
+        self.zonal_statistics_filename = "{0}_{1}_band{2}_zonal_stats.csv".format(self.tile, self.shortname,
+                                                                                   fix_zeros(band, 2))
+        # file of pixels with different result between each pair of variants (csv)
+        self.disagreement_filename = "{0}_{1}_band{2}_disagreement.csv".format(self.tile, self.shortname,
+                                                                               fix_zeros(band, 2))
 
         if self.with_stats:
             # for save some statistics fields after check the quality control
             self.quality_control_statistics = {}
 
-            # initialize quality control bands class
-            for sd in SatelliteData.list:
-                for qc_id_name, qc_checker in sd.qc_bands.items():
-                    qc_checker.init_statistics(quality_control_file)
+        # statistics of invalid pixels initialized and if it need to be checked, of each
+        # quality control band with the quality control file of this instance, the
+        # quality control bands (checkers) are shared with the variants
+        self.invalid_pixels = {}
+        self.need_check = {}
+        for sd in self.sd_list:
+            for qc_id_name, qc_checker in sd.qc_bands.items():
+                if qc_id_name not in self.need_check:
+                    self.invalid_pixels[qc_id_name], self.need_check[qc_id_name] = \
+                        qc_checker.get_check_settings(quality_control_file)
 
     def __str__(self):
         return self.band_name
 
-    def do_check_qc_by_chunk(self, x_chunk, sd):
-        """Check the quality control for data band pixel per pixel
-        processing it pixels grouped by chunks of rows in multiprocess
+    def __getstate__(self):
+        # the writers and the writes in progress stay in the main process,
+        # they are not sent (pickled) to the workers of the pool
+        state = self.__dict__.copy()
+        state['writer'] = None
+        state['write_futures'] = []
+        return state
+
+    def get_composite_filename(self, method):
+        """Return the name of the file of the composite of the method, the
+        VRT of the files of each period in the dates layout
+
+        :param method: method of the composite
+        :type method: str
+        :rtype: str
         """
-        statistics = {'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}}
-
-        for x in x_chunk:
-            for y, data_band_pixel in enumerate(self.data_band_raster_to_process[x]):
-                # for check a particular frame in the image, only for test
-                # if not (0 < x < 200 and 200 < y < 400):
-                #     continue
-
-                # part 1 mode A
-                #if not (968 < y < 1189 and 1361 < x < 1774):
-                #    continue
-                # part 2 mode A
-                #if not (540 < y < 1041 and 2061 < x < 2367):
-                #    continue
-                # part 3 mode A
-                #if not (745 < y < 1302 and 227 < x < 893):
-                #    continue
-
-                # part 1 mode Q
-                # if not (1938 < y < 2378 and 2723 < x < 3549):
-                #    continue
-                # part 2 mode Q
-                # if not (1082 < y < 2082 and 4124 < x < 4736):
-                #    continue
-                # part 3 mode Q
-                #if not (1492 < y < 2604 and 456 < x < 1788):
-                #    continue
-
-                # GA 1000-1500  1800-2600
-                #if not (1000 < y < 1700 and 600 < x < 1600):
-                #   continue
-                # GQ 1000-1500  1800-2600
-                #if not (500 < y < 2800 and 2000 < x < 3000):
-                #   continue
-
-                # if pixel is not valid then don't check it and save statistic
-                if data_band_pixel == int(self.nodata_value):
-                    if self.with_stats:
-                        statistics['nodata_pixels'] += 1
-                        statistics['total_invalid_pixels'] += 1
-                    continue
+        return "{0}_{1}_band{2}_{3}_{4}.{5}".format(self.tile, self.shortname, fix_zeros(self.band, 2),
+                                                    method, self.composite_period,
+                                                    'vrt' if self.output_layout == 'dates' else 'tif')
 
-                # check pixel with all items of all quality control bands configured
-                pixel_check_list = []
-                for qc_id_name, qc_checker in sd.qc_bands.items():
-                    qcc = qc_checker.quality_control_check(x, y, self.band, self.qcf, self.with_stats)
-                    pixel_check_list.append(qcc)
-                    if self.with_stats:
-                        statistics['invalid_pixels'][qc_checker.full_name] = qc_checker.invalid_pixels
-                    elif qcc is False:
-                        break
+    def get_date_filename(self, date):
+        """Return the name of the output file of the date in the dates layout
 
-                # the pixel pass or not pass the quality control:
-                # check if all validate quality control for this pixel are True
-                pixel_pass_quality_control = not (False in pixel_check_list)
+        :param date: date (year and jday)
+        :type date: str
+        :rtype: str
+        """
+        return "{0}_{1}_band{2}_{3}.tif".format(self.tile, self.shortname, fix_zeros(self.band, 2), date)
 
-                # if the pixel not pass the quality control, replace with NoData value
-                if not pixel_pass_quality_control:
-                    self.data_band_raster_to_process[x][y] = self.nodata_value
-                    if self.with_stats:
-                        statistics['total_invalid_pixels'] += 1
+    def get_output_properties(self):
+        """Return the properties of the output from one of data band, the
+        geotransform (of the window if it is set), the projection and the
+        data type of the data band (i.e. int16 for the reflectance of MODIS
+        and uint16 for the reflectance of Landsat)
 
-        return statistics
+        :rtype: tuple
+        """
+        if self.output_properties is None:
+            gdal_data_band = gdal.Open(self.sd_list[0].get_data_band_name(self.band), gdal.GA_ReadOnly)
+            geotransform = get_geotransform(gdal_data_band.GetGeoTransform(), self.window)
+            outRasterSRS = osr.SpatialReference()
+            outRasterSRS.ImportFromWkt(gdal_data_band.GetProjectionRef())
+            self.output_properties = ((geotransform[0], geotransform[1], 0, geotransform[3], 0, geotransform[5]),
+                                      outRasterSRS.ExportToWkt(), gdal_data_band.GetRasterBand(1).DataType)
+            gdal_data_band = None
+        return self.output_properties
+
+    def get_shape(self, sd):
+        """Return the rows and columns to process of the data band of
+        the satellite data, the size of the window if it is set
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :rtype: tuple
+        """
+        if self.window is not None:
+            return self.window.ysize, self.window.xsize
+        return sd.get_rows(self.band), sd.get_cols(self.band)
+
+    def set_existing_dates(self, output_dir):
+        """Read the bands of the existing output and remove from the
+        files to process the files with dates already processed, for
+        append only the new dates in incremental mode (see get_existing_bands).
+
+        :param output_dir: directory of the output file
+        :type output_dir: path
+        :return: number of new files to process
+        :rtype: int
+        """
+        self.existing_bands = get_existing_bands(os.path.join(output_dir, self.output_filename))
+        if self.existing_bands is None:
+            print("\nWARNING: The file {0} don't exist or has not dates in its metadata, "
+                  "it will be processed with all dates.".format(self.output_filename))
+            self.existing_bands = []
+        self.existing_dates = [date for date, _, _, _ in self.existing_bands]
+        self.sd_list = [sd for sd in self.sd_list if sd.start_year_and_jday not in self.existing_dates]
+        return len(self.sd_list)
+
+    def check_qc_by_chunk(self, x_chunk, sd):
+        """Check the quality control for the chunk of rows, recorded
+        in the profiler (in the worker)
+
+        :return: the result of the check and the seconds of the check
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        with self.profiler.stage('check_qc_chunk', file=sd.file_name, band=self.band,
+                                 rows=[x_chunk.start, x_chunk.stop]):
+            result = self.do_check_qc_by_chunk(x_chunk, sd)
+        return result, time.perf_counter() - start
+
+    def do_check_qc_by_chunk(self, x_chunk, sd):
+        """Check the quality control for data band processing it pixels
+        grouped by chunks of rows in multiprocess. The rules of each quality
+        control band are evaluated once for each distinct value in the chunk
+        (or for each value of the bit fields with the planes of the flag
+        cache) and applied to all pixels with that value, the statistics
+        (by zone if the zones were set) are counted with bincount. In the
+        parameter sweep the blocks are read once and checked with the
+        quality control file of each variant. The pixels outside of the
+        mask are NoData (set before) and are not counted in the statistics,
+        the quality control bands are not read for blocks without valid pixels.
+
+        :return: statistics and zonal statistics for each variant and the
+            pixels with different result between each pair of variants
+        :rtype: tuple
+        """
+        variants = [self] + self.variants
+        statistics = [{'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}} for _ in variants]
+        zonal_statistics = [None for _ in variants]
+        # count the invalid flags for the statistics or the zonal statistics
+        count_flags = self.with_stats or self.zones is not None
+
+        data_band_block = self.data_band_raster_to_process[x_chunk.start:x_chunk.stop]
+        cols = data_band_block.shape[1]
+        # if pixel is not valid then don't check it
+        valid_pixels = data_band_block != int(self.nodata_value)
+        pass_pixels = [valid_pixels.copy() for _ in variants]
+        # pixels inside of the mask, the NoData pixels for the statistics
+        inside_pixels = self.mask_raster[x_chunk.start:x_chunk.stop] if self.mask is not None \
+            else np.ones(data_band_block.shape, dtype=bool)
+        nodata_pixels = inside_pixels & ~valid_pixels
+
+        if self.zones is not None:
+            zones_block = self.zones_raster[x_chunk.start:x_chunk.stop]
+            # the last zone is for the pixels outside of all zones
+            n_zones = len(self.zones_labels) + 1
+            zonal_statistics = [{'total_pixels': np.bincount(zones_block[inside_pixels], minlength=n_zones),
+                                 'nodata_pixels': np.bincount(zones_block[nodata_pixels], minlength=n_zones),
+                                 'invalid_pixels': {}} for _ in variants]
+
+        # check pixels with all items of all quality control bands configured
+        for qc_id_name, qc_checker in sd.qc_bands.items():
+            for variant, qc in enumerate(variants):
+                if self.with_stats:
+                    statistics[variant]['invalid_pixels'][qc_checker.full_name] = Counter(qc.invalid_pixels[qc_id_name])
+                if self.zones is not None:
+                    zonal_statistics[variant]['invalid_pixels'][qc_checker.full_name] = {}
+            # pass the qc if this quality band don't need to be check (for all variants)
+            if not any(qc.need_check[qc_id_name] for qc in variants):
+                continue
+            # the block has not pixels to check (NoData or outside of the mask)
+            if not valid_pixels.any():
+                continue
+
+            # without statistics only check the pixels that pass the previous quality control bands
+            pixels_to_check = valid_pixels if count_flags or self.variants else pass_pixels[0].copy()
+            planes = self.flag_planes[qc_id_name] if self.flag_planes is not None else None
+            block = qc_checker.read_block(x_chunk, cols, pixels_to_check, planes)
+
+            for variant, qc in enumerate(variants):
+                # all pixels pass for the variants that don't need to check this quality band
+                if not qc.need_check[qc_id_name]:
+                    continue
+                checks = qc_checker.check_block(block, self.band, qc.qcf, count_flags)
+                pixels_pass = np.ones(int(pixels_to_check.sum()), dtype=bool)
+                for qc_inverse, values_pass, values_invalid_pixels in checks:
+                    pixels_pass &= values_pass[qc_inverse]
+
+                    if not count_flags:
+                        continue
+                    # count the pixels for each value, and by zone
+                    if self.with_stats:
+                        values_count = np.bincount(qc_inverse, minlength=len(values_pass))
+                        qc_invalid_pixels = statistics[variant]['invalid_pixels'][qc_checker.full_name]
+                        for idx, invalid_pixels in enumerate(values_invalid_pixels):
+                            for flag, count in invalid_pixels.items():
+                                qc_invalid_pixels[flag] += int(values_count[idx]) * count
+                    if self.zones is not None:
+                        values_zones_count = np.bincount(qc_inverse.astype(np.int64) * n_zones + zones_block[pixels_to_check],
+                                                         minlength=len(values_pass) * n_zones).reshape(len(values_pass), n_zones)
+                        qc_zonal_invalid_pixels = zonal_statistics[variant]['invalid_pixels'][qc_checker.full_name]
+                        for idx, invalid_pixels in enumerate(values_invalid_pixels):
+                            for flag, count in invalid_pixels.items():
+                                qc_zonal_invalid_pixels[flag] = \
+                                    qc_zonal_invalid_pixels.get(flag, 0) + values_zones_count[idx] * count
+                pass_pixels[variant][pixels_to_check] &= pixels_pass
+
+        # if the pixel not pass the quality control, replace with NoData value
+        invalid_pixels = [valid_pixels & ~pass_pixels[variant] for variant in range(len(variants))]
+        for variant, qc in enumerate(variants):
+            qc.data_band_raster_to_process[x_chunk.start:x_chunk.stop][invalid_pixels[variant]] = self.nodata_value
 
-    def process(self):
+            if self.with_stats:
+                statistics[variant]['nodata_pixels'] = int(nodata_pixels.sum())
+                statistics[variant]['total_invalid_pixels'] = \
+                    statistics[variant]['nodata_pixels'] + int(invalid_pixels[variant].sum())
+            if self.zones is not None:
+                zonal_statistics[variant]['total_invalid_pixels'] = zonal_statistics[variant]['nodata_pixels'] + \
+                    np.bincount(zones_block[invalid_pixels[variant]], minlength=n_zones)
+
+        # pixels with different result between each pair of variants
+        disagreement = np.zeros((len(variants), len(variants)), dtype=np.int64)
+        for variant_a in range(len(variants)):
+            for variant_b in range(variant_a + 1, len(variants)):
+                disagreement[variant_a, variant_b] = \
+                    np.count_nonzero(invalid_pixels[variant_a] != invalid_pixels[variant_b])
+
+        return statistics, zonal_statistics, disagreement
+
+    def plan(self, sd, n_processes):
+        """Plan the number of concurrent processes and the rows for each
+        chunk to process the satellite data, within the memory budget if
+        it was set.
+
+        :param sd: satellite data to process
+        :type sd: SatelliteData
+        :param n_processes: number of processes requested
+        :type n_processes: int
+        :return: number of processes and rows per chunk
+        :rtype: tuple
+        """
+        n_rows, n_cols = self.get_shape(sd)
+        if self.memory_budget is None:
+            return n_processes, default_rows_per_chunk(n_rows, n_processes)
+        # estimate the footprint of the image from the raster shape and data type
+        # of the data band and quality control bands held in memory
+        fixed_nbytes = sd.get_nbytes(self.band) + \
+            sum(qc_checker.get_nbytes() for qc_checker in sd.qc_bands.values())
+        if self.zones is not None:
+            # index of the zones (int32)
+            fixed_nbytes += sd.get_total_pixels(self.band) * 4
+        if self.mask is not None:
+            # mask (bool)
+            fixed_nbytes += sd.get_total_pixels(self.band)
+        if self.window is not None:
+            # only the window is read
+            fixed_nbytes = fixed_nbytes * n_rows * n_cols // sd.get_total_pixels(self.band)
+        return self.memory_budget.plan(n_rows, fixed_nbytes, fixed_nbytes // n_rows, n_processes)
+
+    def process(self, parallel, output_dir, metrics=None):
         """Process the quality control, this is check pixel per pixel
         for specific band to process for all input files. Save all
         raster 2d array checked (QC) sorted chronologically by date
-        of input file.
+        of input file. With statistics, these are saved in the file of
+        statistics (csv) as each file is processed. In the parameter
+        sweep the variants are processed at the same time.
+
+        :param parallel: pool of workers shared for all groups and bands
+        :type parallel: WorkerPool
+        :param output_dir: directory to save the file of statistics
+        :type output_dir: path
+        :param metrics: live metrics of the run updated for each file processed
+        :type metrics: Metrics
         """
-        # set unlimited to soft/hard memory for subprocess
-        resource.setrlimit(resource.RLIMIT_STACK, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
-        resource.setrlimit(resource.RLIMIT_AS, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
-        resource.setrlimit(resource.RLIMIT_DATA, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+        for _ in self.iter_process(parallel, output_dir, metrics):
+            pass
+
+    def iter_process(self, parallel, output_dir, metrics=None):
+        """Process the quality control (see process) yielding the result
+        of each file as soon as it is processed, the next file is not
+        processed until the result is consumed (backpressure). The raster
+        of the result is a memmap valid until the next result.
 
+        :param parallel: pool of workers shared for all groups and bands
+        :type parallel: WorkerPool
+        :param output_dir: directory to save the file of statistics
+        :type output_dir: path
+        :param metrics: live metrics of the run updated for each file processed
+        :type metrics: Metrics
+        :return: the result of each file and variant
+        :rtype: GranuleResult
+        """
         # check the files if the qc was success set
-        if False in [sd.make_qc for sd in SatelliteData.list]:
+        if False in [sd.make_qc for sd in self.sd_list]:
             print("\nWARNING: Not be held the quality control for {0} file(s) of {1} in total\n"
                   "due to problems in settings the quality control configurations (see above)".format(
-                   [sd.make_qc for sd in SatelliteData.list].count(False), len(SatelliteData.list)))
+                   [sd.make_qc for sd in self.sd_list].count(False), len(self.sd_list)))
             # clean the SD that not success the quality control
-            [SatelliteData.list.remove(sd) for sd in SatelliteData.list if not sd.make_qc]
+            self.sd_list = [sd for sd in self.sd_list if sd.make_qc]
+
+        print('\nProcessing {0} {1} in the band {2}:'.format(self.tile, self.shortname, self.band))
 
-        if self.number_of_processes > 1:
-            print('\n(Running with {0} local parallel processing)'.format(self.number_of_processes))
+        variants = [self] + self.variants
+        for qc in variants:
+            qc.sd_list = self.sd_list
+            qc.start_outputs(qc.get_output_dir(output_dir))
+        # start a new file of the pixels with different result between variants
+        disagreement_file = os.path.join(output_dir, self.disagreement_filename)
+        if self.variants and os.path.isfile(disagreement_file):
+            os.remove(disagreement_file)
 
         # for each file
-        for sd in SatelliteData.list:
-            # statistics for this satellite data (pixels and quality controls bands)
-            sd_statistics = {'total_pixels': sd.get_total_pixels(self.band),
-                             'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}}
+        for sd in self.sd_list:
+            print('Processing the image {0} in the band {1} ... '.format(sd.file_name, self.band),
+                  end="", flush=True)
+            # define temp dir and memmap raster to save for each variant
+            mmap_rasters = [os.path.join(tempfile.mkdtemp(), 'mmap_raster') for _ in variants]
+
+            # use the result in the cache if exists, before read any raster of the file,
+            # the zonal statistics are not cached then it need to check the quality control
+            if self.result_cache is not None and self.zones is None and not self.variants:
+                cache_entry = self.result_cache.get(
+                    self.result_cache.key(sd, self.qcf, self.band, self.window, self.mask), self.with_stats)
+                if cache_entry is not None:
+                    dump(cache_entry['raster'], mmap_rasters[0], compress=0)
+                    self.nodata_value = cache_entry['nodata_value']
+                    self.add_result(sd, mmap_rasters[0], cache_entry['raster'], cache_entry['statistics'], None,
+                                    output_dir)
+                    if metrics is not None:
+                        metrics.granule_cached(int(np.prod(self.get_shape(sd))))
+                    print('done (from cache)' + (' ' + metrics.progress() if metrics is not None else ''))
+                    yield GranuleResult(sd.file, self.band, sd.start_year_and_jday, None, cache_entry['raster'],
+                                        self.nodata_value, cache_entry['statistics'])
+                    del cache_entry
+                    continue
+
+            # details of the stages for the profiler
+            stage_args = {'file': sd.file_name, 'band': self.band}
+
             # get NoData value specific for band/product
-            self.nodata_value = sd.get_nodata_value(self.band)
+            nodata_value = sd.get_nodata_value(self.band)
 
-            # calculate the number of chunks
-            n_chunks = ceil(sd.get_rows(self.band) / (self.number_of_processes * floor(sd.get_rows(self.band) / 1000)))
+            # calculate the number of rows for each chunk for the processes of the pool
+            n_jobs, n_chunks = self.plan(sd, parallel.n_jobs)
             # divide the rows in n_chunks to process matrix in multiprocess (multi-rows)
-            x_chunks = chunks(range(sd.get_rows(self.band)), n_chunks)
+            x_chunks = chunks(range(self.get_shape(sd)[0]), n_chunks)
 
             ################################
             # start multiprocess parallel with joblib
-            print('Processing the image {0} in the band {1} ... '.format(sd.file_name, self.band),
-                  end="", flush=True)
-            # define temp dir and memmap raster to save
-            tmp_folder = tempfile.mkdtemp()
-            mmap_raster = os.path.join(tmp_folder, 'mmap_raster')
 
-            # get raster for band to process
-            data_band_raster_to_process = sd.get_data_band(self.band)
-
-            # dump the input data raster (for band to process) to disk to free the memory
-            dump(data_band_raster_to_process, mmap_raster, compress=0)
+            # get the mask (memmap) in the grid of the data band, the window of the
+            # pixels to process of the mask and its window in each chunk of rows, the
+            # data outside of them is not read and the chunks without pixels to process
+            # are not read nor checked
+            read_window = self.window
+            chunk_windows = None
+            if self.mask is not None:
+                self.mask_raster = self.mask.get(sd, self.band)
+                if self.window is not None:
+                    self.mask_raster = self.mask_raster[self.window.yoff:self.window.yoff + self.window.ysize,
+                                                        self.window.xoff:self.window.xoff + self.window.xsize]
+                read_window = get_mask_window(self.mask_raster, self.window)
+                chunk_windows = get_mask_windows(self.mask_raster, x_chunks, self.window)
+                # all pixels are masked, check one chunk (without pixels to check)
+                # for the statistics of the file
+                x_chunks = [x_chunk for x_chunk, chunk_window in zip(x_chunks, chunk_windows)
+                            if chunk_window is not None] or x_chunks[:1]
+
+            # get raster for band to process and rasters of quality control bands, or
+            # the planes of bit fields of the quality control bands from the flag cache,
+            # only the window if it is set
+            for qc_checker in sd.qc_bands.values():
+                qc_checker.window = self.window
+            if self.flag_cache is not None:
+                with self.profiler.stage('read_flag_cache', **stage_args):
+                    data_band_raster_to_process, nodata_value, self.flag_planes = self.flag_cache.load(sd, self.band)
+                if self.window is not None:
+                    data_band_raster_to_process = data_band_raster_to_process[
+                        self.window.yoff:self.window.yoff + self.window.ysize,
+                        self.window.xoff:self.window.xoff + self.window.xsize]
+            else:
+                with self.profiler.stage('read_data_band', **stage_args):
+                    if self.mask is None:
+                        data_band_raster_to_process = sd.get_data_band(self.band, self.window)
+                    else:
+                        # read the data band only in the window of the mask of each chunk
+                        xoff, yoff = (self.window.xoff, self.window.yoff) if self.window is not None else (0, 0)
+                        data_band_raster_to_process = None
+                        for chunk_window in chunk_windows:
+                            if chunk_window is None:
+                                continue
+                            data_band_block = sd.get_data_band(self.band, chunk_window)
+                            if data_band_raster_to_process is None:
+                                data_band_raster_to_process = np.full(self.get_shape(sd), nodata_value,
+                                                                      dtype=data_band_block.dtype)
+                            data_band_raster_to_process[
+                                chunk_window.yoff - yoff:chunk_window.yoff - yoff + chunk_window.ysize,
+                                chunk_window.xoff - xoff:chunk_window.xoff - xoff + chunk_window.xsize] = \
+                                data_band_block
+                            del data_band_block
+                        if data_band_raster_to_process is None:
+                            # all pixels are masked, read one pixel only for the data type
+                            data_type = sd.get_data_band(self.band, Window(xoff, yoff, 1, 1)).dtype
+                            data_band_raster_to_process = np.full(self.get_shape(sd), nodata_value, dtype=data_type)
+                with self.profiler.stage('read_qc_bands', **stage_args):
+                    # the quality control bands are read only in the windows of the mask
+                    if self.mask is None or read_window is not None:
+                        for qc_checker in sd.qc_bands.values():
+                            qc_checker.load(read_window, chunk_windows)
+            # the pixels outside of the mask are set to NoData before check the quality control
+            if self.mask is not None:
+                data_band_raster_to_process = np.where(self.mask_raster, data_band_raster_to_process,
+                                                       nodata_value).astype(data_band_raster_to_process.dtype)
+            # get the index of the zones for each pixel (memmap) in the grid of the data band
+            if self.zones is not None:
+                self.zones_raster, self.zones_labels = self.zones.get(sd, self.band)
+                if self.window is not None:
+                    self.zones_raster = self.zones_raster[self.window.yoff:self.window.yoff + self.window.ysize,
+                                                          self.window.xoff:self.window.xoff + self.window.xsize]
+
+            # dump the input data raster (for band to process) to disk to free the memory,
+            # one for each variant
+            with self.profiler.stage('dump_memmap', **stage_args):
+                for qc, mmap_raster in zip(variants, mmap_rasters):
+                    dump(data_band_raster_to_process, mmap_raster, compress=0)
+                    qc.nodata_value = nodata_value
             del data_band_raster_to_process
 
             # release the reference on the original in memory array and replace it
             # by a reference to the memmap array so that the garbage collector can
             # release the memory before forking. gc.collect() is internally called
             # in Parallel just before forking. Mmap_mode "r+" means read and write.
-            self.data_band_raster_to_process = load(mmap_raster, mmap_mode='r+')
+            for qc, mmap_raster in zip(variants, mmap_rasters):
+                qc.data_band_raster_to_process = load(mmap_raster, mmap_mode='r+')
 
             # make the quality control in parallel processes with joblib + memmap
-            statistics = Parallel(n_jobs=self.number_of_processes)\
-                (delayed(self.do_check_qc_by_chunk)(x_chunk, sd) for x_chunk in x_chunks)
-
-            # merge and save statistics
-            if self.with_stats:
-                for stats in statistics:
-                    sd_statistics = merge_dicts(sd_statistics, stats)
-                self.quality_control_statistics[sd.start_year_and_jday] = sd_statistics
-
-            # save raster band for each input file with QC in sorted list chronologically
-            self.output_bands.append(mmap_raster)
+            check_start = time.perf_counter()
+            with self.profiler.stage('check_qc', chunks=len(x_chunks), **stage_args):
+                tasks = [delayed(self.check_qc_by_chunk)(x_chunk, sd) for x_chunk in x_chunks]
+                # with a pool larger than the processes planned for the memory budget (shared
+                # pool) the chunks are checked in batches of the processes planned
+                batch_size = len(tasks) if n_jobs >= parallel.n_jobs else n_jobs
+                results = []
+                for batch in range(0, len(tasks), batch_size):
+                    results += parallel(tasks[batch:batch + batch_size])
+            check_time = time.perf_counter() - check_start
+            # the results and the busy time of the workers for each chunk
+            results, busy_times = zip(*results)
+
+            for variant, qc in enumerate(variants):
+                with self.profiler.stage('merge_statistics', **stage_args):
+                    # merge the statistics of all chunks
+                    sd_statistics = None
+                    if self.with_stats:
+                        sd_statistics = {'total_pixels': int(self.mask_raster.sum()) if self.mask is not None
+                                         else int(np.prod(self.get_shape(sd))),
+                                         'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}}
+                        for statistics, _, _ in results:
+                            sd_statistics = merge_dicts(sd_statistics, statistics[variant])
+                    sd_zonal_statistics = None
+                    if self.zones is not None:
+                        sd_zonal_statistics = {}
+                        for _, zonal_statistics, _ in results:
+                            sd_zonal_statistics = merge_zonal_statistics(sd_zonal_statistics,
+                                                                         zonal_statistics[variant])
+
+                with self.profiler.stage('add_result', **stage_args):
+                    qc.add_result(sd, mmap_rasters[variant], qc.data_band_raster_to_process, sd_statistics,
+                                  sd_zonal_statistics, qc.get_output_dir(output_dir))
+
+                    # save the result in the cache
+                    if self.result_cache is not None:
+                        self.result_cache.put(self.result_cache.key(sd, qc.qcf, self.band, self.window, self.mask),
+                                              qc.data_band_raster_to_process, qc.nodata_value, sd_statistics)
+
+                yield GranuleResult(sd.file, self.band, sd.start_year_and_jday, qc.variant_name,
+                                    qc.data_band_raster_to_process, qc.nodata_value, sd_statistics)
+                del qc.data_band_raster_to_process, sd_statistics, sd_zonal_statistics
+
+            if self.variants:
+                write_disagreement(disagreement_file, sd.start_year_and_jday,
+                                   [qc.variant_name for qc in variants], sum(result[2] for result in results))
 
             # clean
-            del self.data_band_raster_to_process, sd_statistics, \
-                n_chunks, x_chunks, statistics
+            for qc_checker in sd.qc_bands.values():
+                qc_checker.release()
+            self.zones_raster = None
+            self.mask_raster = None
+            self.flag_planes = None
+            del n_chunks, x_chunks, results
             # force run garbage collector memory
             gc.collect()
 
-            print('done')
+            if metrics is not None:
+                metrics.granule_done(int(np.prod(self.get_shape(sd))), sum(busy_times), check_time, parallel.n_jobs)
+            print('done' + (' ' + metrics.progress() if metrics is not None else ''))
 
-    def save_statistics(self, output_dir):
-        """Save statistics of invalid pixels in a image that show the time series of
-        all invalid pixels of all filters as the result after apply the QC4SD
+    def get_output_dir(self, output_dir):
+        """Return the directory for the outputs of this quality control,
+        in the parameter sweep each variant has its own directory
+
+        :param output_dir: output directory of the run
+        :type output_dir: path
+        :rtype: path
         """
-        # force matplotlib to not use any Xwindows backend.
-        import matplotlib
-        matplotlib.use('Agg')
+        if self.variant_name is None:
+            return output_dir
+        return os.path.join(output_dir, self.variant_name)
 
-        import matplotlib.ticker as mtick
-        import matplotlib.pyplot as plt
+    def start_outputs(self, output_dir):
+        """Start the files of statistics and the summary before process
+        the files, except if the new dates are appended (incremental)
 
-        # path to save statistics
-        path_stats = os.path.join(output_dir, self.output_filename.split('.tif')[0])
-        # if not os.path.isdir(path_stats):
-        #     os.makedirs(path_stats)
+        :param output_dir: directory of the outputs of this quality control
+        :type output_dir: path
+        """
+        # start a new file of statistics, except if the new dates are appended (incremental)
+        stats_file = os.path.join(output_dir, self.statistics_filename)
+        if self.with_stats and not self.existing_dates and os.path.isfile(stats_file):
+            os.remove(stats_file)
+        zonal_stats_file = os.path.join(output_dir, self.zonal_statistics_filename)
+        if self.zones is not None and not self.existing_dates and os.path.isfile(zonal_stats_file):
+            os.remove(zonal_stats_file)
+
+        # start the accumulators of the summary, in incremental mode continue the
+        # existing summary if all new dates are after its last date, else the
+        # summary is rebuilt from the output when it is saved
+        if self.with_summary:
+            self.summary = Summary(*self.get_shape(self.sd_list[0]))
+            summary_file = os.path.join(output_dir, self.summary_filename)
+            if self.existing_dates:
+                if os.path.isfile(summary_file):
+                    self.summary.load(summary_file)
+                self.rebuild_summary = self.summary.last_date is None or \
+                    min(sd.start_year_and_jday for sd in self.sd_list) <= self.summary.last_date
+
+        # start the composites updated as each date is processed, in incremental mode
+        # only the periods of the new dates are updated with the existing composites
+        if self.composite_methods:
+            self.composite = self.new_composite(output_dir)
+
+    def new_composite(self, output_dir):
+        """Create the composites for the dates to process, with its files in
+        the output directory. In incremental mode the composites continue the
+        existing composites, if one of them not exist the periods of all
+        existing dates are saved.
+
+        :param output_dir: directory to save the composite files
+        :type output_dir: path
+        :rtype: Composite
+        """
+        composite_files = dict((method, os.path.join(output_dir, self.get_composite_filename(method)))
+                               for method in self.composite_methods)
+        existing_periods = {}
+        if self.existing_bands:
+            existing_periods = dict((method, get_existing_bands(composite_files[method], 'PERIODS'))
+                                    for method in self.composite_methods)
+            if None in existing_periods.values():
+                existing_periods = None
+        return Composite(self.composite_methods, self.composite_period,
+                         [sd.start_year_and_jday for sd in self.sd_list], *self.get_shape(self.sd_list[0]),
+                         composite_files=composite_files, output_properties=self.get_output_properties(),
+                         output_layout=self.output_layout, existing_dates=self.existing_bands,
+                         existing_periods=existing_periods)
+
+    def add_result(self, sd, mmap_raster, raster, sd_statistics, sd_zonal_statistics, output_dir):
+        """Add the raster checked of the satellite data to the bands to save,
+        save its statistics in the files of statistics and update the summary
+
+        :param sd: satellite data processed
+        :type sd: SatelliteData
+        :param mmap_raster: memmap file of the raster checked
+        :type mmap_raster: path
+        :param raster: raster checked
+        :type raster: ndarray
+        :param sd_statistics: statistics of the satellite data or None
+        :type sd_statistics: dict
+        :param sd_zonal_statistics: statistics by zone of the satellite data or None
+        :type sd_zonal_statistics: dict
+        :param output_dir: directory of the outputs of this quality control
+        :type output_dir: path
+        """
+        if self.with_stats:
+            self.quality_control_statistics[sd.start_year_and_jday] = sd_statistics
+            write_statistics(os.path.join(output_dir, self.statistics_filename), sd.start_year_and_jday, sd_statistics)
+        if sd_zonal_statistics is not None:
+            write_zonal_statistics(os.path.join(output_dir, self.zonal_statistics_filename), sd.start_year_and_jday,
+                                   sd_zonal_statistics, self.zones_labels)
+
+        # save raster band for each input file with QC in sorted list chronologically,
+        # in the dates layout the file of the date is written in the writers now
+        if self.output_layout == 'dates':
+            date_file = os.path.join(output_dir, self.get_date_filename(sd.start_year_and_jday))
+            self.write_futures.append(self.writer.submit(date_file, sd.start_year_and_jday, mmap_raster,
+                                                         self.nodata_value, self.get_output_properties()))
+            self.output_bands.append((sd.start_year_and_jday, date_file, self.nodata_value))
+        else:
+            self.output_bands.append((sd.start_year_and_jday, mmap_raster))
 
-        ################################
-        # graph invalid pixels for the time series
+        # update the per pixel summary of valid observations
+        if self.summary is not None and not self.rebuild_summary:
+            self.summary.update(sd.start_year_and_jday, raster, self.nodata_value)
+
+        # update the composites, the periods complete are saved
+        if self.composite is not None:
+            self.composite.update(sd.start_year_and_jday, raster, self.nodata_value)
+
+    def save_statistics(self, output_dir):
+        """Save statistics of invalid pixels in a image that show the time series of
+        all invalid pixels of all filters as the result after apply the QC4SD, the
+        image is made with all dates saved in the file of statistics (csv).
 
-        img_filename = os.path.join(output_dir, self.output_filename.split('.tif')[0]+"_stats.png")
+        :param output_dir: directory to save the image
+        :type output_dir: path
+        """
+        img_filename = os.path.join(output_dir, os.path.splitext(self.output_filename)[0]+"_stats.png")
         print("Saving the image of statistics of invalid pixels in: {0}".format(os.path.basename(img_filename)))
 
-        ################################
-        # prepare data
-        all_filter_names = set()
-        for sd_invalid_pixels in self.quality_control_statistics.values():
-            filters = sd_invalid_pixels['invalid_pixels']
-            # delete elements if the values are empty
-            filters = {k: filters[k] for k in filters if filters[k]}
-            # unpacking the dicts of all filters
-            filters = [x for x in filters.values()]
-            _tmp_dict = {}
-            for filter in filters:
-                _tmp_dict.update(filter)
-            filters = _tmp_dict
-            all_filter_names = all_filter_names | set(filters.keys())
-        all_filter_names = sorted(list(all_filter_names))
-
-        sd_names_sorted = sorted(self.quality_control_statistics.keys())
-        all_invalid_pixels = []
-        for sd_name in sd_names_sorted:
-            filters = self.quality_control_statistics[sd_name]['invalid_pixels']
-            # delete elements if the values are empty
-            filters = {k: filters[k] for k in filters if filters[k]}
-            # unpacking the dicts of all filters
-            filters = [x for x in filters.values()]
-            _tmp_dict = {}
-            for filter in filters:
-                _tmp_dict.update(filter)
-            filters = _tmp_dict
-
-            sd_time_series = [self.quality_control_statistics[sd_name]['total_invalid_pixels']]
-            sd_time_series += [self.quality_control_statistics[sd_name]['nodata_pixels']]
-            for filter_name in all_filter_names:
-                if filter_name in filters:
-                    sd_time_series.append(filters[filter_name])
-                else:
-                    sd_time_series.append(float('nan'))
-            all_invalid_pixels.append(sd_time_series)
-
-        all_filter_names = ['total_invalid_pixels'] + ['nodata_pixels'] + list(all_filter_names)
-        #all_filter_names = [name.replace('_', ' ') for name in all_filter_names]
-
-        ################################
-        # plot
-
-        width = 10+len(sd_names_sorted)*0.4
-        if len(sd_names_sorted) == 1: width = 7
-        fig, ax = plt.subplots(1, 1, figsize=(width, 8), facecolor='white')
-        ax.spines['top'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        ax.get_xaxis().tick_bottom()
-        ax.get_yaxis().tick_left()
-        plt.tick_params(axis='both', which='both', bottom='off', top='off',
-                        labelbottom='on', left='off', right='off', labelleft='on')
-        all_invalid_pixels_T = list(map(list, zip(*all_invalid_pixels)))
-
-        # delete all group of list that have only zeros, this is delete types of
-        # invalid pixels that not filter any pixel in all image across the time
-        delete_zeros_lists = [idx for idx, values in enumerate(all_invalid_pixels_T)
-                              if [x for x in set(values) if not isnan(x)] == [0]]
-        delete_zeros_lists.reverse()
-        for del_idx in delete_zeros_lists:
-                del all_invalid_pixels_T[del_idx]
-                del all_filter_names[del_idx]
-        # rewrite list after clean
-        all_invalid_pixels = list(map(list, zip(*all_invalid_pixels_T)))
-
-        if not all_invalid_pixels:
-            print("\nWARNING: the invalid pixels is zero! nothing pixels was filtered.\n")
-            return
-
-        max_y = max([max(sub_l) for sub_l in all_invalid_pixels_T])  # y max over all times
-
-        # fix position for y label
-        y_pos_label_fixed = deepcopy(all_invalid_pixels[-1])
-        # if any item in the last position is nan, put the last
-        # valid value for this item
-        for idx, y_pos in enumerate(y_pos_label_fixed):
-            iter_pos = -1
-            if isnan(y_pos):
-                while isnan(all_invalid_pixels[iter_pos][idx]):
-                    iter_pos += -1
-                y_pos_label_fixed[idx] = all_invalid_pixels[iter_pos][idx]
-
-        # set initial value for repulsive_items_list
-        repulsive_distance = max_y * 0.035
-
-        fix_list = True
-        while fix_list:
-            fix_list, repulsive_distance, y_pos_label_fixed = repulsive_items_list(y_pos_label_fixed, repulsive_distance)
-
-        # define colors
-        import matplotlib as mpl
-        import matplotlib.cm as cm
-        norm = mpl.colors.Normalize(vmin=0, vmax=len(all_invalid_pixels_T))
-        cmap = cm.Set1
-        m = cm.ScalarMappable(norm=norm, cmap=cmap)
-
-        if len(sd_names_sorted) == 1:  # for only one image
-            for idx, line in enumerate(all_invalid_pixels_T):
-                if idx == 0:
-                    plt.plot(0, line, 'ro', markersize=9, color=m.to_rgba(idx), linewidth=3.4, alpha=1)
-                    # put value of total invalid pixel for each x item (time)
-                    for x, y in zip(range(len(SatelliteData.list)), line):
-                        ax.text(x, y+max_y*0.02, "{0}%".format(round(100*y/SatelliteData.list[idx].get_total_pixels(self.band), 2)),
-                                ha='center', va='bottom', color=m.to_rgba(idx), fontweight='bold', fontsize=12, alpha=1)
-                else:
-                    plt.plot(0, line, 'ro', markersize=9, color=m.to_rgba(idx), linewidth=3, alpha=1)
-                # y label of filter name
-                plt.text(0.3, y_pos_label_fixed[idx], all_filter_names[idx],
-                         fontsize=12, weight='bold', color=m.to_rgba(idx), alpha=1)
-            plt.xlim(-0.5, 0.5)
-            plt.xticks(range(len(sd_names_sorted)), sd_names_sorted, rotation=90)
-            plt.ylim(-max_y*0.01, max_y+max_y*0.07)
-            plt.title("Invalid pixels for {0} {1} in band {2}\nQC4SD - IDEAM".
-                      format(SatelliteData.tile, SatelliteData.shortname, fix_zeros(self.band, 2)),
-                      fontsize=18, weight='bold', color="#3A3A3A")
-            plt.xlabel("Date", fontsize=14, weight='bold', color="#3A3A3A")
-            plt.ylabel("Number of invalid pixels", fontsize=14, weight='bold', color="#3A3A3A")
-            plt.tick_params(axis='both', which='major', labelsize=14, color="#3A3A3A")
-            ax.grid(True, color='gray')
-            ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%g'))
-            fig.tight_layout()
-            fig.subplots_adjust(right=0.6, left=0.4)
-        else:
-            for idx, line in enumerate(all_invalid_pixels_T):
-                if idx == 0:
-                    plt.plot(line, color=m.to_rgba(idx), linewidth=3.4, alpha=1)
-                    # put value of total invalid pixel for each x item (time)
-                    for x, y in zip(range(len(SatelliteData.list)), line):
-                        ax.text(x, y+max_y*0.02, "{0}%".format(round(100*y/SatelliteData.list[idx].get_total_pixels(self.band), 2)),
-                                ha='center', va='bottom', color=m.to_rgba(idx), fontweight='bold', fontsize=12, alpha=1)
-                else:
-                    plt.plot(line, color=m.to_rgba(idx), linewidth=3, alpha=1)
-                # y label of filter name
-                plt.text(len(SatelliteData.list)-1+len(SatelliteData.list)*0.02, y_pos_label_fixed[idx],
-                         all_filter_names[idx], fontsize=12, weight='bold', color=m.to_rgba(idx), alpha=1)
-            plt.xlim(-len(SatelliteData.list)*0.02, len(SatelliteData.list)-1+len(SatelliteData.list)*0.02)
-            plt.xticks(range(len(sd_names_sorted)), sd_names_sorted, rotation=90)
-            plt.ylim(-max_y*0.01, max_y+max_y*0.07)
-            plt.title("Invalid pixels for {0} {1} in band {2}\nQC4SD - IDEAM".
-                      format(SatelliteData.tile, SatelliteData.shortname, fix_zeros(self.band, 2)),
-                      fontsize=18, weight='bold', color="#3A3A3A")
-            plt.xlabel("Date", fontsize=14, weight='bold', color="#3A3A3A")
-            plt.ylabel("Number of invalid pixels", fontsize=14, weight='bold', color="#3A3A3A")
-            plt.tick_params(axis='both', which='major', labelsize=14, color="#3A3A3A")
-            ax.grid(True, color='gray')
-            ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%g'))
-            fig.tight_layout()
-            fig.subplots_adjust(right=1.02-3.6/width)
-
-        plt.savefig(img_filename, dpi=86)
-        plt.close('all')
-
-        # trim whitespace
-        try:
-            call(["convert", img_filename, "-trim", "-bordercolor", "white", "-border", "8x8", "+repage", "-alpha", "off", img_filename])
-            print('trim image successfully')
-        except:
-            pass
+        plot_statistics(read_statistics(os.path.join(output_dir, self.statistics_filename)), img_filename,
+                        "Invalid pixels for {0} {1} in band {2}".format(self.tile, self.shortname, fix_zeros(self.band, 2)))
+
+    def save_summary(self, output_dir):
+        """Save the per pixel summary of valid observations (count of valid
+        dates, first and last valid date and longest gap in days). In
+        incremental mode the saved summary continues with the new dates, only
+        if a new date is before its last date (or it not exist) the summary
+        is rebuilt streaming all dates of the output saved. Call it after
+        save the results.
 
-        # for sd_name, sd_invalid_pixels in self.quality_control_statistics.items():
-        #     print()
-        #     print(sd_name)
-        #     print('total_invalid_pixels', sd_invalid_pixels['total_invalid_pixels'])
-        #     for qc_id_name, qc_invalid_pixels in sd_invalid_pixels['invalid_pixels'].items():
-        #         print('  '+qc_id_name)
-        #         for qc_item, invalid in qc_invalid_pixels.items():
-        #             if invalid != 0:
-        #                 print('    ', qc_item+':', invalid)
+        :param output_dir: directory to save the summary file
+        :type output_dir: path
+        """
+        print("Saving the summary of valid observations in: {0}".format(self.summary_filename))
+        if self.rebuild_summary:
+            self.summary.close()
+            self.summary = Summary(self.summary.rows, self.summary.cols)
+            for band in get_existing_bands(os.path.join(output_dir, self.output_filename)):
+                self.summary.update(band[0], read_band(band), band[3])
+
+        geotransform, projection, _ = self.get_output_properties()
+        self.summary.save(os.path.join(output_dir, self.summary_filename), geotransform, projection)
+        self.summary.close()
+        self.summary = None
+
+    def save_composites(self, output_dir):
+        """Save the last period of the composites (and the VRT of the periods
+        in the dates layout). Call it after save the results.
+
+        :param output_dir: directory to save the composite files
+        :type output_dir: path
+        """
+        print("Saving the composites ({0}) of each {1} in: {2}".format(
+            ', '.join(self.composite_methods), self.composite_period,
+            ', '.join([self.get_composite_filename(method) for method in self.composite_methods])))
+        self.composite.close()
+        self.composite = None
 
     def save_results(self, output_dir):
         """Save all processed files in one file per each data band to process,
-        each file to save has the precessed files as bands.
+        each file to save has the precessed files as bands sorted chronologically
+        and the dates (year and jday) of the bands in the metadata. The new dates
+        are appended (incremental mode) in the dates layout (see save_dates_vrt).
 
         :param output_dir: directory to save the output file
         :type output_dir: path
         """
         print("\nSaving the result for the band {0} in: {1}"
               .format(self.band, self.output_filename))
+        if self.output_layout == 'dates':
+            return self.save_dates_vrt(output_dir)
+        output_file = os.path.join(output_dir, self.output_filename)
+        bands_to_save = sorted(self.output_bands, key=lambda x: x[0])
         # get gdal properties of one of data band
-        sd = SatelliteData.list[0]
-        data_band_name = [x for x in sd.sub_datasets if 'b'+fix_zeros(self.band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        geotransform = gdal_data_band.GetGeoTransform()
-        originX = geotransform[0]
-        originY = geotransform[3]
-        pixelWidth = geotransform[1]
-        pixelHeight = geotransform[5]
-
-        # create output raster
+        geotransform, projection, data_type = self.get_output_properties()
+
+        # create output raster, with the data type of the data band
         driver = gdal.GetDriverByName('GTiff')
-        nbands = len(self.output_bands)
-        outRaster = driver.Create(os.path.join(output_dir, self.output_filename),
-                                  sd.get_cols(self.band), sd.get_rows(self.band),
-                                  nbands, gdal.GDT_Int16, ["COMPRESS=LZW", "PREDICTOR=2", "TILED=YES"])
+        nbands = len(bands_to_save)
+        rows, cols = self.get_shape(self.sd_list[0])
+        outRaster = driver.Create(output_file, cols, rows, nbands, data_type, OUTPUT_OPTIONS)
+        outRaster.SetMetadataItem('DATES', ','.join([date for date, _ in bands_to_save]))
 
         # write bands
-        for nband, data_band_raster_mmap_file in enumerate(self.output_bands):
-            # load result raster saved in file with memmap (joblib dump)
-            data_band_raster = load(data_band_raster_mmap_file, mmap_mode='r')
+        for nband, (date, data_band_raster_source) in enumerate(bands_to_save):
             outband = outRaster.GetRasterBand(nband + 1)
+            outband.SetDescription(date)
+            # load result raster saved in file with memmap (joblib dump)
+            data_band_raster = load(data_band_raster_source, mmap_mode='r')
             outband.WriteArray(data_band_raster)
             #outband.WriteArray(sd.get_data_band(self.band))
             outband.SetNoDataValue(self.nodata_value)
             #outband.FlushCache()  # FlushCache cause WriteEncodedTile/Strip() failed
+            del data_band_raster
+            shutil.rmtree(os.path.dirname(data_band_raster_source))
 
             # clean
             outband = None
-            del data_band_raster
-            shutil.rmtree(os.path.dirname(data_band_raster_mmap_file))
 
         # set projection
-        outRaster.SetGeoTransform((originX, pixelWidth, 0, originY, 0, pixelHeight))
-        outRasterSRS = osr.SpatialReference()
-        outRasterSRS.ImportFromWkt(gdal_data_band.GetProjectionRef())
-        outRaster.SetProjection(outRasterSRS.ExportToWkt())
+        outRaster.SetGeoTransform(geotransform)
+        outRaster.SetProjection(projection)
 
         # clean
-        gdal_data_band = None
-        geotransform = None
         outRaster = None
 
+    def save_dates_vrt(self, output_dir):
+        """Save the VRT of the files of each date (dates layout) with the
+        dates as bands sorted chronologically and the dates (year and jday)
+        in the metadata, like the output of the stack layout. It waits that
+        the writers finish the files of the dates. In incremental mode the
+        existing bands are referenced in the new VRT without open them, then
+        only the files of the new dates are written.
 
-
+        :param output_dir: directory to save the VRT file
+        :type output_dir: path
+        """
+        # wait the writes of the dates and raise its errors
+        for write_future in self.write_futures:
+            write_future.result()
+        self.write_futures = []
+
+        bands_to_save = self.existing_bands + [(date, date_file, 1, nodata_value)
+                                               for date, date_file, nodata_value in self.output_bands]
+        write_vrt(os.path.join(output_dir, self.output_filename), bands_to_save, *self.get_shape(self.sd_list[0]),
+                  output_properties=self.get_output_properties(), metadata_key='DATES')
+
+
+def get_existing_bands(output_file, metadata_key='DATES'):
+    """Return the bands of the existing output file (VRT of the dates layout)
+    as (date or period, file, band, NoData value), without open its sources.
+    If the VRT not exist the bands of the output of the stack layout with
+    the same name (.tif) are referenced, then the outputs of a run not
+    incremental are continued without copy them.
+
+    :param output_file: output file of QC4SD (VRT)
+    :type output_file: path
+    :param metadata_key: metadata item of the labels of the bands, DATES or PERIODS
+    :type metadata_key: str
+    :return: bands of the output or None if not exist
+    :rtype: list
+    """
+    bands = read_vrt_bands(output_file)
+    if bands is not None:
+        return bands
+    stack_file = os.path.splitext(output_file)[0] + '.tif'
+    if not os.path.isfile(stack_file):
+        return None
+    gdal_dataset = gdal.Open(stack_file, gdal.GA_ReadOnly)
+    labels = gdal_dataset.GetMetadataItem(metadata_key)
+    if not labels or len(labels.split(',')) != gdal_dataset.RasterCount:
+        return None
+    bands = [(label, stack_file, nband + 1, gdal_dataset.GetRasterBand(nband + 1).GetNoDataValue())
+             for nband, label in enumerate(labels.split(','))]
+    del gdal_dataset
+    return bands
+
+
+def quiet_gdal_errors(quiet=True):
+    """Quiet the gdal warnings/errors messages during the run, set when
+    the run starts (not when the module is imported) and restored at the
+    end, for don't change the error handler of who imports qc4sd
+
+    :param quiet: push the quiet error handler if True, else pop it
+    :type quiet: bool
+    """
+    if quiet:
+        gdal.PushErrorHandler('CPLQuietErrorHandler')
+    else:
+        gdal.PopErrorHandler()
@@ -5,8 +5,15 @@
 #  Authors: Xavier Corredor Llano
 #  Email: xcorredorl at ideam.gov.co
 
+import os
 import configparser
 
+BASE_DIR = os.path.dirname(__file__)
+# default quality control files of each platform, the sections of all of
+# them are loaded with the default quality control file
+DEFAULT_QCF_FILES = [os.path.join(BASE_DIR, 'qc_default_modis_settings.ini'),
+                     os.path.join(BASE_DIR, 'qc_default_landsat_settings.ini')]
+
 
 def setup_quality_control_file(qcf):
     """Read and setup the input (or default) quality control file
@@ -18,6 +25,6 @@ def setup_quality_control_file(qcf):
     """
 
     quality_control_file = configparser.RawConfigParser()
-    quality_control_file.read(qcf)
+    quality_control_file.read(DEFAULT_QCF_FILES if qcf in DEFAULT_QCF_FILES else qcf)
 
     return quality_control_file
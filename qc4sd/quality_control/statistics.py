@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import csv
+from copy import deepcopy
+from math import isnan
+
+from qc4sd.lib import spread_items_list
+
+# columns of the file of statistics, one row for each date, quality control
+# band and flag, the totals of the date are saved without quality control band
+STATISTICS_FIELDS = ['date', 'qc_band', 'flag', 'pixels']
+STATISTICS_TOTALS = ['total_pixels', 'total_invalid_pixels', 'nodata_pixels']
+# columns of the file of pixels with different result between each pair
+# of quality control files (variants) in the parameter sweep
+DISAGREEMENT_FIELDS = ['date', 'qcf_a', 'qcf_b', 'pixels']
+
+
+def write_statistics(stats_file, date, sd_statistics):
+    """Append the statistics of invalid pixels of one date (satellite
+    data) in the file of statistics (csv), the file is created with
+    the header if not exist.
+
+    :param stats_file: file of statistics (csv)
+    :type stats_file: str
+    :param date: date of the satellite data (year and jday)
+    :type date: str
+    :param sd_statistics: statistics of the satellite data
+    :type sd_statistics: dict
+    """
+    new_file = not os.path.isfile(stats_file)
+    with open(stats_file, 'a', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        if new_file:
+            writer.writerow(STATISTICS_FIELDS)
+        for total in STATISTICS_TOTALS:
+            if total in sd_statistics:
+                writer.writerow([date, '', total, sd_statistics[total]])
+        for qc_band, qc_invalid_pixels in sorted(sd_statistics['invalid_pixels'].items()):
+            for flag, pixels in sorted(qc_invalid_pixels.items()):
+                writer.writerow([date, qc_band, flag, pixels])
+
+
+def write_disagreement(disagreement_file, date, variant_names, disagreement):
+    """Append the pixels with different result (valid or invalid) between
+    each pair of variants of one date (satellite data) in the file of
+    disagreement (csv), the file is created with the header if not exist.
+
+    :param disagreement_file: file of disagreement (csv)
+    :type disagreement_file: str
+    :param date: date of the satellite data (year and jday)
+    :type date: str
+    :param variant_names: names of the variants (quality control files)
+    :type variant_names: list
+    :param disagreement: pixels with different result for each pair of variants (upper triangle)
+    :type disagreement: ndarray
+    """
+    new_file = not os.path.isfile(disagreement_file)
+    with open(disagreement_file, 'a', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        if new_file:
+            writer.writerow(DISAGREEMENT_FIELDS)
+        for variant_a, name_a in enumerate(variant_names):
+            for variant_b in range(variant_a + 1, len(variant_names)):
+                writer.writerow([date, name_a, variant_names[variant_b], int(disagreement[variant_a][variant_b])])
+
+
+def read_statistics(stats_file):
+    """Read the statistics of invalid pixels of all dates saved in
+    the file of statistics (csv)
+
+    :param stats_file: file of statistics (csv)
+    :type stats_file: str
+    :return: statistics for each date (year and jday)
+    :rtype: dict
+    """
+    quality_control_statistics = {}
+    with open(stats_file, newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            sd_statistics = quality_control_statistics.setdefault(
+                row['date'], {'total_pixels': 0, 'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}})
+            if row['qc_band']:
+                sd_statistics['invalid_pixels'].setdefault(row['qc_band'], {})[row['flag']] = int(row['pixels'])
+            else:
+                sd_statistics[row['flag']] = int(row['pixels'])
+    return quality_control_statistics
+
+
+def plot_statistics(quality_control_statistics, img_filename, title):
+    """Save statistics of invalid pixels in a image that show the time series of
+    all invalid pixels of all filters as the result after apply the QC4SD
+
+    :param quality_control_statistics: statistics for each date (year and jday)
+    :type quality_control_statistics: dict
+    :param img_filename: image file to save the plot
+    :type img_filename: str
+    :param title: title of the plot
+    :type title: str
+    """
+    # force matplotlib to not use any Xwindows backend.
+    import matplotlib
+    matplotlib.use('Agg')
+
+    import matplotlib.ticker as mtick
+    import matplotlib.pyplot as plt
+
+    ################################
+    # prepare data
+    all_filter_names = set()
+    for sd_invalid_pixels in quality_control_statistics.values():
+        filters = sd_invalid_pixels['invalid_pixels']
+        # delete elements if the values are empty
+        filters = {k: filters[k] for k in filters if filters[k]}
+        # unpacking the dicts of all filters
+        filters = [x for x in filters.values()]
+        _tmp_dict = {}
+        for filter in filters:
+            _tmp_dict.update(filter)
+        filters = _tmp_dict
+        all_filter_names = all_filter_names | set(filters.keys())
+    all_filter_names = sorted(list(all_filter_names))
+
+    sd_names_sorted = sorted(quality_control_statistics.keys())
+    total_pixels = [quality_control_statistics[sd_name]['total_pixels'] for sd_name in sd_names_sorted]
+    all_invalid_pixels = []
+    for sd_name in sd_names_sorted:
+        filters = quality_control_statistics[sd_name]['invalid_pixels']
+        # delete elements if the values are empty
+        filters = {k: filters[k] for k in filters if filters[k]}
+        # unpacking the dicts of all filters
+        filters = [x for x in filters.values()]
+        _tmp_dict = {}
+        for filter in filters:
+            _tmp_dict.update(filter)
+        filters = _tmp_dict
+
+        sd_time_series = [quality_control_statistics[sd_name]['total_invalid_pixels']]
+        sd_time_series += [quality_control_statistics[sd_name]['nodata_pixels']]
+        for filter_name in all_filter_names:
+            if filter_name in filters:
+                sd_time_series.append(filters[filter_name])
+            else:
+                sd_time_series.append(float('nan'))
+        all_invalid_pixels.append(sd_time_series)
+
+    all_filter_names = ['total_invalid_pixels'] + ['nodata_pixels'] + list(all_filter_names)
+    #all_filter_names = [name.replace('_', ' ') for name in all_filter_names]
+
+    ################################
+    # plot
+
+    width = 10+len(sd_names_sorted)*0.4
+    if len(sd_names_sorted) == 1: width = 7
+    fig, ax = plt.subplots(1, 1, figsize=(width, 8), facecolor='white')
+    ax.spines['top'].set_visible(False)
+    ax.spines['bottom'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_visible(False)
+    ax.get_xaxis().tick_bottom()
+    ax.get_yaxis().tick_left()
+    plt.tick_params(axis='both', which='both', bottom='off', top='off',
+                    labelbottom='on', left='off', right='off', labelleft='on')
+    all_invalid_pixels_T = list(map(list, zip(*all_invalid_pixels)))
+
+    # delete all group of list that have only zeros, this is delete types of
+    # invalid pixels that not filter any pixel in all image across the time
+    delete_zeros_lists = [idx for idx, values in enumerate(all_invalid_pixels_T)
+                          if [x for x in set(values) if not isnan(x)] == [0]]
+    delete_zeros_lists.reverse()
+    for del_idx in delete_zeros_lists:
+            del all_invalid_pixels_T[del_idx]
+            del all_filter_names[del_idx]
+    # rewrite list after clean
+    all_invalid_pixels = list(map(list, zip(*all_invalid_pixels_T)))
+
+    if not all_invalid_pixels:
+        print("\nWARNING: the invalid pixels is zero! nothing pixels was filtered.\n")
+        return
+
+    max_y = max([max(sub_l) for sub_l in all_invalid_pixels_T])  # y max over all times
+
+    # fix position for y label
+    y_pos_label_fixed = deepcopy(all_invalid_pixels[-1])
+    # if any item in the last position is nan, put the last
+    # valid value for this item
+    for idx, y_pos in enumerate(y_pos_label_fixed):
+        iter_pos = -1
+        if isnan(y_pos):
+            while isnan(all_invalid_pixels[iter_pos][idx]):
+                iter_pos += -1
+            y_pos_label_fixed[idx] = all_invalid_pixels[iter_pos][idx]
+
+    # separate the labels that overlap
+    y_pos_label_fixed = spread_items_list(y_pos_label_fixed, max_y * 0.035)
+
+    # define colors
+    import matplotlib as mpl
+    import matplotlib.cm as cm
+    norm = mpl.colors.Normalize(vmin=0, vmax=len(all_invalid_pixels_T))
+    cmap = cm.Set1
+    m = cm.ScalarMappable(norm=norm, cmap=cmap)
+
+    if len(sd_names_sorted) == 1:  # for only one image
+        for idx, line in enumerate(all_invalid_pixels_T):
+            if idx == 0:
+                plt.plot(0, line, 'ro', markersize=9, color=m.to_rgba(idx), linewidth=3.4, alpha=1)
+                # put value of total invalid pixel for each x item (time)
+                for x, y in zip(range(len(sd_names_sorted)), line):
+                    ax.text(x, y+max_y*0.02, "{0}%".format(round(100*y/total_pixels[x], 2)),
+                            ha='center', va='bottom', color=m.to_rgba(idx), fontweight='bold', fontsize=12, alpha=1)
+            else:
+                plt.plot(0, line, 'ro', markersize=9, color=m.to_rgba(idx), linewidth=3, alpha=1)
+            # y label of filter name
+            plt.text(0.3, y_pos_label_fixed[idx], all_filter_names[idx],
+                     fontsize=12, weight='bold', color=m.to_rgba(idx), alpha=1)
+        plt.xlim(-0.5, 0.5)
+        plt.xticks(range(len(sd_names_sorted)), sd_names_sorted, rotation=90)
+        plt.ylim(-max_y*0.01, max_y+max_y*0.07)
+        plt.title("{0}\nQC4SD - IDEAM".format(title),
+                  fontsize=18, weight='bold', color="#3A3A3A")
+        plt.xlabel("Date", fontsize=14, weight='bold', color="#3A3A3A")
+        plt.ylabel("Number of invalid pixels", fontsize=14, weight='bold', color="#3A3A3A")
+        plt.tick_params(axis='both', which='major', labelsize=14, color="#3A3A3A")
+        ax.grid(True, color='gray')
+        ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%g'))
+        fig.tight_layout()
+        fig.subplots_adjust(right=0.6, left=0.4)
+    else:
+        for idx, line in enumerate(all_invalid_pixels_T):
+            if idx == 0:
+                plt.plot(line, color=m.to_rgba(idx), linewidth=3.4, alpha=1)
+                # put value of total invalid pixel for each x item (time)
+                for x, y in zip(range(len(sd_names_sorted)), line):
+                    ax.text(x, y+max_y*0.02, "{0}%".format(round(100*y/total_pixels[x], 2)),
+                            ha='center', va='bottom', color=m.to_rgba(idx), fontweight='bold', fontsize=12, alpha=1)
+            else:
+                plt.plot(line, color=m.to_rgba(idx), linewidth=3, alpha=1)
+            # y label of filter name
+            plt.text(len(sd_names_sorted)-1+len(sd_names_sorted)*0.02, y_pos_label_fixed[idx],
+                     all_filter_names[idx], fontsize=12, weight='bold', color=m.to_rgba(idx), alpha=1)
+        plt.xlim(-len(sd_names_sorted)*0.02, len(sd_names_sorted)-1+len(sd_names_sorted)*0.02)
+        plt.xticks(range(len(sd_names_sorted)), sd_names_sorted, rotation=90)
+        plt.ylim(-max_y*0.01, max_y+max_y*0.07)
+        plt.title("{0}\nQC4SD - IDEAM".format(title),
+                  fontsize=18, weight='bold', color="#3A3A3A")
+        plt.xlabel("Date", fontsize=14, weight='bold', color="#3A3A3A")
+        plt.ylabel("Number of invalid pixels", fontsize=14, weight='bold', color="#3A3A3A")
+        plt.tick_params(axis='both', which='major', labelsize=14, color="#3A3A3A")
+        ax.grid(True, color='gray')
+        ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%g'))
+        fig.tight_layout()
+        fig.subplots_adjust(right=1.02-3.6/width)
+
+    # save with the whitespace trimmed and a small border
+    plt.savefig(img_filename, dpi=86, bbox_inches='tight', pad_inches=0.1, facecolor='white')
+    plt.close('all')
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from datetime import datetime
+from joblib import load, dump
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+# bands of the summary file
+SUMMARY_BANDS = ['valid_count', 'first_valid_date', 'last_valid_date', 'longest_gap_days']
+# rows of each block to update the accumulators
+BLOCK_ROWS = 512
+
+
+def date_to_ordinal(year_and_jday):
+    """Convert the date as year and jday (i.e. 2015034) to the
+    proleptic Gregorian ordinal
+
+    :rtype: int
+    """
+    return datetime.strptime(str(year_and_jday), '%Y%j').toordinal()
+
+
+class Summary:
+    """Per pixel summary of the valid observations through the time series,
+    computed with running accumulators updated by blocks as each date is
+    processed (in chronological order), without hold the stack in memory:
+    count of valid dates, first and last valid date (year and jday) and
+    the longest gap in days between two consecutive valid dates.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        # accumulators saved in memmap files
+        self.tmp_folder = tempfile.mkdtemp()
+        self.accumulators = {}
+        for name in SUMMARY_BANDS + ['last_valid_ordinal']:
+            mmap_file = os.path.join(self.tmp_folder, name)
+            dump(np.zeros((rows, cols), dtype=np.int32), mmap_file, compress=0)
+            self.accumulators[name] = load(mmap_file, mmap_mode='r+')
+        # last date (year and jday) updated
+        self.last_date = None
+
+    def update(self, date, raster, nodata_value):
+        """Update the accumulators with the raster checked for the date,
+        the dates must be updated in chronological order.
+
+        :param date: date of the raster (year and jday)
+        :type date: str
+        :param raster: raster checked (QC)
+        :type raster: ndarray
+        :param nodata_value: NoData value of the raster
+        :type nodata_value: float
+        """
+        ordinal = date_to_ordinal(date)
+        acc = self.accumulators
+        for y in range(0, self.rows, BLOCK_ROWS):
+            block = slice(y, y + BLOCK_ROWS)
+            valid = raster[block] != nodata_value
+            if not valid.any():
+                continue
+            acc['valid_count'][block] += valid
+            acc['first_valid_date'][block][valid & (acc['first_valid_date'][block] == 0)] = int(date)
+            last_valid_ordinal = acc['last_valid_ordinal'][block]
+            gap = np.where(valid & (last_valid_ordinal > 0), ordinal - last_valid_ordinal, 0)
+            np.maximum(acc['longest_gap_days'][block], gap, out=acc['longest_gap_days'][block])
+            last_valid_ordinal[valid] = ordinal
+            acc['last_valid_date'][block][valid] = int(date)
+        self.last_date = date
+
+    def load(self, summary_file):
+        """Initialize the accumulators from an existing summary file, for
+        continue the summary with new dates after its last date.
+
+        :param summary_file: summary file saved
+        :type summary_file: str
+        """
+        gdal_dataset = gdal.Open(summary_file, gdal.GA_ReadOnly)
+        acc = self.accumulators
+        for nband, name in enumerate(SUMMARY_BANDS):
+            acc[name][:] = gdal_dataset.GetRasterBand(nband + 1).ReadAsArray()
+        self.last_date = gdal_dataset.GetMetadataItem('LAST_DATE')
+        del gdal_dataset
+        # recover the ordinal of the last valid date
+        for y in range(0, self.rows, BLOCK_ROWS):
+            block = slice(y, y + BLOCK_ROWS)
+            last_valid_date = acc['last_valid_date'][block]
+            dates, inverse = np.unique(last_valid_date, return_inverse=True)
+            ordinals = np.array([date_to_ordinal(d) if d else 0 for d in dates], dtype=np.int32)
+            acc['last_valid_ordinal'][block] = ordinals[inverse].reshape(last_valid_date.shape)
+
+    def save(self, summary_file, geotransform, projection):
+        """Save the summary in a file, one band for each accumulator
+
+        :param summary_file: file to save the summary
+        :type summary_file: str
+        :param geotransform: geotransform of the data band
+        :type geotransform: tuple
+        :param projection: projection of the data band (wkt)
+        :type projection: str
+        """
+        driver = gdal.GetDriverByName('GTiff')
+        outRaster = driver.Create(summary_file, self.cols, self.rows, len(SUMMARY_BANDS), gdal.GDT_Int32,
+                                  ["COMPRESS=LZW", "PREDICTOR=2", "TILED=YES"])
+        for nband, name in enumerate(SUMMARY_BANDS):
+            outband = outRaster.GetRasterBand(nband + 1)
+            outband.SetDescription(name)
+            outband.WriteArray(self.accumulators[name])
+            outband = None
+        if self.last_date is not None:
+            outRaster.SetMetadataItem('LAST_DATE', self.last_date)
+        outRaster.SetGeoTransform(geotransform)
+        outRaster.SetProjection(projection)
+        outRaster = None
+
+    def close(self):
+        """Delete the memmap files of the accumulators
+        """
+        self.accumulators = {}
+        shutil.rmtree(self.tmp_folder, ignore_errors=True)
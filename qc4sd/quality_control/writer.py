@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from joblib import load
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+# creation options of the output files (GTiff)
+OUTPUT_OPTIONS = ["COMPRESS=LZW", "PREDICTOR=2", "TILED=YES"]
+# size of the blocks (tiles) of the output files, for the sources of the VRT
+OUTPUT_BLOCK_SIZE = 256
+
+
+class DatesWriter:
+    """Writers of the output files per date (dates layout), each date is
+    written as soon as it is processed in a pool of threads (GDAL releases
+    the GIL while compress and write) while the next date is processed,
+    the pool is shared for all groups and bands of the run.
+    """
+
+    def __init__(self, n_writers):
+        self.n_writers = n_writers
+        self.executor = ThreadPoolExecutor(max_workers=n_writers)
+
+    def submit(self, date_file, date, mmap_raster, nodata_value, output_properties):
+        """Write the raster checked of the date in its own file in a thread
+
+        :param date_file: output file of the date
+        :type date_file: path
+        :param date: date (year and jday) of the raster
+        :type date: str
+        :param mmap_raster: memmap file of the raster checked, removed after write it
+        :type mmap_raster: path
+        :param nodata_value: NoData value of the raster
+        :type nodata_value: int
+        :param output_properties: geotransform, projection and data type of the output
+        :type output_properties: tuple
+        :return: the write in progress
+        :rtype: Future
+        """
+        return self.executor.submit(write_date_file, date_file, date, mmap_raster, nodata_value,
+                                    output_properties)
+
+    def close(self):
+        """Wait all writes and stop the threads
+        """
+        self.executor.shutdown(wait=True)
+
+
+def write_date_file(date_file, date, mmap_raster, nodata_value, output_properties):
+    """Write the raster checked of one date in a GTiff file, it is written
+    in a hidden file and renamed at the end, then the file of the date only
+    exists when it is complete
+
+    :param date_file: output file of the date
+    :type date_file: path
+    :param date: date (year and jday) of the raster
+    :type date: str
+    :param mmap_raster: memmap file of the raster checked, removed after write it
+    :type mmap_raster: path
+    :param nodata_value: NoData value of the raster
+    :type nodata_value: int
+    :param output_properties: geotransform, projection and data type of the output
+    :type output_properties: tuple
+    """
+    geotransform, projection, data_type = output_properties
+    tmp_file = os.path.join(os.path.dirname(date_file), "." + os.path.basename(date_file))
+    # load result raster saved in file with memmap (joblib dump)
+    data_band_raster = load(mmap_raster, mmap_mode='r')
+    rows, cols = data_band_raster.shape
+
+    driver = gdal.GetDriverByName('GTiff')
+    outRaster = driver.Create(tmp_file, cols, rows, 1, data_type, OUTPUT_OPTIONS)
+    outRaster.SetMetadataItem('DATES', date)
+    outRaster.SetGeoTransform(geotransform)
+    outRaster.SetProjection(projection)
+    outband = outRaster.GetRasterBand(1)
+    outband.SetDescription(date)
+    outband.WriteArray(data_band_raster)
+    outband.SetNoDataValue(nodata_value)
+
+    # clean
+    outband = None
+    outRaster = None
+    del data_band_raster
+    shutil.rmtree(os.path.dirname(mmap_raster))
+    os.replace(tmp_file, date_file)
+
+
+def write_vrt(vrt_file, bands, rows, cols, output_properties, metadata_key, metadata=None):
+    """Write the VRT of the bands sorted by its label (dates or periods), with
+    the labels in the metadata (metadata_key) and as the description of each
+    band, like the output of the stack layout. The XML of the VRT is written
+    directly, without open the source files (only its properties are needed),
+    then append bands costs the same for any number of bands. It is written
+    in a hidden file and renamed at the end.
+
+    :param vrt_file: VRT file
+    :type vrt_file: path
+    :param bands: bands as (label, source file, band of the source file, NoData value)
+    :type bands: list
+    :param output_properties: geotransform, projection and data type of the output
+    :type output_properties: tuple
+    :param metadata_key: metadata item for the labels of the bands
+    :type metadata_key: str
+    :param metadata: other metadata items of the VRT
+    :type metadata: dict
+    """
+    geotransform, projection, data_type = output_properties
+    data_type_name = gdal.GetDataTypeName(data_type)
+    vrt_dir = os.path.dirname(os.path.abspath(vrt_file))
+    bands = sorted(bands, key=lambda band: band[0])
+
+    vrt = ET.Element('VRTDataset', rasterXSize=str(cols), rasterYSize=str(rows))
+    ET.SubElement(vrt, 'SRS').text = projection
+    ET.SubElement(vrt, 'GeoTransform').text = ', '.join([repr(float(value)) for value in geotransform])
+    vrt_metadata = ET.SubElement(vrt, 'Metadata')
+    ET.SubElement(vrt_metadata, 'MDI', key=metadata_key).text = ','.join([label for label, _, _, _ in bands])
+    for key, value in (metadata or {}).items():
+        ET.SubElement(vrt_metadata, 'MDI', key=key).text = value
+
+    for nband, (label, source_file, source_band, nodata_value) in enumerate(bands):
+        vrt_band = ET.SubElement(vrt, 'VRTRasterBand', dataType=data_type_name, band=str(nband + 1))
+        ET.SubElement(vrt_band, 'Description').text = label
+        if nodata_value is not None:
+            ET.SubElement(vrt_band, 'NoDataValue').text = repr(float(nodata_value))
+        source = ET.SubElement(vrt_band, 'SimpleSource')
+        # the sources in the directory of the VRT are relative, the outputs can be moved
+        if os.path.dirname(os.path.abspath(source_file)) == vrt_dir:
+            ET.SubElement(source, 'SourceFilename', relativeToVRT='1').text = os.path.basename(source_file)
+        else:
+            ET.SubElement(source, 'SourceFilename', relativeToVRT='0').text = os.path.abspath(source_file)
+        ET.SubElement(source, 'SourceBand').text = str(source_band)
+        ET.SubElement(source, 'SourceProperties', RasterXSize=str(cols), RasterYSize=str(rows),
+                      DataType=data_type_name, BlockXSize=str(OUTPUT_BLOCK_SIZE), BlockYSize=str(OUTPUT_BLOCK_SIZE))
+        ET.SubElement(source, 'SrcRect', xOff='0', yOff='0', xSize=str(cols), ySize=str(rows))
+        ET.SubElement(source, 'DstRect', xOff='0', yOff='0', xSize=str(cols), ySize=str(rows))
+
+    tmp_file = os.path.join(vrt_dir, "." + os.path.basename(vrt_file))
+    ET.ElementTree(vrt).write(tmp_file)
+    os.replace(tmp_file, vrt_file)
+
+
+def read_vrt_bands(vrt_file):
+    """Return the bands of the VRT (see write_vrt) as (label, source file,
+    band of the source file, NoData value), reading only the XML of the VRT
+    without open the source files
+
+    :param vrt_file: VRT file
+    :type vrt_file: path
+    :return: bands of the VRT or None if not exist
+    :rtype: list
+    """
+    if not os.path.isfile(vrt_file):
+        return None
+    bands = []
+    for vrt_band in ET.parse(vrt_file).getroot().iter('VRTRasterBand'):
+        source = vrt_band.find('SimpleSource')
+        if source is None:
+            source = vrt_band.find('ComplexSource')
+        source_filename = source.find('SourceFilename')
+        source_file = source_filename.text
+        if source_filename.get('relativeToVRT') == '1':
+            source_file = os.path.join(os.path.dirname(vrt_file), source_file)
+        nodata_value = vrt_band.findtext('NoDataValue')
+        bands.append((vrt_band.findtext('Description'), source_file, int(source.findtext('SourceBand')),
+                      float(nodata_value) if nodata_value is not None else None))
+    return bands
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import csv
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from qc4sd.cache import file_identity
+
+# value for the pixels outside of all zones
+ZONES_NODATA = -1
+# columns of the file of zonal statistics, one row for each date, zone, quality
+# control band and flag, the totals of the zone are saved without quality control band
+ZONAL_STATISTICS_FIELDS = ['date', 'zone', 'qc_band', 'flag', 'pixels']
+ZONAL_STATISTICS_TOTALS = ['total_pixels', 'total_invalid_pixels', 'nodata_pixels']
+
+
+class Zones:
+    """Zones for the statistics of invalid pixels by zone (i.e. departments
+    or forest regions), from a raster of labels or a vector layer of polygons.
+    The zones are rasterized (or resampled) once for each grid of the data
+    band (tile and resolution) and cached in files as the index of the zone
+    for each pixel, the pixels outside of all zones have the last index.
+    """
+
+    def __init__(self, zones_file, field=None, cache_dir=None):
+        if not os.path.isfile(zones_file):
+            raise FileNotFoundError("The zones file {0} not exist.".format(zones_file))
+        self.zones_file = zones_file
+        # field of the vector layer with the label of the zones, if it is
+        # not set the label is the feature id
+        self.field = field
+        # without cache dir the zones are saved in a temporal dir for this run
+        self.temporal_cache = cache_dir is None
+        self.cache_dir = tempfile.mkdtemp() if cache_dir is None else cache_dir
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # zones loaded for each grid
+        self.grids = {}
+
+    def get(self, sd, band):
+        """Return the index of the zone for each pixel of the data band
+        (memmap) and the labels of the zones, in the grid of the data band
+        of the satellite data.
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :param band: band to process
+        :type band: int
+        :return: index of the zone for each pixel and labels of the zones
+        :rtype: tuple
+        """
+        geotransform, projection, cols, rows = get_grid(sd, band)
+        grid = [file_identity(self.zones_file), str(self.field), repr(geotransform), projection, str(cols), str(rows)]
+        key = hashlib.sha1('|'.join(grid).encode('utf-8')).hexdigest()
+        if key in self.grids:
+            return self.grids[key]
+
+        zones_index_file = os.path.join(self.cache_dir, 'zones_' + key + '.npy')
+        labels_file = os.path.join(self.cache_dir, 'zones_' + key + '_labels.npy')
+        if not (os.path.isfile(zones_index_file) and os.path.isfile(labels_file)):
+            zones_raster = rasterize(self.zones_file, geotransform, projection, cols, rows, self.field)
+            inside = zones_raster != ZONES_NODATA
+            labels = np.unique(zones_raster[inside])
+            zones_index = np.full(zones_raster.shape, len(labels), dtype=np.int32)
+            zones_index[inside] = np.searchsorted(labels, zones_raster[inside])
+            del zones_raster, inside
+            for array, npy_file in ((labels, labels_file), (zones_index, zones_index_file)):
+                save_array(array, npy_file)
+            del zones_index
+
+        self.grids[key] = (np.load(zones_index_file, mmap_mode='r'), np.load(labels_file))
+        return self.grids[key]
+
+    def close(self):
+        """Delete the zones of the temporal cache
+        """
+        self.grids = {}
+        if self.temporal_cache:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def get_grid(sd, band):
+    """Return the grid of the data band of the satellite data as
+    (geotransform, projection, columns, rows)
+
+    :param sd: satellite data
+    :type sd: SatelliteData
+    :param band: band to process
+    :type band: int
+    :rtype: tuple
+    """
+    gdal_data_band = gdal.Open(sd.get_data_band_name(band), gdal.GA_ReadOnly)
+    geotransform = gdal_data_band.GetGeoTransform()
+    projection = gdal_data_band.GetProjectionRef()
+    cols, rows = gdal_data_band.RasterXSize, gdal_data_band.RasterYSize
+    del gdal_data_band
+    return geotransform, projection, cols, rows
+
+
+def rasterize(layer_file, geotransform, projection, cols, rows, field=None, burn_value=None):
+    """Rasterize the vector layer or resample the raster in the grid,
+    with nearest neighbour. The polygons are burned with the value of the
+    field, the burn value or the feature id.
+
+    :param layer_file: raster or vector file
+    :type layer_file: str
+    :param field: field of the vector layer with the values to burn
+    :type field: str
+    :param burn_value: value to burn for all polygons of the vector layer
+    :type burn_value: int
+    :return: value for each pixel, ZONES_NODATA outside of all polygons or NoData of the raster
+    :rtype: ndarray
+    """
+    driver = gdal.GetDriverByName('MEM')
+    grid_dataset = driver.Create('', cols, rows, 1, gdal.GDT_Int32)
+    grid_dataset.SetGeoTransform(geotransform)
+    grid_dataset.SetProjection(projection)
+    grid_dataset.GetRasterBand(1).SetNoDataValue(ZONES_NODATA)
+    grid_dataset.GetRasterBand(1).Fill(ZONES_NODATA)
+
+    layer_dataset = gdal.OpenEx(layer_file, gdal.OF_VECTOR | gdal.OF_RASTER)
+    if layer_dataset is None:
+        raise IOError("The file {0} is not a raster or vector file supported.".format(layer_file))
+    if layer_dataset.GetLayerCount() > 0:
+        if field is not None:
+            gdal.Rasterize(grid_dataset, layer_dataset, attribute=field)
+        elif burn_value is not None:
+            gdal.Rasterize(grid_dataset, layer_dataset, burnValues=[burn_value])
+        else:
+            layer_name = layer_dataset.GetLayer(0).GetName()
+            gdal.Rasterize(grid_dataset, layer_dataset, attribute='zone',
+                           SQLStatement='SELECT FID AS zone FROM "{0}"'.format(layer_name))
+    else:
+        gdal.Warp(grid_dataset, layer_dataset, resampleAlg='near')
+    del layer_dataset
+
+    raster = grid_dataset.GetRasterBand(1).ReadAsArray()
+    del grid_dataset
+    return raster
+
+
+def save_array(array, npy_file):
+    """Save the array in the npy file, written in a temporal file and
+    moved for don't leave corrupted files
+
+    :param array: array to save
+    :type array: ndarray
+    :param npy_file: npy file
+    :type npy_file: str
+    """
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(npy_file), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        np.save(tmp, array)
+    os.replace(tmp_file, npy_file)
+
+
+def merge_zonal_statistics(a, b):
+    """Merge and sums the counts by zone (arrays) of the zonal
+    statistics 'a' and 'b' with the same structure of the statistics
+
+    :rtype: dict
+    """
+    merged = dict(a)
+    for k, v in b.items():
+        if isinstance(v, dict):
+            merged[k] = merge_zonal_statistics(a.get(k, {}), v)
+        else:
+            merged[k] = a[k] + v if k in a else v
+    return merged
+
+
+def write_zonal_statistics(stats_file, date, zonal_statistics, labels):
+    """Append the statistics of invalid pixels by zone of one date (satellite
+    data) in the file of zonal statistics (csv), the file is created with the
+    header if not exist. The zones without pixels in the tile and the flags
+    without invalid pixels in the zone are not saved.
+
+    :param stats_file: file of zonal statistics (csv)
+    :type stats_file: str
+    :param date: date of the satellite data (year and jday)
+    :type date: str
+    :param zonal_statistics: counts by zone index of the satellite data
+    :type zonal_statistics: dict
+    :param labels: labels of the zones
+    :type labels: ndarray
+    """
+    new_file = not os.path.isfile(stats_file)
+    with open(stats_file, 'a', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        if new_file:
+            writer.writerow(ZONAL_STATISTICS_FIELDS)
+        for zone_index, zone in enumerate(labels.tolist()):
+            if zonal_statistics['total_pixels'][zone_index] == 0:
+                continue
+            for total in ZONAL_STATISTICS_TOTALS:
+                writer.writerow([date, zone, '', total, int(zonal_statistics[total][zone_index])])
+            for qc_band, qc_invalid_pixels in sorted(zonal_statistics['invalid_pixels'].items()):
+                for flag, pixels in sorted(qc_invalid_pixels.items()):
+                    if pixels[zone_index] > 0:
+                        writer.writerow([date, zone, qc_band, flag, int(pixels[zone_index])])
@@ -5,16 +5,112 @@
 #  Authors: Xavier Corredor Llano
 #  Email: xcorredorl at ideam.gov.co
 
-# for future implementation
+import os
+import xml.etree.ElementTree as ET
+from datetime import date
 
+from qc4sd.lib import fix_zeros
 from qc4sd.satellite_data.satellite_data import SatelliteData
+from qc4sd.quality_control.landsat import LandsatQC
+from qc4sd.quality_control.landsat.products import get_product
 
+# fill value of the surface reflectance and surface temperature bands of Collection 2
+LANDSAT_C2_FILL = 0
 
-class LandsatFile(SatelliteData):
 
-    def __init__(self, file):
-        super().__init__()
-        self.file = file
+def get_band_files(file, tree):
+    """Return the files of the bands (data and quality control bands) by
+    its tag in the metadata, in the directory of the metadata file (MTL)
 
-    def load(self):
-        pass
+    :param file: path to the metadata file (MTL xml)
+    :type file: str
+    :param tree: metadata parsed of the metadata file
+    :type tree: ElementTree
+    :rtype: dict
+    """
+    directory = os.path.dirname(os.path.abspath(file))
+    return dict((element.tag, os.path.join(directory, element.text))
+                for product_contents in tree.iter('PRODUCT_CONTENTS') for element in product_contents
+                if element.tag.startswith('FILE_NAME_BAND_') or element.tag.startswith('FILE_NAME_QUALITY_'))
+
+
+class Landsat(SatelliteData):
+
+    def __init__(self, file, xml_file):
+        """Initialize the class of Landsat Collection 2 Level-2 products,
+        the file to process is the metadata file (MTL) of the scene, with
+        the bands (GeoTIFF) in the same directory
+
+        :param xml_file: path to the metadata file (MTL xml)
+        :type xml_file: str
+        :param file: path to the metadata file (MTL xml)
+        :type file: str
+        """
+        super().__init__(file)
+
+        # load metadata
+        tree = ET.parse(xml_file)
+        self.satellite = list(tree.iter('SPACECRAFT_ID'))[0].text  # LANDSAT_8
+        product_id = list(tree.iter('LANDSAT_PRODUCT_ID'))[0].text  # LC08_L2SP_008058_20200105_20200824_02_T1
+        self.shortname = '_'.join(product_id.split('_')[0:2])  # LC08_L2SP
+        # product registered for the short name (see products)
+        self.product = get_product(self.shortname)
+        # path and row (ie 008058)
+        self.tile = fix_zeros(int(list(tree.iter('WRS_PATH'))[0].text), 3) + \
+            fix_zeros(int(list(tree.iter('WRS_ROW'))[0].text), 3)
+        # get the acquisition date
+        dt_d = [int(x) for x in list(tree.iter('DATE_ACQUIRED'))[0].text.split('-')]
+        self.start_date = date(dt_d[0], dt_d[1], dt_d[2])
+        # calculate Julian date of the acquisition date
+        self.start_jday = self.start_date.timetuple().tm_yday
+        # year and jday (ie 2015034)
+        self.start_year_and_jday = "{0}{1}".format(self.start_date.year, fix_zeros(self.start_jday, 3))
+
+        # files of the bands by its tag in the metadata, in the directory of the metadata file
+        self.band_files = get_band_files(file, tree)
+        # the data bands are used for the cache of the results
+        self.source_files += sorted(band_file for file_tag, band_file in self.band_files.items()
+                                    if file_tag.startswith('FILE_NAME_BAND_') and os.path.isfile(band_file))
+
+        qc_success_set = self.set_quality_control_bands()
+        self.make_qc = qc_success_set
+
+        del tree
+
+    def set_quality_control_bands(self):
+        """Create all quality control bands class (LandsatQC)
+        based on the product registered for the short name. Create
+        one Landsat quality control (LandsatQC) for each quality
+        control band (QA_PIXEL and QA_RADSAT) of this satellite data.
+        """
+
+        self.qc_bands = {}
+        for qc_band in self.product.qc_bands.values():
+            qc_name = self.band_files.get(qc_band.file_tag)
+            if qc_name is None or not os.path.isfile(qc_name):
+                print("\nFile not found {0}. For make the quality control of {1} you need have "
+                      "the {2} file. Not be held the QC4SD for the file {3}".format(
+                       qc_name, self.shortname, qc_band.file_tag, self.file_name))
+                return False
+            self.qc_bands[qc_band.id_name] = LandsatQC(self.shortname, qc_band.id_name, qc_name)
+            # the quality control bands are used for the cache of the results
+            self.source_files.append(qc_name)
+        return True
+
+    def get_data_band_name(self, band):
+        """Return the file of the data band, the surface reflectance
+        bands (SR_B1 to SR_B7) or the surface temperature (ST_B10)
+
+        :param band: band to process
+        :type band: int
+        :rtype: str
+        """
+        for file_tag in ('FILE_NAME_BAND_{0}'.format(band), 'FILE_NAME_BAND_ST_B{0}'.format(band)):
+            if file_tag in self.band_files:
+                return self.band_files[file_tag]
+        raise ValueError("The band {0} not exist in the product {1}".format(band, self.shortname))
+
+    def get_nodata_value(self, band):
+        nodata_value = super().get_nodata_value(band)
+        # the fill value of Collection 2 if it is not set in the GeoTIFF
+        return nodata_value if nodata_value is not None else LANDSAT_C2_FILL
@@ -16,6 +16,7 @@ except ImportError:
 from qc4sd.lib import fix_zeros
 from qc4sd.satellite_data.satellite_data import SatelliteData
 from qc4sd.quality_control.modis import ModisQC
+from qc4sd.quality_control.modis.products import get_product
 
 
 class MODIS(SatelliteData):
@@ -28,13 +29,14 @@ class MODIS(SatelliteData):
         :param file: path to input file
         :type file: str
         """
-        super().list.append(self)
         super().__init__(file)
 
         # load metadata
         tree = ET.parse(xml_file)
         self.satellite = list(tree.iter('PlatformShortName'))[0].text  # Terra
         self.shortname = list(tree.iter('ShortName'))[0].text  # MOD09A1
+        # product registered for the short name (see products)
+        self.product = get_product(self.shortname)
         self.tile = list(tree.iter('LocalGranuleID'))[0].text.split('.')[2]  # h10v07
         # get the beginning date
         dt_d = [int(x) for x in list(tree.iter('RangeBeginningDate'))[0].text.split('-')]
@@ -44,11 +46,6 @@ class MODIS(SatelliteData):
         # year and jday (ie 2015034), equal to filename string
         self.start_year_and_jday = "{0}{1}".format(self.start_date.year, fix_zeros(self.start_jday, 3))
 
-        # save in globals vars of class
-        SatelliteData.satellite = self.satellite
-        SatelliteData.shortname = self.shortname
-        SatelliteData.tile = self.tile
-
         qc_success_set = self.set_quality_control_bands()
         self.make_qc = qc_success_set
 
@@ -56,126 +53,67 @@ class MODIS(SatelliteData):
 
     def set_quality_control_bands(self):
         """Create all quality control bands class (ModisQC)
-        based on the type of MODIS products. Create one
-        Modis quality control (ModisQC) for each quality
+        based on the product registered for the short name. Create
+        one Modis quality control (ModisQC) for each quality
         control band of this satellite data instance.
         """
 
         self.qc_bands = {}
-
-        # for MOD09/MYD09 A1 (Collection 6)
-        if self.shortname in ['MOD09A1', 'MYD09A1']:
-            # define numbers of bits for the band value in binary
-
-            # Reflectance band quality
-            qc_name = [x for x in self.sub_datasets if '_qc_' in x[1]][0][0]
-            self.qc_bands['rbq'] = ModisQC(self.shortname, 'rbq', qc_name, num_bits=32)
-            # Solar Zenith Angle
-            qc_name = [x for x in self.sub_datasets if 'szen' in x[1]][0][0]
-            self.qc_bands['sza'] = ModisQC(self.shortname, 'sza', qc_name)
-            # View/Sensor Zenith Angle
-            qc_name = [x for x in self.sub_datasets if 'vzen' in x[1]][0][0]
-            self.qc_bands['vza'] = ModisQC(self.shortname, 'vza', qc_name)
-            # Relative Zenith Angle
-            qc_name = [x for x in self.sub_datasets if 'raz' in x[1]][0][0]
-            self.qc_bands['rza'] = ModisQC(self.shortname, 'rza', qc_name)
-            # Reflectance State QA flags
-            qc_name = [x for x in self.sub_datasets if '_state_' in x[1]][0][0]
-            self.qc_bands['sf'] = ModisQC(self.shortname, 'sf', qc_name, num_bits=16)
-
-        # for MOD09/MYD09 Q1 (Collection 6)
-        if self.shortname in ['MOD09Q1', 'MYD09Q1']:
-            # Reflectance State QA flags
-            qc_name = [x for x in self.sub_datasets if '_state_' in x[1]][0][0]
-            self.qc_bands['sf'] = ModisQC(self.shortname, 'sf', qc_name, num_bits=16)
-            # Reflectance band quality
-            qc_name = [x for x in self.sub_datasets if '_qc_' in x[1]][0][0]
-            self.qc_bands['rbq'] = ModisQC(self.shortname, 'rbq', qc_name, num_bits=16)
-
-        # for MOD09/MYD09 GA (Collection 6)
-        if self.shortname in ['MOD09GA', 'MYD09GA']:
-            # Reflectance band quality
-            qc_name = [x for x in self.sub_datasets if 'QC_500m' in x[1]][0][0]
-            self.qc_bands['rbq'] = ModisQC(self.shortname, 'rbq', qc_name, num_bits=32)
-            # Reflectance State QA flags at 1km
-            qc_name = [x for x in self.sub_datasets if 'state_1km' in x[1]][0][0]
-            self.qc_bands['sf'] = ModisQC(self.shortname, 'sf', qc_name, num_bits=16, scale_resolution=0.5)
-            # Solar Zenith Angle at 1km
-            qc_name = [x for x in self.sub_datasets if 'SolarZenith' in x[1]][0][0]
-            self.qc_bands['sza'] = ModisQC(self.shortname, 'sza', qc_name, scale_resolution=0.5)
-            # View/Sensor Zenith Angle at 1km
-            qc_name = [x for x in self.sub_datasets if 'SensorZenith' in x[1]][0][0]
-            self.qc_bands['vza'] = ModisQC(self.shortname, 'vza', qc_name, scale_resolution=0.5)
-
-        # for MOD09/MYD09 GQ (Collection 6)
-        if self.shortname in ['MOD09GQ', 'MYD09GQ']:
-            # open datasets from MXD09GA for get some QC in this file
-            mxd09ga_file = os.path.abspath(self.file).replace('D09GQ', 'D09GA')
-            if not os.path.isfile(mxd09ga_file):
-                for file in os.listdir(os.path.dirname(mxd09ga_file)):
-                    # check is the file exists but ending with different number
-                    # i.e. MOD09GQ.A2016065.h10v08.006.2016103070427.hdf -> MOD09GA.A2016065.h10v08.006.2016103070428.hdf
-                    if file.endswith(".hdf") and file.startswith('.'.join(os.path.basename(mxd09ga_file).split('.')[0:-2])):
-                        mxd09ga_file = os.path.join(os.path.dirname(mxd09ga_file), file)
-                if not os.path.isfile(mxd09ga_file):
-                    print("\nFile not found {0}. For make the quality control of MXD09GQ "\
-                          "you need have MXD09GA files. Not be held the QC4SD for the file {1}".
-                          format(mxd09ga_file, os.path.basename(self.file)))
-                    return False
-            gdal_dataset = gdal.Open(mxd09ga_file, gdal.GA_ReadOnly)
-            mxd09ga_sub_datasets = gdal_dataset.GetSubDatasets()
-            del gdal_dataset
-            # Reflectance band quality
-            qc_name = [x for x in self.sub_datasets if 'QC_250m' in x[1]][0][0]
-            self.qc_bands['rbq'] = ModisQC(self.shortname, 'rbq', qc_name, num_bits=16)
-            # Reflectance State QA flags from MXD09GA at 1km
-            qc_name = [x for x in mxd09ga_sub_datasets if 'state_1km' in x[1]][0][0]
-            self.qc_bands['sf'] = ModisQC(self.shortname, 'sf', qc_name, num_bits=16, scale_resolution=0.25)
-            # Solar Zenith Angle at 1km
-            qc_name = [x for x in mxd09ga_sub_datasets if 'SolarZenith' in x[1]][0][0]
-            self.qc_bands['sza'] = ModisQC(self.shortname, 'sza', qc_name, scale_resolution=0.25)
-            # View/Sensor Zenith Angle at 1km
-            qc_name = [x for x in mxd09ga_sub_datasets if 'SensorZenith' in x[1]][0][0]
-            self.qc_bands['vza'] = ModisQC(self.shortname, 'vza', qc_name, scale_resolution=0.25)
+        # subdatasets of the files of other products with quality control bands
+        sources_sub_datasets = {}
+
+        for qc_band in self.product.qc_bands.values():
+            if qc_band.source is None:
+                sub_datasets = self.sub_datasets
+            else:
+                if qc_band.source not in sources_sub_datasets:
+                    source_file = self.get_source_file(qc_band.source)
+                    if source_file is None:
+                        return False
+                    self.source_files.append(source_file)
+                    gdal_dataset = gdal.Open(source_file, gdal.GA_ReadOnly)
+                    sources_sub_datasets[qc_band.source] = gdal_dataset.GetSubDatasets()
+                    del gdal_dataset
+                sub_datasets = sources_sub_datasets[qc_band.source]
+            qc_name = [x for x in sub_datasets if qc_band.pattern in x[1]][0][0]
+            self.qc_bands[qc_band.id_name] = ModisQC(self.shortname, qc_band.id_name, qc_name,
+                                                     scale_resolution=qc_band.scale_resolution)
         return True
 
-    def get_data_band(self, band):
-        """Return the raster of the data band for respective band
-        of the file.
+    def get_source_file(self, source):
+        """Return the file of other product of the same date and tile with
+        quality control bands for this file (i.e. MXD09GA for MXD09GQ), or
+        None if the file not exist.
+
+        :param source: section of the other product, i.e. MXD09GA
+        :type source: str
+        :rtype: str
+        """
+        source_file = os.path.abspath(self.file).replace(self.product.section[2:], source[2:])
+        if not os.path.isfile(source_file):
+            for file in os.listdir(os.path.dirname(source_file)):
+                # check is the file exists but ending with different number
+                # i.e. MOD09GQ.A2016065.h10v08.006.2016103070427.hdf -> MOD09GA.A2016065.h10v08.006.2016103070428.hdf
+                if file.endswith(".hdf") and file.startswith('.'.join(os.path.basename(source_file).split('.')[0:-2])):
+                    source_file = os.path.join(os.path.dirname(source_file), file)
+            if not os.path.isfile(source_file):
+                print("\nFile not found {0}. For make the quality control of {1} "\
+                      "you need have {2} files. Not be held the QC4SD for the file {3}".
+                      format(source_file, self.product.section, source, os.path.basename(self.file)))
+                return None
+        return source_file
+
+    def get_data_band_name(self, band):
+        """Return the name of the subdataset of the data band
 
         :param band: band to process
         :type band: int
-        :return: raster of the data band
-        :rtype: ndarray
+        :rtype: str
         """
 
         # TODO: optimize/performance the table open/access in memory (pytables?)
 
-        data_band_name = [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        data_band_raster = gdal_data_band.ReadAsArray()
-        del gdal_data_band
-        return data_band_raster
-
-    def get_cols(self, band):
-        data_band_name = [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        return gdal_data_band.RasterXSize
-
-    def get_rows(self, band):
-        data_band_name = [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        return gdal_data_band.RasterYSize
-
-    def get_total_pixels(self, band):
-        data_band_name = [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        return gdal_data_band.RasterXSize*gdal_data_band.RasterYSize
-
-    def get_nodata_value(self, band):
-        data_band_name = [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
-        gdal_data_band = gdal.Open(data_band_name, gdal.GA_ReadOnly)
-        return gdal_data_band.GetRasterBand(1).GetNoDataValue()
+        return [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
 
     def get_quality_control_bands(self, band):
-        return [x for x in self.sub_datasets if 'b'+fix_zeros(band, 2) in x[1]][0][0]
+        return self.get_data_band_name(band)
@@ -20,26 +20,111 @@ class SatelliteData:
     Modis or Landsat
     """
 
-    # static fields (globals)
-    satellite = None
-    shortname = None
-    tile = None
-
-    # save all instances
-    list = []
-
     def __init__(self, file):
         self.satellite_instrument = self.__class__.__name__
         self.file = file
         self.file_name = os.path.basename(file)
+        # all input files used for the quality control of this satellite data
+        self.source_files = [file]
 
+        # the files without subdatasets (i.e. the metadata file of Landsat) has not subdatasets
         gdal_dataset = gdal.Open(file, gdal.GA_ReadOnly)
-        self.sub_datasets = gdal_dataset.GetSubDatasets()
+        self.sub_datasets = gdal_dataset.GetSubDatasets() if gdal_dataset is not None else []
         del gdal_dataset
 
     def __str__(self):
         return self.file_name
 
+    def get_data_band_name(self, band):
+        """Return the name (file or subdataset) of the data band to
+        open with gdal, defined for each satellite data
+
+        :param band: band to process
+        :type band: int
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def get_data_band(self, band, window=None):
+        """Return the raster of the data band for respective band
+        of the file, only the window if it is set.
+
+        :param band: band to process
+        :type band: int
+        :param window: window in pixels (xoff, yoff, xsize, ysize) or None for all
+        :type window: Window
+        :return: raster of the data band
+        :rtype: ndarray
+        """
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        if window is None:
+            data_band_raster = gdal_data_band.ReadAsArray()
+        else:
+            data_band_raster = gdal_data_band.ReadAsArray(*window)
+        del gdal_data_band
+        return data_band_raster
+
+    def get_cols(self, band):
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        return gdal_data_band.RasterXSize
+
+    def get_rows(self, band):
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        return gdal_data_band.RasterYSize
+
+    def get_total_pixels(self, band):
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        return gdal_data_band.RasterXSize*gdal_data_band.RasterYSize
+
+    def get_nbytes(self, band):
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        return gdal_data_band.RasterXSize*gdal_data_band.RasterYSize * \
+            gdal.GetDataTypeSize(gdal_data_band.GetRasterBand(1).DataType) // 8
+
+    def get_nodata_value(self, band):
+        gdal_data_band = gdal.Open(self.get_data_band_name(band), gdal.GA_ReadOnly)
+        return gdal_data_band.GetRasterBand(1).GetNoDataValue()
+
+
+def get_satellite_instrument(tree):
+    """Return the satellite instrument (MODIS or LANDSAT) of the metadata
+    of the satellite data, None if it is not found in the metadata
+
+    :param tree: metadata parsed of the xml file
+    :type tree: ElementTree
+    :rtype: str
+    """
+    if tree.getroot().tag == 'LANDSAT_METADATA_FILE':
+        # metadata file (MTL) of Landsat Collection 2
+        return 'LANDSAT'
+    sensor_short_name = list(tree.iter('SensorShortName'))
+    return sensor_short_name[0].text if sensor_short_name else None
+
+
+def get_files(file, xml_file):
+    """Return all files of the satellite data read for process it: the
+    file to process, its metadata file and, for Landsat, the files of the
+    bands listed in the metadata file (MTL). Raise ET.ParseError if the
+    metadata file is incomplete and NotImplementedError if it is not of
+    a satellite data supported.
+
+    :param file: input file
+    :type file: str
+    :param xml_file: input xml file
+    :type xml_file: str
+    :rtype: list
+    """
+    tree = ET.parse(xml_file)
+    satellite_instrument = get_satellite_instrument(tree)
+
+    if satellite_instrument == 'MODIS':
+        return sorted({file, xml_file})
+    elif satellite_instrument == 'LANDSAT':
+        from qc4sd.satellite_data.landsat import get_band_files
+        return sorted({file, xml_file} | set(get_band_files(file, tree).values()))
+    else:
+        raise NotImplementedError("Product {0} not implemented or not supported".format(satellite_instrument))
+
 
 def new(file, xml_file):
     """Create new instance of child of SatelliteData class
@@ -53,20 +138,41 @@ def new(file, xml_file):
     """
 
     tree = ET.parse(xml_file)
-    satellite_instrument = list(tree.iter('SensorShortName'))[0].text
+    satellite_instrument = get_satellite_instrument(tree)
     del tree
 
     if satellite_instrument == 'MODIS':
         from qc4sd.satellite_data.modis import MODIS
-        MODIS(file, xml_file)
+        return MODIS(file, xml_file)
     elif satellite_instrument == 'LANDSAT':
-        pass
+        from qc4sd.satellite_data.landsat import Landsat
+        return Landsat(file, xml_file)
     else:
         raise NotImplementedError("Product {0} not implemented or not supported".format(satellite_instrument))
 
 
+def group_satellite_data(sd_list):
+    """Group the satellite data by platform, product and tile, each
+    group is processed and saved in its own output, the satellite data
+    in each group are sorted chronologically by date.
+
+    :param sd_list: satellite data instances
+    :type sd_list: list
+    :return: satellite data grouped by (platform, product, tile)
+    :rtype: dict
+    """
+    groups = {}
+    for sd in sd_list:
+        groups.setdefault((sd.satellite, sd.shortname, sd.tile), []).append(sd)
+    return dict((key, sorted(groups[key], key=lambda sd: sd.start_date)) for key in sorted(groups))
+
+
 def load_satellite_data(config_run):
-    """Read and load all satellite data from files
+    """Read and load all satellite data from files, the files can
+    be of different platforms, products and tiles.
+
+    :return: satellite data grouped by (platform, product, tile)
+    :rtype: dict
     """
 
     # check number of files
@@ -74,25 +180,10 @@ def load_satellite_data(config_run):
         raise ValueError("Not files to process")
 
     # create new instances of satellite data
-
+    sd_list = []
     for file, xml_file in zip(config_run['files'], config_run['xml_files']):
-        new(file, xml_file)
-
-    def check():
-        # check all files are the same platform (and satellite),
-        # are from same instrument and are in the same tile
-
-        satellite = [sd.satellite for sd in SatelliteData.list]
-        if not all(x == satellite[0] for x in satellite):
-            raise ValueError("All files aren't in the same platform")
-
-        subproduct = [sd.shortname for sd in SatelliteData.list]
-        if not all(x == subproduct[0] for x in subproduct):
-            raise ValueError("All files aren't the same type of subproduct")
+        sd_list.append(new(file, xml_file))
 
-        tile = [sd.tile for sd in SatelliteData.list]
-        if not all(x == tile[0] for x in tile):
-            raise ValueError("All files aren't in the same tile")
-    check()
+    return group_satellite_data(sd_list)
 
 
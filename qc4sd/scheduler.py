@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import re
+import sys
+import resource
+from math import ceil, floor
+
+# approximate resident memory of one worker process without data
+# (python interpreter, numpy, gdal and joblib loaded)
+WORKER_OVERHEAD = 100 * 1024**2
+
+MEMORY_UNITS = {'': 1024**2, 'B': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+
+def parse_memory_size(size):
+    """Convert a memory size to bytes, the size can be an integer
+    in bytes or a string with the units suffix (K, M, G or T), a
+    string without units is interpreted as megabytes.
+
+        >>> parse_memory_size('4G')
+        4294967296
+        >>> parse_memory_size('512')
+        536870912
+
+    :param size: memory size
+    :type size: int or str
+    :return: memory size in bytes
+    :rtype: int
+    """
+    if isinstance(size, int):
+        return size
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([BKMGT]?)i?B?\s*$', str(size), re.IGNORECASE)
+    if match is None:
+        raise ValueError("Incorrect format for memory size '{0}', this should be a"
+                         " number with units, e.g. 4G or 512M".format(size))
+    value, unit = match.groups()
+    return int(float(value) * MEMORY_UNITS[unit.upper()])
+
+
+def format_memory_size(nbytes):
+    """Human readable memory size in MiB
+
+    :rtype: str
+    """
+    return "{0:.0f}MiB".format(nbytes / 1024**2)
+
+
+def default_rows_per_chunk(n_rows, n_processes):
+    """Number of rows for each chunk (task) to process, this divide
+    the rows in evenly sized chunks for all processes with around
+    of 1000 rows for each process.
+
+    :param n_rows: number of rows of the raster
+    :type n_rows: int
+    :param n_processes: number of processes
+    :type n_processes: int
+    :rtype: int
+    """
+    return ceil(n_rows / (n_processes * max(1, floor(n_rows / 1000))))
+
+
+def get_children_peak_memory():
+    """Return the peak of resident memory of the largest child process
+    alive (the workers of the pool) in bytes, read in /proc (Linux), 0
+    if it is not available
+
+    :rtype: int
+    """
+    if not os.path.isdir('/proc'):
+        return 0
+    pid = str(os.getpid())
+    peak = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join('/proc', entry, 'status')) as status_file:
+                status = dict(line.split(':', 1) for line in status_file if ':' in line)
+        except (OSError, ValueError):
+            continue
+        if status.get('PPid', '').strip() == pid and 'VmHWM' in status:
+            peak = max(peak, int(status['VmHWM'].split()[0]) * 1024)
+    return peak
+
+
+def peak_memory():
+    """Return the peak of resident memory reached for this process and
+    the peak of the largest child process (workers) in bytes, for the
+    children alive and finished
+
+    :rtype: tuple
+    """
+    # ru_maxrss is in kilobytes in Linux and bytes in MacOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    parent = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = max(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, get_children_peak_memory())
+    return parent, children
+
+
+class MemoryBudget:
+    """Admission control for the memory used by the process, estimate
+    the footprint of the tasks from raster shape and data type and limit
+    the number of concurrent tasks and the size of chunks to stay within
+    the memory budget.
+    """
+
+    def __init__(self, max_memory):
+        self.max_memory = parse_memory_size(max_memory)
+        self.n_jobs = None
+        self.estimated_peak = 0
+
+    def __str__(self):
+        return format_memory_size(self.max_memory)
+
+    def plan(self, n_rows, fixed_nbytes, row_nbytes, n_processes):
+        """Plan the number of concurrent processes and the rows for each
+        chunk to process one image within the memory budget.
+
+        :param n_rows: number of rows of the data band to process
+        :type n_rows: int
+        :param fixed_nbytes: memory held in the main process for the image
+            (data band and quality control bands) in bytes
+        :type fixed_nbytes: int
+        :param row_nbytes: memory touched by a task for each row of the data band
+            (data band and quality control bands) in bytes
+        :type row_nbytes: int
+        :param n_processes: number of processes requested
+        :type n_processes: int
+        :return: number of processes and rows per chunk
+        :rtype: tuple
+        """
+        available = self.max_memory - fixed_nbytes
+        if available < WORKER_OVERHEAD + row_nbytes:
+            raise MemoryError("The memory budget {0} is too small to process the image, it need"
+                              " at least {1}".format(self, format_memory_size(
+                                  fixed_nbytes + WORKER_OVERHEAD + row_nbytes)))
+
+        # limit the concurrent tasks, each with at least one row to process
+        n_jobs = max(1, min(n_processes, available // (WORKER_OVERHEAD + row_nbytes)))
+        # limit the rows per task with the memory available for each process
+        max_rows = (available - n_jobs * WORKER_OVERHEAD) // (n_jobs * row_nbytes)
+        rows_per_chunk = max(1, min(default_rows_per_chunk(n_rows, n_jobs), max_rows))
+
+        self.n_jobs = n_jobs
+        self.estimated_peak = max(self.estimated_peak,
+                                  fixed_nbytes + n_jobs * (WORKER_OVERHEAD + rows_per_chunk * row_nbytes))
+        return n_jobs, rows_per_chunk
+
+    def report(self):
+        """Message with the peak of memory estimated and the peaks measured
+        in the main process and in the largest worker. The peaks of the
+        workers are not measured at the same time, then the total with
+        all workers is only an upper bound, not a measure.
+        """
+        parent, children = peak_memory()
+        n_jobs = self.n_jobs or 1
+        return "Memory: budget {0}, estimated peak {1}, measured peak main {2}, largest worker {3}" \
+               " (bound with {4} workers {5})".format(
+                   self, format_memory_size(self.estimated_peak), format_memory_size(parent),
+                   format_memory_size(children), n_jobs, format_memory_size(parent + n_jobs * children))
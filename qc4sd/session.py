@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import gc
+import threading
+from multiprocessing import cpu_count
+from joblib import Parallel
+
+from qc4sd.qc4sd import check_quality_control_file, check_bands, check_files, check_output_layout, \
+    get_variant_names, setup_quality_control, get_number_of_processes, iter_process_quality_control
+from qc4sd.quality_control.quality_control import quiet_gdal_errors
+from qc4sd.quality_control.quality_control_file import setup_quality_control_file
+from qc4sd.satellite_data.satellite_data import load_satellite_data
+from qc4sd.scheduler import MemoryBudget
+from qc4sd.cache import ResultCache, FlagCache
+from qc4sd.quality_control.zones import Zones
+from qc4sd.subset import Subset
+from qc4sd.quality_control.mask import Mask
+from qc4sd.quality_control.writer import DatesWriter
+from qc4sd.quality_control.composite import check_composite
+from qc4sd.profiler import Profiler, NO_PROFILER
+from qc4sd.metrics import Metrics
+
+
+class WorkerPool:
+    """Pool of workers (joblib) started once and shared for several sessions
+    that run concurrently in threads of one process. The chunks of one
+    file use all the workers, then the checks of the sessions are submitted
+    in turns, while the read, decode and write of each session (in its
+    thread) run at the same time.
+    """
+
+    def __init__(self, n_jobs=None):
+        """
+        :param n_jobs: number of processes of the pool, None for the number of cpus
+        :type n_jobs: int
+        """
+        self.n_jobs = n_jobs if n_jobs is not None else cpu_count()
+        self.parallel = None
+        self.lock = threading.Lock()
+
+    def __call__(self, tasks):
+        """Check the tasks (joblib delayed) in the workers, the workers
+        are started with the first tasks
+
+        :param tasks: tasks to check
+        :type tasks: iterable
+        :return: the result of each task
+        :rtype: list
+        """
+        with self.lock:
+            if self.parallel is None:
+                self.parallel = Parallel(n_jobs=self.n_jobs)
+                self.parallel.__enter__()
+            return self.parallel(tasks)
+
+    def close(self):
+        """Stop the workers
+        """
+        with self.lock:
+            if self.parallel is not None:
+                self.parallel.__exit__(None, None, None)
+                self.parallel = None
+
+
+class Session:
+    """Session of the quality control that owns its configuration, the
+    satellite data (granules) grouped, the quality control to process
+    (the plan), the pool of workers and the outputs, without global state.
+    Several sessions (i.e. for several tiles) can run concurrently in
+    threads of one warm process sharing the pool of workers (WorkerPool)
+    and the caches (the same cache directory). Each session must be used
+    in the thread that created it (the error handler of GDAL is per thread).
+
+        >>> from qc4sd.session import Session, WorkerPool
+        >>> pool = WorkerPool(8)
+        >>> with Session(settings.ini, 1, output, cache_dir=cache_dir, pool=pool) as session:
+        >>>     session.run([file1, file2])
+    """
+
+    def __init__(self, qcf, bands, output, not_overwrite=False, with_stats=False, number_of_processes=None,
+                 max_memory=None, incremental=False, cache_dir=None, cache_size='10G', with_summary=False,
+                 zones=None, zones_field=None, flag_cache_dir=None, window=None, bbox=None, bbox_srs=None,
+                 mask=None, profile=None, profile_format='json', metrics_file=None, metrics_port=None,
+                 output_layout='stack', composite=None, composite_period='month', pool=None):
+        """The parameters are the same of run (see qc4sd.run) without the
+        files, the files are processed with run or iter_run of the session.
+
+        :param pool: pool of workers shared with other sessions, None for start its own
+            pool sized for the memory budget, with a shared pool the number of processes
+            is the size of the pool and the chunks of each file are checked in batches
+            of the processes planned for the memory budget
+        :type pool: WorkerPool
+        """
+
+        ################################
+        # check parameters
+
+        # quality control file, or several quality control files for the parameter sweep
+        self.qcf_list = [check_quality_control_file(q) for q in (qcf if isinstance(qcf, (list, tuple)) else [qcf])]
+        qcf = self.qcf_list[0]
+        if len(self.qcf_list) > 1 and (not_overwrite or incremental):
+            raise ValueError("The not overwrite and incremental modes are not supported"
+                             " with several quality control files (parameter sweep).")
+        # bands
+        bands = check_bands(bands)
+        # output
+        if not os.path.isdir(output):
+            raise NotADirectoryError("The output directory {0} not exist.".format(output))
+        check_output_layout(output_layout)
+        # in incremental mode the new dates are written in its own files and appended in
+        # the VRT of all dates (dates layout), then the existing dates are not copied
+        if incremental:
+            output_layout = 'dates'
+        # methods of the composites for each period
+        if isinstance(composite, str):
+            composite = composite.split(',')
+        if composite:
+            check_composite(composite, composite_period)
+
+        # the pool of workers shared, else its own pool is started with the first files
+        self.pool = pool
+        self.own_pool = pool is None
+        if pool is not None:
+            number_of_processes = pool.n_jobs
+        elif number_of_processes is None:
+            number_of_processes = cpu_count()
+
+        # spatial subset to process of the tiles
+        subset = Subset(window, bbox, bbox_srs) if window is not None or bbox is not None else None
+
+        # set the profiler of the stages of the process
+        if profile is not None and not isinstance(profile, Profiler):
+            profile = Profiler(profile, profile_format)
+        self.profiler = profile if profile is not None else NO_PROFILER
+
+        # set the live metrics of throughput and progress
+        self.metrics = Metrics(metrics_file, metrics_port)
+
+        # set the exclusion mask, aligned once for each grid and cached
+        if mask is not None:
+            mask = Mask(mask, os.path.join(cache_dir, 'mask') if cache_dir is not None else None)
+
+        # set the memory budget
+        self.memory_budget = MemoryBudget(max_memory) if max_memory is not None else None
+
+        # set the cache of results
+        result_cache = ResultCache(cache_dir, cache_size) if cache_dir is not None else None
+
+        # set the cache of the quality control bands decoded
+        flag_cache = FlagCache(flag_cache_dir, cache_size) if flag_cache_dir is not None else None
+
+        # set the writers of the files of each date for the dates layout
+        writer = DatesWriter(number_of_processes) if output_layout == 'dates' else None
+
+        # set the zones for the statistics by zone, rasterized once for each grid and cached
+        if zones is not None:
+            zones = Zones(zones, zones_field, os.path.join(cache_dir, 'zones') if cache_dir is not None else None)
+
+        self.config_run = {'qcf': qcf, 'bands': bands, 'files': [], 'xml_files': [], 'output': output,
+                           'not_overwrite': not_overwrite, 'incremental': incremental, 'with_stats': with_stats,
+                           'number_of_processes': number_of_processes, 'memory_budget': self.memory_budget,
+                           'result_cache': result_cache, 'with_summary': with_summary, 'zones': zones,
+                           'flag_cache': flag_cache, 'subset': subset, 'mask': mask,
+                           'profiler': self.profiler, 'metrics': self.metrics, 'output_layout': output_layout,
+                           'writer': writer, 'composite': composite, 'composite_period': composite_period}
+
+        # setup and set the input or default quality control file
+        self.config_run['quality_control_file'] = setup_quality_control_file(qcf)
+        # the variants of the parameter sweep, each one with its own output directory
+        self.config_run['variants'] = []
+        if len(self.qcf_list) > 1:
+            for variant_name, variant_qcf in zip(get_variant_names(self.qcf_list), self.qcf_list):
+                self.config_run['variants'].append((variant_name, setup_quality_control_file(variant_qcf)))
+                os.makedirs(os.path.join(output, variant_name), exist_ok=True)
+
+        # satellite data grouped by (platform, product, tile) and the quality
+        # control for each group and band of the files in process
+        self.groups = {}
+        self.qc_list = []
+
+        self.closed = False
+        quiet_gdal_errors()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load(self, files):
+        """Read and load the satellite data of the files, the files can
+        be of different platforms, products and tiles
+
+        :param files: files to process
+        :type files: list
+        :return: satellite data grouped by (platform, product, tile)
+        :rtype: dict
+        """
+        self.config_run['files'] = files
+        self.config_run['xml_files'] = check_files(files)
+        with self.profiler.stage('load_satellite_data'):
+            self.groups = load_satellite_data(self.config_run)
+        return self.groups
+
+    def plan(self):
+        """Create the quality control for each group and band of the satellite
+        data loaded (see setup_quality_control) and start its own pool of
+        workers with the first files, limited for the memory budget
+
+        :return: quality control instances to process
+        :rtype: list
+        """
+        self.qc_list = setup_quality_control(self.groups, self.config_run)
+        if self.qc_list and self.pool is None:
+            self.pool = WorkerPool(get_number_of_processes(self.qc_list, self.config_run))
+        return self.qc_list
+
+    def process(self):
+        """Process the quality control planned and save the results
+        """
+        for _ in self.iter_process():
+            pass
+
+    def iter_process(self):
+        """Process the quality control planned and save the results,
+        yielding the result of each file as soon as it is processed (see
+        iter_process_quality_control), the satellite data and the quality
+        control processed are released at the end
+
+        :rtype: GranuleResult
+        """
+        try:
+            if self.qc_list:
+                yield from iter_process_quality_control(self.qc_list, self.pool, self.config_run)
+        finally:
+            self.release()
+
+    def run(self, files):
+        """Process the quality control of the files and save the results
+
+        :param files: files to process, can be of different platforms, products and tiles
+        :type files: list
+        """
+        for _ in self.iter_run(files):
+            pass
+
+    def iter_run(self, files):
+        """Process the quality control of the files and save the results,
+        yielding the result of each file, band and variant as soon as it
+        is processed (see qc4sd.iter_run)
+
+        :param files: files to process, can be of different platforms, products and tiles
+        :type files: list
+        :rtype: GranuleResult
+        """
+        config_run = self.config_run
+
+        ################################
+        # init message
+
+        print("\nQC4SD - Quality Control Algorithm for Satellite Data")
+        print("\nConfiguration run:")
+        print("\tquality control file: {0}".format(', '.join([os.path.basename(q) for q in self.qcf_list])))
+        print("\timages to process: {0}".format(len(files)))
+        print("\tband(s) to process: {0}".format(','.join([str(b) for b in config_run['bands']])))
+        if config_run['subset'] is not None:
+            print("\tsubset to process: {0}".format(config_run['subset']))
+        if config_run['mask'] is not None:
+            print("\tmask of the pixels to process: {0}".format(os.path.basename(config_run['mask'].mask_file)))
+
+        ################################
+        # process
+
+        # load all input files and setup data grouped by platform, product and tile
+        groups = self.load(files)
+        print("\tgroups to process (platform, product, tile): {0}".format(len(groups)))
+        for (satellite, shortname, tile), sd_list in groups.items():
+            print("\t\t{0} {1} {2}: {3} images".format(satellite, shortname, tile, len(sd_list)))
+        del groups
+
+        # the quality control for each group and band, the number of processes
+        # of the pool is limited for the memory budget
+        self.plan()
+        if self.pool is not None and self.pool.n_jobs > 1:
+            print('\n(Running with {0} local parallel processing)'.format(self.pool.n_jobs))
+        if self.memory_budget is not None:
+            print('(Running with a memory budget of {0})'.format(self.memory_budget))
+
+        # process the quality control per group and band and save result,
+        # all of them share the same pool of workers
+        yield from self.iter_process()
+
+        print("\nProcess completed!\n")
+
+    def release(self):
+        """Release the satellite data and the quality control processed
+        """
+        self.groups = {}
+        self.qc_list = []
+        self.config_run['files'] = []
+        self.config_run['xml_files'] = []
+        # force run garbage collector memory
+        gc.collect()
+
+    def close(self):
+        """Wait the outputs in progress and close the session, its own
+        pool of workers is stopped (the shared pool is not)
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.release()
+        if self.own_pool and self.pool is not None:
+            self.pool.close()
+        if self.config_run['zones'] is not None:
+            self.config_run['zones'].close()
+        if self.config_run['mask'] is not None:
+            self.config_run['mask'].close()
+        if self.config_run['writer'] is not None:
+            self.config_run['writer'].close()
+        self.profiler.close()
+        self.metrics.close()
+        quiet_gdal_errors(False)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from collections import namedtuple
+from math import floor, ceil
+try:
+    from osgeo import gdal, osr
+except ImportError:
+    import gdal
+    import osr
+
+
+# window in pixels of the data band: offset and size in columns (x) and rows (y)
+Window = namedtuple('Window', ['xoff', 'yoff', 'xsize', 'ysize'])
+
+# points for each side of the bounding box to transform it to the projection
+# of the tile (the sides of a geographic bbox are curves in sinusoidal)
+BBOX_SIDE_POINTS = 21
+
+
+def parse_numbers(value, name):
+    """Parse the 4 numbers comma separated of the window or bbox
+
+    :param value: numbers comma separated or list of numbers
+    :type value: str or list
+    :param name: name of the argument for the message of error
+    :type name: str
+    :rtype: list
+    """
+    try:
+        numbers = [float(n) for n in (value.split(',') if isinstance(value, str) else value)]
+    except (TypeError, ValueError):
+        numbers = []
+    if len(numbers) != 4:
+        raise ValueError("Incorrect format or error value for '{0}', this should be"
+                         " 4 numbers comma separated without space.".format(name))
+    return numbers
+
+
+class Subset:
+    """Spatial subset to process of the tiles, as a window in pixels of the
+    data band or a bounding box in the projection of the tile (sinusoidal for
+    MODIS) or in other spatial reference (i.e. EPSG:4326 for geographic).
+    """
+
+    def __init__(self, window=None, bbox=None, bbox_srs=None):
+        if window is not None and bbox is not None:
+            raise ValueError("Set the window or the bbox to process, not both.")
+        self.window = Window(*[int(n) for n in parse_numbers(window, 'window')]) if window is not None else None
+        self.bbox = parse_numbers(bbox, 'bbox') if bbox is not None else None
+        self.bbox_srs = bbox_srs
+
+    def __str__(self):
+        if self.window is not None:
+            return "window {0},{1},{2},{3} (pixels)".format(*self.window)
+        return "bbox {0},{1},{2},{3} ({4})".format(*self.bbox, self.bbox_srs or "projection of the tile")
+
+    def get_window(self, sd, band):
+        """Return the window in pixels of the data band of the satellite data
+        to process, clipped to the extent of the data band. The window is
+        empty (size zero) if the subset don't intersect the data band.
+
+        :param sd: satellite data
+        :type sd: SatelliteData
+        :param band: band to process
+        :type band: int
+        :rtype: Window
+        """
+        gdal_data_band = gdal.Open(sd.get_data_band_name(band), gdal.GA_ReadOnly)
+        cols, rows = gdal_data_band.RasterXSize, gdal_data_band.RasterYSize
+
+        if self.window is not None:
+            x_min, y_min = self.window.xoff, self.window.yoff
+            x_max, y_max = self.window.xoff + self.window.xsize, self.window.yoff + self.window.ysize
+        else:
+            geotransform = gdal_data_band.GetGeoTransform()
+            points = self.get_bbox_points(gdal_data_band.GetProjectionRef())
+            inv_geotransform = gdal.InvGeoTransform(geotransform)
+            # GDAL 1 return (success, geotransform)
+            if len(inv_geotransform) == 2:
+                inv_geotransform = inv_geotransform[1]
+            pixels = [gdal.ApplyGeoTransform(inv_geotransform, x, y) for x, y in points]
+            x_min, x_max = floor(min(p[0] for p in pixels)), ceil(max(p[0] for p in pixels))
+            y_min, y_max = floor(min(p[1] for p in pixels)), ceil(max(p[1] for p in pixels))
+        del gdal_data_band
+
+        # clip to the extent of the data band
+        x_min, y_min = max(0, x_min), max(0, y_min)
+        x_max, y_max = min(cols, x_max), min(rows, y_max)
+        return Window(x_min, y_min, max(0, x_max - x_min), max(0, y_max - y_min))
+
+    def get_bbox_points(self, projection):
+        """Return the points of the sides of the bbox in the projection
+        of the tile
+
+        :param projection: projection of the tile (wkt)
+        :type projection: str
+        :rtype: list
+        """
+        x_min, y_min, x_max, y_max = self.bbox
+        steps = [i / (BBOX_SIDE_POINTS - 1) for i in range(BBOX_SIDE_POINTS)]
+        points = [(x_min + (x_max - x_min) * s, y) for s in steps for y in (y_min, y_max)] + \
+                 [(x, y_min + (y_max - y_min) * s) for s in steps for x in (x_min, x_max)]
+        if self.bbox_srs is None:
+            return points
+
+        source_srs = osr.SpatialReference()
+        source_srs.SetFromUserInput(self.bbox_srs)
+        target_srs = osr.SpatialReference()
+        target_srs.ImportFromWkt(projection)
+        # keep the order x (lon), y (lat) in GDAL >= 3
+        if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+            source_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            target_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transform = osr.CoordinateTransformation(source_srs, target_srs)
+        return [transform.TransformPoint(x, y)[0:2] for x, y in points]
+
+
+def get_geotransform(geotransform, window):
+    """Return the geotransform of the window
+
+    :param geotransform: geotransform of the data band
+    :type geotransform: tuple
+    :param window: window in pixels of the data band or None
+    :type window: Window
+    :rtype: tuple
+    """
+    if window is None:
+        return geotransform
+    return (geotransform[0] + window.xoff * geotransform[1] + window.yoff * geotransform[2], geotransform[1],
+            geotransform[2], geotransform[3] + window.xoff * geotransform[4] + window.yoff * geotransform[5],
+            geotransform[4], geotransform[5])
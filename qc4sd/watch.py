@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from qc4sd.lib import get_metadata_file
+from qc4sd.session import Session
+from qc4sd.satellite_data.satellite_data import get_files
+
+
+def find_complete_files(directory, sizes):
+    """Find the files to process in the directory (MODIS files with its xml
+    file and metadata files of Landsat, see get_metadata_file) that are
+    complete, this is, the size of all files of the satellite data (the
+    file, its metadata file and the bands of Landsat, see get_files)
+    don't change since the previous call (the download finished). The
+    files with metadata incomplete or not supported are ignored.
+
+    :param directory: directory to find the files
+    :type directory: str
+    :param sizes: sizes of the files in the previous call, it is updated
+    :type sizes: dict
+    :return: complete files
+    :rtype: list
+    """
+    complete_files = []
+    current_sizes = {}
+    for entry in os.scandir(directory):
+        if not entry.is_file():
+            continue
+        xml_file = get_metadata_file(entry.path)
+        if not os.path.isfile(xml_file):
+            continue
+        try:
+            files = get_files(entry.path, xml_file)
+        except (ET.ParseError, NotImplementedError):
+            continue
+        # the files not arrived yet (i.e. bands of Landsat) without size
+        current_sizes[entry.path] = tuple(os.path.getsize(file) if os.path.isfile(file) else None for file in files)
+        if sizes.get(entry.path) == current_sizes[entry.path]:
+            complete_files.append(entry.path)
+    sizes.clear()
+    sizes.update(current_sizes)
+    return sorted(complete_files)
+
+
+def watch(qcf, bands, directory, output, with_stats=False, number_of_processes=None,
+          max_memory=None, cache_dir=None, cache_size='10G', with_summary=False,
+          zones=None, zones_field=None, flag_cache_dir=None, window=None, bbox=None, bbox_srs=None,
+          mask=None, profile=None, profile_format='json', metrics_file=None, metrics_port=None, interval=5):
+    """Watch the directory for new files and process each new file when it
+    arrives complete (see find_complete_files), appending the new dates in
+    the outputs (incremental, in the dates layout: only the files of the
+    new dates are written). The quality control file and the pool of
+    workers are loaded once and keep warm for all new files. Run until
+    it is interrupted.
+
+        >>> from qc4sd.watch import watch
+        >>> watch(settings.ini, [1, 2], download_dir, output_dir)
+
+    :param qcf: quality control file or 'default'
+    :type qcf: str
+    :param bands: band or bands to process
+    :type bands: list
+    :param directory: directory to watch the new files
+    :type directory: str
+    :param output: output directory for save results
+    :type output: str
+    :param interval: seconds between each check of new files in the directory
+    :type interval: float
+    """
+    if not os.path.isdir(directory):
+        raise NotADirectoryError("The directory to watch {0} not exist.".format(directory))
+
+    # the session keep warm the quality control file, the caches and the pool of workers for all new files
+    session = Session(qcf, bands, output, incremental=True, with_stats=with_stats,
+                      number_of_processes=number_of_processes, max_memory=max_memory, cache_dir=cache_dir,
+                      cache_size=cache_size, with_summary=with_summary, zones=zones, zones_field=zones_field,
+                      flag_cache_dir=flag_cache_dir, window=window, bbox=bbox, bbox_srs=bbox_srs, mask=mask,
+                      profile=profile, profile_format=profile_format, metrics_file=metrics_file,
+                      metrics_port=metrics_port)
+
+    print("\nQC4SD - Quality Control Algorithm for Satellite Data")
+    print("\nWatching the directory {0} for new files (Ctrl+C to stop)".format(directory))
+    print("\tquality control file: {0}".format(os.path.basename(session.config_run['qcf'])))
+    print("\tband(s) to process: {0}".format(','.join([str(b) for b in session.config_run['bands']])))
+
+    processed_files = set()
+    sizes = {}
+    try:
+        while True:
+            new_files = [file for file in find_complete_files(directory, sizes) if file not in processed_files]
+            if new_files:
+                groups = session.load(new_files)
+                # the files that can't be processed yet (i.e. MXD09GQ without
+                # the MXD09GA file) are retried in the next check
+                for key in list(groups):
+                    groups[key] = [sd for sd in groups[key] if sd.make_qc]
+                    processed_files.update(sd.file for sd in groups[key])
+                    if not groups[key]:
+                        del groups[key]
+                del groups
+
+                # the pool of workers is started once, sized with the first files
+                if session.plan():
+                    session.process()
+                    print("\nWaiting for new files...")
+                # cleanup
+                session.release()
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nWatch stopped!\n")
+    finally:
+        session.close()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import sys
+import pytest
+
+from rules import complete_qcf
+
+# the synthetic granules of the benchmarks (see benchmarks/fixtures.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+
+@pytest.fixture
+def qcf():
+    """Default quality control file with all values of the bit fields"""
+    return complete_qcf()
+
+
+@pytest.fixture
+def qcf_file(qcf, tmp_path):
+    """File of the default quality control file with all values of the bit fields"""
+    qcf_file = str(tmp_path / 'qcf.ini')
+    with open(qcf_file, 'w') as f:
+        qcf.write(f)
+    return qcf_file
+
+
+@pytest.fixture
+def granules(tmp_path):
+    """Create synthetic granules (see benchmarks/fixtures.py) in a temporal
+    directory: granules(shortname, n_dates, size_factor=0.02, **distribution)
+    """
+    pytest.importorskip('osgeo.gdal')
+    from fixtures import make_granules, QcDistribution
+
+    def make(shortname='MOD09A1', n_dates=1, size_factor=0.02, **distribution):
+        directory = tmp_path / 'granules'
+        directory.mkdir(exist_ok=True)
+        return make_granules(str(directory), shortname, 'h10v08', n_dates, QcDistribution(**distribution),
+                             size_factor=size_factor)
+    return make
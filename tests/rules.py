@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+# Naive reference of the rules of the quality control, pixel by pixel with the
+# binary strings of the values (like the original rules of MODIS), to compare
+# the kernels and the block engine of the run.
+
+from collections import Counter
+import numpy as np
+
+from qc4sd.quality_control.layout import BitLayout, RangeLayout
+from qc4sd.quality_control.quality_control_file import setup_quality_control_file, DEFAULT_QCF_FILES
+
+
+def check_value(qcf, section, id_name, layout, band, value):
+    """Check one value of the quality control band for the band
+
+    :return: pass or not pass and the invalid flags
+    :rtype: tuple
+    """
+    flags = Counter()
+    if isinstance(layout, RangeLayout):
+        value = value * layout.scale
+        if value < qcf.getfloat(section, id_name + '_min'):
+            flags[id_name + '_min'] += 1
+        if value > qcf.getfloat(section, id_name + '_max'):
+            flags[id_name + '_max'] += 1
+        return not flags, flags
+
+    bits = format(int(value), '0{0}b'.format(layout.num_bits))
+    for field in layout.fields:
+        offset = field.offset
+        if field.n_bands:
+            if band > field.n_bands:
+                continue
+            offset += (band - 1) * field.band_stride
+        if layout.msb_first:
+            field_bits = bits[offset:offset + field.width]
+        else:
+            field_bits = bits[layout.num_bits - offset - field.width:layout.num_bits - offset]
+        if qcf.getboolean(section, field.prefix + field_bits) is False:
+            flags[field.prefix + field_bits] += 1
+    return not flags, flags
+
+
+def check_raster(qcf, band, data, nodata_value, qc_bands):
+    """Check the data band pixel by pixel with the quality control bands,
+    the pixels that not pass are set to NoData
+
+    :param qc_bands: (section, id name, layout, scale of the resolution, raster)
+        of each quality control band
+    :type qc_bands: list
+    :return: the raster checked, the invalid flags of all pixels and the
+        number of NoData pixels of the data band
+    :rtype: tuple
+    """
+    raster = data.copy()
+    flags = Counter()
+    nodata_pixels = 0
+    for y in range(data.shape[0]):
+        for x in range(data.shape[1]):
+            if data[y, x] == nodata_value:
+                nodata_pixels += 1
+                continue
+            pixel_pass = True
+            for section, id_name, layout, scale_resolution, qc_raster in qc_bands:
+                qc_y = min(int(y * scale_resolution), qc_raster.shape[0] - 1)
+                qc_x = min(int(x * scale_resolution), qc_raster.shape[1] - 1)
+                value_pass, value_flags = check_value(qcf, section, id_name, layout, band, qc_raster[qc_y, qc_x])
+                pixel_pass &= value_pass
+                flags.update(value_flags)
+            if not pixel_pass:
+                raster[y, x] = nodata_value
+    return raster, flags, nodata_pixels
+
+
+def get_flags(statistics):
+    """Return the invalid flags (not zero) of the statistics of the run
+
+    :rtype: Counter
+    """
+    flags = Counter()
+    for invalid_pixels in statistics['invalid_pixels'].values():
+        flags.update(dict((flag, count) for flag, count in invalid_pixels.items() if count))
+    return flags
+
+
+def random_values(rng, layout, size):
+    """Random values of the quality control band, for ranges around
+    the usual limits of the angles
+
+    :rtype: ndarray
+    """
+    if isinstance(layout, RangeLayout):
+        return rng.integers(int(-200 / layout.scale), int(200 / layout.scale), size).astype(np.int16)
+    return rng.integers(0, 2**layout.num_bits, size, dtype=np.int64).astype(np.uint32 if layout.num_bits == 32
+                                                                             else np.uint16)
+
+
+def get_layouts():
+    """Return the layouts of the quality control bands of each section
+    of the quality control file (MODIS and Landsat)
+
+    :rtype: dict
+    """
+    from qc4sd.quality_control.modis.flags import LAYOUTS
+    from qc4sd.quality_control.landsat.products import PRODUCTS
+    layouts = dict(LAYOUTS)
+    for product in PRODUCTS.values():
+        layouts[product.section] = dict((qc_band.id_name, qc_band.layout) for qc_band in product.qc_bands.values())
+    return layouts
+
+
+def complete_qcf(rng=None, false_fraction=0.2):
+    """Return the default quality control file with all values of all bit
+    fields, the values missing in the default file (i.e. reserved) pass.
+    With a random generator all values of the bit fields are set at random.
+
+    :param rng: random generator (numpy) or None for the default values
+    :type rng: Generator
+    :param false_fraction: fraction of the values that not pass at random
+    :type false_fraction: float
+    :rtype: configparse
+    """
+    qcf = setup_quality_control_file(DEFAULT_QCF_FILES[0])
+    for section, layouts in get_layouts().items():
+        for layout in layouts.values():
+            if not isinstance(layout, BitLayout):
+                continue
+            for field in layout.fields:
+                for value in range(2**field.width):
+                    item = field.prefix + format(value, '0{0}b'.format(field.width))
+                    if rng is not None:
+                        qcf.set(section, item, 'false' if rng.random() < false_fraction else 'true')
+                    elif not qcf.has_option(section, item):
+                        qcf.set(section, item, 'true')
+    return qcf
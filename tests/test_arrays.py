@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from math import ceil
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from rules import check_raster, complete_qcf, get_flags, random_values
+from qc4sd.arrays import check_arrays
+from qc4sd.quality_control.modis.products import get_product
+
+NODATA = -28672
+ROWS, COLS = 37, 29
+
+
+def make_arrays(rng, shortname):
+    """Random data band and quality control bands of the product, the angles
+    in its full range (the angles with the range of all values are not checked)
+    """
+    data = rng.integers(-100, 16000, (ROWS, COLS)).astype(np.int16)
+    data[rng.random(data.shape) < 0.1] = NODATA
+    product = get_product(shortname)
+    qc_arrays = {}
+    for qc_band in product.qc_bands.values():
+        shape = (ceil(ROWS * qc_band.scale_resolution), ceil(COLS * qc_band.scale_resolution))
+        layout = product.get_kernel(qc_band.id_name).layout
+        if qc_band.full_range is not None:
+            low, high = [int(round(angle / layout.scale)) for angle in qc_band.full_range]
+            qc_arrays[qc_band.id_name] = rng.integers(low, high + 1, shape).astype(np.int16)
+        else:
+            qc_arrays[qc_band.id_name] = random_values(rng, layout, shape)
+    return data, qc_arrays
+
+
+def expected_check(qcf, shortname, band, data, qc_arrays):
+    product = get_product(shortname)
+    return check_raster(qcf, band, data, NODATA, [
+        (product.section, qc_band.id_name, product.get_kernel(qc_band.id_name).layout, qc_band.scale_resolution,
+         qc_arrays[qc_band.id_name]) for qc_band in product.qc_bands.values()])
+
+
+@pytest.mark.parametrize('shortname,band', [('MOD09A1', 1), ('MOD09A1', 3), ('MYD09A1', 7), ('MOD09GA', 2),
+                                            ('MOD09GQ', 1)])
+def test_check_arrays(shortname, band):
+    rng = np.random.default_rng(band)
+    qcf = complete_qcf(rng)
+    data, qc_arrays = make_arrays(rng, shortname)
+    data_copy = data.copy()
+
+    raster, mask, statistics = check_arrays(qcf, shortname, band, data, qc_arrays, NODATA,
+                                            with_mask=True, with_stats=True)
+    expected, flags, nodata_pixels = expected_check(qcf, shortname, band, data, qc_arrays)
+    np.testing.assert_array_equal(raster, expected)
+    np.testing.assert_array_equal(mask, expected != NODATA)
+    assert get_flags(statistics) == flags
+    assert statistics['total_pixels'] == ROWS * COLS
+    assert statistics['nodata_pixels'] == nodata_pixels
+    assert statistics['total_invalid_pixels'] == int((expected == NODATA).sum())
+    # the data is not modified
+    np.testing.assert_array_equal(data, data_copy)
+
+
+def test_check_arrays_threads():
+    rng = np.random.default_rng(0)
+    qcf = complete_qcf(rng)
+    data, qc_arrays = make_arrays(rng, 'MOD09A1')
+    raster, statistics = check_arrays(qcf, 'MOD09A1', 1, data, qc_arrays, NODATA, with_stats=True)
+    raster_threads, statistics_threads = check_arrays(qcf, 'MOD09A1', 1, data, qc_arrays, NODATA, with_stats=True,
+                                                      number_of_threads=3)
+    np.testing.assert_array_equal(raster_threads, raster)
+    assert statistics_threads == statistics
+
+
+def test_check_arrays_default():
+    rng = np.random.default_rng(0)
+    data, qc_arrays = make_arrays(rng, 'MOD09A1')
+    qc_arrays = dict((id_name, np.zeros_like(qc_array)) for id_name, qc_array in qc_arrays.items())
+    raster = check_arrays('default', 'MOD09A1', 1, data, qc_arrays, NODATA)
+    np.testing.assert_array_equal(raster, expected_check(complete_qcf(), 'MOD09A1', 1, data, qc_arrays)[0])
+
+
+def test_check_arrays_errors(qcf):
+    rng = np.random.default_rng(0)
+    data, qc_arrays = make_arrays(rng, 'MOD09A1')
+    del qc_arrays['sf']
+    with pytest.raises(ValueError):
+        check_arrays(qcf, 'MOD09A1', 1, data, qc_arrays, NODATA)
+    with pytest.raises(ValueError):
+        check_arrays(qcf, 'MOD09A1', 1, data[None], qc_arrays, NODATA)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import configparser
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from qc4sd.cache import ResultCache, FlagCache
+
+
+class Granule:
+    """Satellite data with the source files and the quality control bands
+    in memory, counting the reads of the quality control bands
+    """
+
+    def __init__(self, source_files, section='MXD09A1'):
+        self.source_files = source_files
+        self.product = SimpleNamespace(section=section)
+        self.decoded = 0
+        self.qc_bands = {'sf': SimpleNamespace(decode_flags=self.decode_flags, release=lambda: None)}
+
+    def decode_flags(self):
+        self.decoded += 1
+        return {'sf_cloud_state': np.arange(6, dtype=np.uint8).reshape(2, 3) % 4}
+
+    def get_data_band(self, band):
+        return np.full((2, 3), band, dtype=np.int16)
+
+    def get_nodata_value(self, band):
+        return -28672
+
+
+def make_qcf(**items):
+    qcf = configparser.RawConfigParser()
+    qcf.read_dict({'MXD09A1': dict({'sf_cloud_state_00': 'true', 'sf_cloud_state_01': 'false'}, **items),
+                   'MXD09Q1': {'sf_cloud_state_00': 'true'}})
+    return qcf
+
+
+@pytest.fixture
+def granule(tmp_path):
+    source_file = tmp_path / 'MOD09A1.A2016001.h10v08.006.hdf'
+    source_file.write_bytes(b'granule')
+    return Granule([str(source_file)])
+
+
+def test_result_key(granule, tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.key(granule, make_qcf(), 1)
+    assert key == cache.key(granule, make_qcf(), 1)
+
+    # the settings of other products and the order of the items don't change the key
+    qcf = make_qcf()
+    qcf.set('MXD09Q1', 'sf_cloud_state_00', 'false')
+    assert cache.key(granule, qcf, 1) == key
+    qcf = configparser.RawConfigParser()
+    qcf.read_dict({'MXD09A1': {'sf_cloud_state_01': 'false', 'sf_cloud_state_00': 'true'}})
+    assert cache.key(granule, qcf, 1) == key
+
+    # the settings of the product, the band, the window and the mask change the key
+    other_keys = [cache.key(granule, make_qcf(sf_cloud_state_01='true'), 1),
+                  cache.key(granule, make_qcf(), 2),
+                  cache.key(granule, make_qcf(), 1, window=(0, 0, 2, 2)),
+                  cache.key(granule, make_qcf(), 1, window=(1, 0, 2, 2))]
+    mask_file = tmp_path / 'mask.tif'
+    mask_file.write_bytes(b'mask')
+    other_keys.append(cache.key(granule, make_qcf(), 1, mask=SimpleNamespace(mask_file=str(mask_file))))
+    assert len(set(other_keys + [key])) == len(other_keys) + 1
+
+
+def test_result_key_invalidated_by_the_files(granule, tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.key(granule, make_qcf(), 1)
+    source_file = granule.source_files[0]
+    stat = os.stat(source_file)
+    os.utime(source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.key(granule, make_qcf(), 1) != key
+    key = cache.key(granule, make_qcf(), 1)
+    with open(source_file, 'ab') as f:
+        f.write(b'+')
+    os.utime(source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.key(granule, make_qcf(), 1) != key
+
+
+def test_result_get_and_put(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    raster = np.arange(12, dtype=np.int16).reshape(3, 4)
+    assert cache.get('a') is None
+
+    cache.put('a', raster, -1)
+    entry = cache.get('a')
+    np.testing.assert_array_equal(entry['raster'], raster)
+    assert entry['nodata_value'] == -1
+    # the entry without statistics is not valid for a run with statistics
+    assert cache.get('a', with_stats=True) is None
+    cache.put('a', raster, -1, {'total_invalid_pixels': 2})
+    assert cache.get('a', with_stats=True)['statistics'] == {'total_invalid_pixels': 2}
+
+    # a corrupted entry is a miss
+    with open(str(tmp_path / 'cache' / 'b.pkl'), 'wb') as f:
+        f.write(b'corrupted')
+    assert cache.get('b') is None
+
+
+def test_result_evict_least_recently_used(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = ResultCache(str(cache_dir), max_size=10**9)
+    raster = np.zeros((32, 32), dtype=np.int16)
+    for age, key in enumerate(['c', 'b', 'a']):
+        cache.put(key, raster, -1)
+        os.utime(str(cache_dir / (key + '.pkl')), (1000 - age, 1000 - age))
+    entry_size = os.path.getsize(str(cache_dir / 'a.pkl'))
+
+    # the oldest entry is used, then the least recently used is b
+    cache.get('a')
+    cache.max_size = int(entry_size * 3.5)
+    cache.put('d', raster, -1)
+    assert sorted(os.listdir(str(cache_dir))) == ['a.pkl', 'c.pkl', 'd.pkl']
+
+
+def test_flag_cache(granule, tmp_path):
+    cache = FlagCache(str(tmp_path / 'flags'))
+    data_band, nodata_value, planes = cache.load(granule, 1)
+    np.testing.assert_array_equal(data_band, granule.get_data_band(1))
+    assert nodata_value == -28672
+    np.testing.assert_array_equal(planes['sf']['sf_cloud_state'], [[0, 1, 2], [3, 0, 1]])
+    assert granule.decoded == 1
+
+    # the planes are decoded once for all bands and quality control files
+    data_band, _, planes = cache.load(granule, 2)
+    np.testing.assert_array_equal(data_band, granule.get_data_band(2))
+    assert granule.decoded == 1
+    assert list(planes) == ['sf']
+
+    # a new entry if the file changes
+    stat = os.stat(granule.source_files[0])
+    key = cache.key(granule)
+    os.utime(granule.source_files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.key(granule) != key
+    cache.load(granule, 1)
+    assert granule.decoded == 2
+
+
+
+def make_granule(tmp_path, name):
+    source_file = tmp_path / (name + '.hdf')
+    source_file.write_bytes(name.encode('utf-8'))
+    return Granule([str(source_file)])
+
+
+def get_entries(cache):
+    return set(filename for filename in os.listdir(cache.cache_dir) if not filename.endswith('.tmp'))
+
+
+def get_entry_size(cache, granule):
+    return sum(entry.stat().st_size for entry in os.scandir(os.path.join(cache.cache_dir, cache.key(granule))))
+
+
+def test_flag_cache_hit_and_miss(tmp_path):
+    cache = FlagCache(str(tmp_path / 'flags'))
+    granule_a, granule_b = make_granule(tmp_path, 'a'), make_granule(tmp_path, 'b')
+    cache.load(granule_a, 1)
+    cache.load(granule_b, 1)
+    assert (granule_a.decoded, granule_b.decoded) == (1, 1)
+    assert get_entries(cache) == {cache.key(granule_a), cache.key(granule_b)}
+    # hit for other band and for other instance of the cache
+    FlagCache(str(tmp_path / 'flags')).load(granule_a, 2)
+    cache.load(granule_b, 1)
+    assert (granule_a.decoded, granule_b.decoded) == (1, 1)
+
+
+def test_flag_cache_evict_least_recently_used(tmp_path):
+    cache = FlagCache(str(tmp_path / 'flags'))
+    granules = dict((name, make_granule(tmp_path, name)) for name in 'abcd')
+    for age, name in enumerate('cba'):
+        cache.load(granules[name], 1)
+        entry_dir = os.path.join(cache.cache_dir, cache.key(granules[name]))
+        os.utime(entry_dir, (1000 - age, 1000 - age))
+
+    # the oldest entry is used, then the least recently used is b
+    cache.load(granules['a'], 1)
+    cache.max_size = int(get_entry_size(cache, granules['a']) * 3.5)
+    cache.load(granules['d'], 1)
+    assert get_entries(cache) == set(cache.key(granules[name]) for name in 'acd')
+
+
+def test_flag_cache_smaller_than_one_entry(tmp_path):
+    # the entry in use is not evicted
+    cache = FlagCache(str(tmp_path / 'flags'), max_size=1)
+    granule_a, granule_b = make_granule(tmp_path, 'a'), make_granule(tmp_path, 'b')
+    data_band, _, _ = cache.load(granule_a, 1)
+    np.testing.assert_array_equal(data_band, granule_a.get_data_band(1))
+    data_band, _, planes = cache.load(granule_b, 2)
+    np.testing.assert_array_equal(data_band, granule_b.get_data_band(2))
+    assert list(planes) == ['sf']
+    assert get_entries(cache) == {cache.key(granule_b)}
+
+
+def test_flag_cache_evict_with_new_data_bands(tmp_path):
+    cache = FlagCache(str(tmp_path / 'flags'))
+    granule_a, granule_b = make_granule(tmp_path, 'a'), make_granule(tmp_path, 'b')
+    cache.load(granule_a, 1)
+    os.utime(os.path.join(cache.cache_dir, cache.key(granule_a)), (1000, 1000))
+    cache.load(granule_b, 1)
+    entry_size = get_entry_size(cache, granule_b)
+
+    # the data bands added to an existing entry are counted in the size of the cache
+    cache.max_size = entry_size * 2
+    cache.load(granule_b, 2)
+    assert get_entries(cache) == {cache.key(granule_b)}
+    assert get_entry_size(cache, granule_b) > entry_size
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.quality_control import composite
+from qc4sd.quality_control.composite import Composite, COMPOSITE_METHODS, check_composite, get_period
+from qc4sd.quality_control.writer import read_vrt_bands
+
+# 11 dates each 8 days from 2016-01-01 (January to March), NoData of the dates of the
+# data band (MODIS) or of other data type in the same period
+DATES = ['{0}{1:03d}'.format(2016, jday) for jday in range(1, 82, 8)]
+NODATA = [-28672, -1, -28672, -28672, -1, -28672, -28672, -28672, -1, -1, -28672]
+ROWS, COLS = 9, 7
+OUTPUT_PROPERTIES = ((0.0, 1.0, 0.0, 0.0, 0.0, -1.0), '', gdal.GDT_Int16)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    rasters = []
+    for nodata_value in NODATA:
+        raster = rng.integers(0, 50, (ROWS, COLS)).astype(np.int16)
+        raster[rng.random(raster.shape) < 0.4] = nodata_value
+        rasters.append(raster)
+    return rasters
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # several blocks of rows to update the accumulators and to compute the median
+    monkeypatch.setattr(composite, 'BLOCK_ROWS', 2)
+    monkeypatch.setattr(composite, 'MEDIAN_BLOCK_VALUES', 20)
+
+
+def expected_composites(dates, rasters, nodata_values, period='month'):
+    """Composite of each pixel of each period computed from its list of
+    valid values, with the NoData of the first date of the period
+    """
+    expected = dict((method, {}) for method in COMPOSITE_METHODS)
+    for label in sorted(set(get_period(date, period) for date in dates)):
+        in_period = [(raster, nodata_value) for date, raster, nodata_value in zip(dates, rasters, nodata_values)
+                     if get_period(date, period) == label]
+        nodata_value = in_period[0][1]
+        for method in COMPOSITE_METHODS:
+            expected[method][label] = (np.full((ROWS, COLS), nodata_value, dtype=np.int16), nodata_value)
+        for y in range(ROWS):
+            for x in range(COLS):
+                valid = [raster[y, x] for raster, date_nodata in in_period if raster[y, x] != date_nodata]
+                if not valid:
+                    continue
+                expected['latest'][label][0][y, x] = valid[-1]
+                expected['median'][label][0][y, x] = np.round(np.median(valid))
+                expected['max'][label][0][y, x] = max(valid)
+                expected['min'][label][0][y, x] = min(valid)
+    return expected
+
+
+def read_composites(composite_files):
+    """Return the bands of the composite files by method and period"""
+    composites = {}
+    for method, composite_file in composite_files.items():
+        dataset = gdal.Open(composite_file)
+        assert dataset.GetMetadataItem('COMPOSITE') == method + ' month'
+        bands = [dataset.GetRasterBand(nband + 1) for nband in range(dataset.RasterCount)]
+        composites[method] = dict((band.GetDescription(), (band.ReadAsArray(), band.GetNoDataValue()))
+                                  for band in bands)
+        assert dataset.GetMetadataItem('PERIODS') == ','.join(sorted(composites[method]))
+        del bands, dataset
+    return composites
+
+
+def assert_composites(composites, expected):
+    assert sorted(composites) == sorted(expected)
+    for method in expected:
+        assert sorted(composites[method]) == sorted(expected[method]), method
+        for label, (raster, nodata_value) in expected[method].items():
+            np.testing.assert_array_equal(composites[method][label][0], raster, err_msg=method + ' ' + label)
+            assert composites[method][label][1] == nodata_value, method + ' ' + label
+
+
+def make_composite(tmp_path, dates, output_layout='stack', **kwargs):
+    extension = '.vrt' if output_layout == 'dates' else '.tif'
+    composite_files = dict((method, str(tmp_path / ('composite_' + method + extension)))
+                           for method in COMPOSITE_METHODS)
+    return Composite(COMPOSITE_METHODS, 'month', dates, ROWS, COLS, composite_files, OUTPUT_PROPERTIES,
+                     output_layout=output_layout, **kwargs)
+
+
+def save_dates(tmp_path, dates, rasters, nodata_values):
+    """Save the rasters of the dates in its files (dates layout), return the bands"""
+    bands = []
+    for date, raster, nodata_value in zip(dates, rasters, nodata_values):
+        date_file = str(tmp_path / ('date_' + date + '.tif'))
+        dataset = gdal.GetDriverByName('GTiff').Create(date_file, COLS, ROWS, 1, gdal.GDT_Int16)
+        dataset.SetGeoTransform(OUTPUT_PROPERTIES[0])
+        dataset.GetRasterBand(1).WriteArray(raster)
+        dataset.GetRasterBand(1).SetNoDataValue(nodata_value)
+        dataset = None
+        bands.append((date, date_file, 1, nodata_value))
+    return bands
+
+
+@pytest.mark.parametrize('output_layout', ['stack', 'dates'])
+def test_composite(series, tmp_path, output_layout):
+    result = make_composite(tmp_path, DATES, output_layout)
+    for date, raster, nodata_value in zip(DATES, series, NODATA):
+        result.update(date, raster, nodata_value)
+    result.close()
+    assert result.periods == ['2016-01', '2016-02', '2016-03']
+    assert_composites(read_composites(result.composite_files), expected_composites(DATES, series, NODATA))
+
+
+@pytest.mark.parametrize('existing', [
+    list(range(6)),                    # the new dates after the existing dates
+    [0, 1, 2, 3, 5, 6, 7, 8, 9, 10],   # a new date before the existing dates of its period
+    [0, 1, 2, 3]])                     # new periods only
+def test_composite_incremental(series, tmp_path, existing):
+    existing_dates = save_dates(tmp_path, [DATES[i] for i in existing], [series[i] for i in existing],
+                                [NODATA[i] for i in existing])
+    result = make_composite(tmp_path, [DATES[i] for i in existing], 'dates')
+    for date, _, _, nodata_value in existing_dates:
+        result.update(date, series[DATES.index(date)], nodata_value)
+    result.close()
+    existing_periods = dict((method, read_vrt_bands(composite_file))
+                            for method, composite_file in result.composite_files.items())
+
+    # the new dates with the existing dates and composites
+    new = [i for i in range(len(DATES)) if i not in existing]
+    result = make_composite(tmp_path, [DATES[i] for i in new], 'dates', existing_dates=existing_dates,
+                            existing_periods=existing_periods)
+    for i in new:
+        result.update(DATES[i], series[i], NODATA[i])
+    result.close()
+    assert_composites(read_composites(result.composite_files), expected_composites(DATES, series, NODATA))
+    # only the periods of the new dates are saved again
+    assert result.periods_saved == sorted(set(get_period(DATES[i], 'month') for i in new))
+
+
+def test_composite_of_existing_dates(series, tmp_path):
+    # without existing composites the periods of all existing dates are saved
+    existing_dates = save_dates(tmp_path, DATES[:5], series[:5], NODATA[:5])
+    result = make_composite(tmp_path, DATES[5:], 'dates', existing_dates=existing_dates)
+    for date, raster, nodata_value in list(zip(DATES, series, NODATA))[5:]:
+        result.update(date, raster, nodata_value)
+    result.close()
+    assert_composites(read_composites(result.composite_files), expected_composites(DATES, series, NODATA))
+
+
+def test_get_period():
+    assert get_period('2016045', 'month') == '2016-02'
+    assert get_period('2016045', 'quarter') == '2016-Q1'
+    assert get_period('2016200', 'quarter') == '2016-Q3'
+    assert get_period('2016045', 'year') == '2016'
+    assert get_period('2016045', '16d') == '2016033'
+    assert get_period('2016366', '16d') == '2016353'
+    assert get_period(2016001, '8d') == '2016001'
+
+
+def test_check_composite():
+    check_composite(COMPOSITE_METHODS, 'month')
+    check_composite(['median'], '16d')
+    check_composite(['latest', 'max', 'min'], 'year')
+    for methods, period in ((['mean'], 'month'), (['median'], 'week'), (['median'], '0d'), (['median'], 'd'),
+                            (['median'], 'quarter'), (['max', 'median'], 'year'), (['median'], '32d')):
+        with pytest.raises(ValueError):
+            check_composite(methods, period)
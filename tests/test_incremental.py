@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.qc4sd import run
+from qc4sd.quality_control.writer import write_vrt, read_vrt_bands
+
+COMPOSITE = 'latest,median,max,min'
+
+
+def read_outputs(output_dir):
+    """Return the bands of the outputs (VRT of the dates and composites
+    and the summary) by file and label (description) of the band, with
+    the labels in the metadata
+    """
+    outputs = {}
+    for filename in os.listdir(output_dir):
+        if filename.endswith('.vrt') or filename.endswith('_summary.tif'):
+            dataset = gdal.Open(os.path.join(output_dir, filename))
+            bands = [dataset.GetRasterBand(nband + 1) for nband in range(dataset.RasterCount)]
+            outputs[filename] = dict((band.GetDescription(), (band.ReadAsArray(), band.GetNoDataValue()))
+                                     for band in bands)
+            outputs[filename]['metadata'] = (dataset.GetMetadataItem('DATES'), dataset.GetMetadataItem('PERIODS'))
+            del bands, dataset
+    return outputs
+
+
+def assert_same_outputs(outputs, expected):
+    assert sorted(outputs) == sorted(expected)
+    for filename, bands in expected.items():
+        assert sorted(outputs[filename]) == sorted(bands), filename
+        assert outputs[filename]['metadata'] == bands['metadata'], filename
+        for label, (raster, nodata_value) in bands.items():
+            if label == 'metadata':
+                continue
+            np.testing.assert_array_equal(outputs[filename][label][0], raster, err_msg=filename + ' ' + label)
+            assert outputs[filename][label][1] == nodata_value
+
+
+def run_incremental(qcf_file, files, output_dir, **kwargs):
+    run(qcf_file, [1], files, str(output_dir), incremental=True, with_summary=True, composite=COMPOSITE, **kwargs)
+
+
+@pytest.fixture
+def series(granules):
+    # 10 dates each 8 days from 2016-01-01 (January to March)
+    return granules('MOD09A1', 10)
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    return output_dir
+
+
+@pytest.fixture
+def full_outputs(series, qcf_file, tmp_path):
+    output_dir = tmp_path / 'full'
+    output_dir.mkdir()
+    run(qcf_file, [1], series, str(output_dir), with_summary=True, composite=COMPOSITE, output_layout='dates')
+    return read_outputs(str(output_dir))
+
+
+def test_append_in_parts(series, qcf_file, full_outputs, output_dir):
+    for part in (series[:4], series[4:7], series[7:]):
+        run_incremental(qcf_file, part, output_dir)
+    assert_same_outputs(read_outputs(str(output_dir)), full_outputs)
+
+
+def test_append_writes_only_the_new_dates(series, qcf_file, output_dir):
+    run_incremental(qcf_file, series[:7], output_dir)
+    mtimes = dict((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(str(output_dir)))
+    run_incremental(qcf_file, series[7:], output_dir)
+
+    # the dates before and the periods without new dates (January) are not written again
+    for filename, mtime in mtimes.items():
+        if filename.endswith('.tif') and '_summary' not in filename and '_2016-02' not in filename:
+            assert os.stat(str(output_dir / filename)).st_mtime_ns == mtime, filename
+    new_files = set(os.listdir(str(output_dir))) - set(mtimes)
+    assert new_files == set(['h10v08_MOD09A1_band01_{0}.tif'.format(date)
+                             for date in ('2016057', '2016065', '2016073')] +
+                            ['h10v08_MOD09A1_band01_{0}_month_2016-03.tif'.format(method)
+                             for method in COMPOSITE.split(',')])
+
+
+def test_append_to_stack_output(series, qcf_file, full_outputs, output_dir):
+    # the output of a run not incremental (stack layout) is continued without copy it
+    run(qcf_file, [1], series[:5], str(output_dir), with_summary=True, composite=COMPOSITE)
+    run_incremental(qcf_file, series[5:], output_dir)
+    assert_same_outputs(read_outputs(str(output_dir)), full_outputs)
+    stack_file = str(output_dir / 'h10v08_MOD09A1_band01.tif')
+    assert set(band[1] for band in read_vrt_bands(str(output_dir / 'h10v08_MOD09A1_band01.vrt'))[:5]) == \
+        {stack_file}
+
+
+def test_backfill_dates(series, qcf_file, full_outputs, output_dir):
+    run_incremental(qcf_file, series[:3] + series[5:], output_dir)
+    run_incremental(qcf_file, series[3:5], output_dir)
+    assert_same_outputs(read_outputs(str(output_dir)), full_outputs)
+
+
+def test_new_composites_of_existing_dates(series, qcf_file, full_outputs, output_dir):
+    # without the composites saved the periods of all existing dates are saved
+    run(qcf_file, [1], series[:5], str(output_dir), incremental=True, with_summary=True)
+    run_incremental(qcf_file, series[5:], output_dir)
+    assert_same_outputs(read_outputs(str(output_dir)), full_outputs)
+
+
+def test_all_dates_existing(series, qcf_file, full_outputs, output_dir):
+    run_incremental(qcf_file, series, output_dir)
+    run_incremental(qcf_file, series[2:4], output_dir)
+    assert_same_outputs(read_outputs(str(output_dir)), full_outputs)
+
+
+def test_vrt_bands(tmp_path):
+    rows, cols = 3, 4
+    output_properties = ((100.0, 10.0, 0, 200.0, 0, -10.0), '', gdal.GDT_Int16)
+    bands = []
+    for date, nodata_value in (('2016009', -1), ('2016001', -2)):
+        source_file = str(tmp_path / (date + '.tif'))
+        dataset = gdal.GetDriverByName('GTiff').Create(source_file, cols, rows, 1, gdal.GDT_Int16)
+        dataset.SetGeoTransform(output_properties[0])
+        dataset.GetRasterBand(1).WriteArray(np.full((rows, cols), int(date[-1]), dtype=np.int16))
+        dataset = None
+        bands.append((date, source_file, 1, nodata_value))
+
+    vrt_file = str(tmp_path / 'dates.vrt')
+    write_vrt(vrt_file, bands, rows, cols, output_properties, 'DATES')
+
+    # sorted by label, the sources relative to the VRT
+    assert read_vrt_bands(vrt_file) == [('2016001', bands[1][1], 1, -2.0), ('2016009', bands[0][1], 1, -1.0)]
+    dataset = gdal.Open(vrt_file)
+    assert dataset.GetMetadataItem('DATES') == '2016001,2016009'
+    assert dataset.GetRasterBand(1).GetDescription() == '2016001'
+    assert dataset.GetRasterBand(1).GetNoDataValue() == -2
+    np.testing.assert_array_equal(dataset.GetRasterBand(2).ReadAsArray(), np.full((rows, cols), 9))
+    assert read_vrt_bands(str(tmp_path / 'other.vrt')) is None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from collections import Counter
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from rules import check_raster, get_flags
+from qc4sd.arrays import check_arrays
+from qc4sd.quality_control.landsat.products import get_product, PIXEL_LAYOUT, RADSAT_LAYOUT
+
+# values of the Pixel Quality Assessment band of the documentation of Landsat 8-9 Collection 2
+CLEAR = 21824        # clear with low confidence of cloud, cloud shadow, snow/ice and cirrus
+WATER = 21952        # clear water with low confidence
+HIGH_CLOUD = 22280   # cloud with high confidence
+FILL = 1
+
+
+@pytest.mark.parametrize('shortname', ['LC08_L2SP', 'LC09_L2SP', 'LC08_L2SR', 'LC09_L2SR'])
+def test_products(shortname):
+    product = get_product(shortname)
+    assert product.section == 'LANDSAT_C2L2'
+    assert product.qc_bands['pixel'].layout == PIXEL_LAYOUT
+    assert product.qc_bands['radsat'].layout == RADSAT_LAYOUT
+
+
+def test_pixel_values(qcf):
+    kernel = get_product('LC08_L2SP').get_kernel('pixel')
+    values_pass, values_invalid_pixels = kernel.check_values(np.array([CLEAR, WATER, HIGH_CLOUD, FILL]), 1, qcf)
+    assert values_pass.tolist() == [True, True, False, False]
+    assert values_invalid_pixels == [Counter(), Counter(),
+                                     Counter({'pixel_cloud_1': 1, 'pixel_cloud_confidence_11': 1}),
+                                     Counter({'pixel_fill_1': 1})]
+
+
+def test_radsat_values(qcf):
+    kernel = get_product('LC08_L2SP').get_kernel('radsat')
+    # saturation of the band 3 and terrain occlusion
+    qc_values = np.array([0, 4, 2048])
+    assert kernel.check_values(qc_values, 3, qcf)[0].tolist() == [True, False, False]
+    assert kernel.check_values(qc_values, 3, qcf)[1][1] == Counter({'radsat_saturation_1': 1})
+    assert kernel.check_values(qc_values, 1, qcf)[0].tolist() == [True, True, False]
+    # the saturation is not checked for the bands without it (surface temperature)
+    assert kernel.check_values(np.array([127]), 10, qcf)[0].tolist() == [True]
+    assert sorted(kernel.decode(np.array([[4, 2048]], dtype=np.uint16))) == \
+        ['radsat_saturation_b{0:02d}'.format(band) for band in range(1, 8)] + ['radsat_terrain_occlusion']
+
+
+@pytest.mark.parametrize('band', [2, 7, 10])
+def test_check_arrays(qcf, band):
+    rng = np.random.default_rng(band)
+    shape = (23, 17)
+    data = rng.integers(7273, 43636, shape).astype(np.uint16)
+    data[rng.random(shape) < 0.1] = 0
+    pixel = rng.choice([CLEAR, WATER, HIGH_CLOUD, FILL, 23888, 55052], shape).astype(np.uint16)
+    radsat = rng.choice([0, 1, 2, 64, 2048], shape, p=[0.8, 0.05, 0.05, 0.05, 0.05]).astype(np.uint16)
+
+    raster, mask, statistics = check_arrays(qcf, 'LC08_L2SP', band, data, {'pixel': pixel, 'radsat': radsat}, 0,
+                                            with_mask=True, with_stats=True)
+    expected, flags, nodata_pixels = check_raster(qcf, band, data, 0, [
+        ('LANDSAT_C2L2', 'pixel', PIXEL_LAYOUT, 1, pixel), ('LANDSAT_C2L2', 'radsat', RADSAT_LAYOUT, 1, radsat)])
+    np.testing.assert_array_equal(raster, expected)
+    np.testing.assert_array_equal(mask, expected != 0)
+    assert get_flags(statistics) == flags
+    assert statistics['nodata_pixels'] == nodata_pixels
+    assert statistics['total_invalid_pixels'] == int((expected == 0).sum())
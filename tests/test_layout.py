@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from collections import Counter
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from rules import check_value, complete_qcf, get_layouts, random_values
+from qc4sd.quality_control.layout import Field, BitLayout, RangeLayout, Kernel, get_fields
+
+
+def get_bands(layout):
+    """Bands to check of the layout, with one band without the fields of each band"""
+    if isinstance(layout, RangeLayout):
+        return [1]
+    return list(range(1, max([field.n_bands for field in layout.fields] + [1]) + 2))
+
+
+def expected_checks(qcf, section, id_name, layout, band, qc_values):
+    checks = [check_value(qcf, section, id_name, layout, band, value) for value in qc_values.tolist()]
+    return [value_pass for value_pass, _ in checks], [flags for _, flags in checks]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_check_values(seed):
+    rng = np.random.default_rng(seed)
+    qcf = complete_qcf(rng)
+    for section, layouts in get_layouts().items():
+        for id_name, layout in layouts.items():
+            kernel = Kernel(section, id_name, layout)
+            qc_values = np.unique(random_values(rng, layout, 300))
+            for band in get_bands(layout):
+                values_pass, values_invalid_pixels = kernel.check_values(qc_values, band, qcf)
+                expected_pass, expected_flags = expected_checks(qcf, section, id_name, layout, band, qc_values)
+                assert values_pass.tolist() == expected_pass, (section, id_name, band)
+                assert values_invalid_pixels == expected_flags, (section, id_name, band)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_check_planes(seed):
+    rng = np.random.default_rng(seed)
+    qcf = complete_qcf(rng)
+    for section, layouts in get_layouts().items():
+        for id_name, layout in layouts.items():
+            kernel = Kernel(section, id_name, layout)
+            qc_values = random_values(rng, layout, 300)
+            planes = kernel.decode(qc_values)
+            for band in get_bands(layout):
+                # the pixels pass all fields, the invalid flags of all fields
+                pixels_pass = np.ones(len(qc_values), dtype=bool)
+                pixels_flags = [Counter() for _ in range(len(qc_values))]
+                for plane, values_pass, values_invalid_pixels in kernel.check_planes(planes, band, qcf):
+                    pixels_pass &= values_pass[plane]
+                    for idx, value in enumerate(plane.tolist()):
+                        pixels_flags[idx].update(values_invalid_pixels[value])
+                expected_pass, expected_flags = expected_checks(qcf, section, id_name, layout, band, qc_values)
+                assert pixels_pass.tolist() == expected_pass, (section, id_name, band)
+                assert pixels_flags == expected_flags, (section, id_name, band)
+
+
+def test_check_range(qcf):
+    kernel = Kernel('MXD09A1', 'vza', RangeLayout(0.01))
+    # the limits of the range (0 to 50) pass
+    values_pass, values_invalid_pixels = kernel.check_values(np.array([-1, 0, 2500, 5000, 5001]), 1, qcf)
+    assert values_pass.tolist() == [False, True, True, True, False]
+    assert values_invalid_pixels == [Counter({'vza_min': 1}), Counter(), Counter(), Counter(), Counter({'vza_max': 1})]
+    assert list(kernel.decode(np.array([[1, 2]]))) == ['vza']
+
+
+def test_get_fields():
+    layout = BitLayout(8, [Field('a_', 0, 2), Field('b_', 2, 1, band_stride=1, n_bands=3), Field('c_', 6, 2)],
+                       msb_first=True)
+    assert get_fields(layout, 1) == [('a', 'a_', 6, 2), ('b_b01', 'b_', 5, 1), ('c', 'c_', 0, 2)]
+    assert get_fields(layout, 3) == [('a', 'a_', 6, 2), ('b_b03', 'b_', 3, 1), ('c', 'c_', 0, 2)]
+    # the band without the field of each band
+    assert get_fields(layout, 4) == [('a', 'a_', 6, 2), ('c', 'c_', 0, 2)]
+    assert get_fields(layout._replace(msb_first=False), 2) == [('a', 'a_', 0, 2), ('b_b02', 'b_', 3, 1),
+                                                              ('c', 'c_', 6, 2)]
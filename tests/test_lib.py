@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import random
+import pytest
+
+from qc4sd.lib import spread_items_list
+
+
+def naive_spread_items_list(l, min_distance):
+    """Spread the items joining the groups of near items again and again
+    until no group overlaps the next, each group is centered at the mean
+    of the positions of its items (without its offset in the group)
+    """
+    order = sorted(range(len(l)), key=lambda idx: l[idx])
+    groups = [[idx] for idx in order]
+
+    def start(group):
+        return sum(l[idx] - k * min_distance for k, idx in enumerate(group)) / len(group)
+
+    overlap = True
+    while overlap:
+        overlap = False
+        for n in range(len(groups) - 1):
+            if start(groups[n]) + len(groups[n]) * min_distance > start(groups[n + 1]):
+                groups[n:n + 2] = [groups[n] + groups[n + 1]]
+                overlap = True
+                break
+
+    result = [None] * len(l)
+    for group in groups:
+        for k, idx in enumerate(group):
+            result[idx] = l[idx] if len(group) == 1 else round(start(group) + k * min_distance, 3)
+    return result
+
+
+def test_spread_items_list():
+    assert spread_items_list([1, 2, 4, 10, 23, 25], 3) == [-0.667, 2.333, 5.333, 10, 22.5, 25.5]
+    # the position of the items in the list is kept
+    assert spread_items_list([25, 10, 2, 23, 4, 1], 3) == [25.5, 10, 2.333, 22.5, 5.333, -0.667]
+    # the items far enough are not changed
+    assert spread_items_list([0, 5, 10.5], 5) == [0, 5, 10.5]
+    assert spread_items_list([3, 3, 3], 2) == [1.0, 3.0, 5.0]
+    assert spread_items_list([7], 1) == [7]
+    assert spread_items_list([], 1) == []
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_spread_items_list_random(seed):
+    rng = random.Random(seed)
+    l = [rng.choice([rng.uniform(0, 100), rng.randint(0, 20)]) for _ in range(rng.randint(2, 40))]
+    min_distance = rng.uniform(0.5, 5)
+    result = spread_items_list(l, min_distance)
+    assert result == naive_spread_items_list(l, min_distance)
+
+    # the order of the items is kept, with the minimum distance between them
+    order = sorted(range(len(l)), key=lambda idx: l[idx])
+    positions = [result[idx] for idx in order]
+    assert all(b - a >= min_distance - 0.002 for a, b in zip(positions, positions[1:]))
+    # the mean of the items is kept (the mean of each group)
+    assert sum(result) == pytest.approx(sum(l), abs=0.001 * len(l))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.lib import chunks
+from qc4sd.qc4sd import run
+from qc4sd.subset import Window
+from qc4sd.quality_control.mask import get_mask_window, get_mask_windows
+
+
+def test_mask_window():
+    mask_raster = np.zeros((10, 8), dtype=bool)
+    assert get_mask_window(mask_raster) is None
+    mask_raster[3, 6] = mask_raster[7, 2] = True
+    assert get_mask_window(mask_raster) == Window(2, 3, 5, 5)
+    # the mask of a window of the data band
+    assert get_mask_window(mask_raster, Window(100, 50, 8, 10)) == Window(102, 53, 5, 5)
+
+
+def test_mask_windows():
+    mask_raster = np.zeros((10, 8), dtype=bool)
+    mask_raster[3, 6] = mask_raster[4, 1] = mask_raster[9, 0] = True
+    x_chunks = chunks(range(10), 3)
+    assert get_mask_windows(mask_raster, x_chunks) == [None, Window(1, 3, 6, 2), None, Window(0, 9, 1, 1)]
+    assert get_mask_windows(mask_raster, x_chunks, Window(100, 50, 8, 10)) == \
+        [None, Window(101, 53, 6, 2), None, Window(100, 59, 1, 1)]
+
+
+def test_run_mask(granules, qcf_file, tmp_path):
+    files = granules('MOD09A1', 2)
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'mask').mkdir()
+    run(qcf_file, [1], files, str(tmp_path / 'full'))
+    full = gdal.Open(str(tmp_path / 'full' / 'h10v08_MOD09A1_band01.tif'))
+    rows, cols = full.RasterYSize, full.RasterXSize
+
+    # raster mask in the grid of the data band, only a square of pixels inside
+    mask_raster = np.zeros((rows, cols), dtype=np.uint8)
+    mask_raster[10:20, 5:30] = 1
+    mask_file = str(tmp_path / 'mask.tif')
+    dataset = gdal.GetDriverByName('GTiff').Create(mask_file, cols, rows, 1, gdal.GDT_Byte)
+    dataset.SetGeoTransform(full.GetGeoTransform())
+    dataset.SetProjection(full.GetProjectionRef())
+    dataset.GetRasterBand(1).WriteArray(mask_raster)
+    dataset = None
+
+    run(qcf_file, [1], files, str(tmp_path / 'mask'), mask=mask_file)
+    masked = gdal.Open(str(tmp_path / 'mask' / 'h10v08_MOD09A1_band01.tif'))
+    for nband in range(1, full.RasterCount + 1):
+        full_raster = full.GetRasterBand(nband).ReadAsArray()
+        masked_raster = masked.GetRasterBand(nband).ReadAsArray()
+        nodata_value = masked.GetRasterBand(nband).GetNoDataValue()
+        np.testing.assert_array_equal(masked_raster[mask_raster == 1], full_raster[mask_raster == 1])
+        assert (masked_raster[mask_raster == 0] == nodata_value).all()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+import pytest
+
+from qc4sd import metrics
+from qc4sd.metrics import Metrics, METRICS
+
+
+class QualityControl:
+    """Quality control with only the shapes of its satellite data"""
+
+    def __init__(self, shapes):
+        self.sd_list = list(range(len(shapes)))
+        self.shapes = shapes
+
+    def get_shape(self, sd):
+        return self.shapes[sd]
+
+
+def parse_metrics(text):
+    """Return the value of each metric and the help and type lines in the text format of Prometheus"""
+    values, comments = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# '):
+            kind, name, detail = line[2:].split(' ', 2)
+            comments[(kind, name)] = detail
+        else:
+            name, value = line.split(' ')
+            values[name] = float(value)
+    return values, comments
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fixed time and bytes read and written"""
+    state = {'time': 1000.0, 'io': (0, 0)}
+    monkeypatch.setattr(metrics.time, 'time', lambda: state['time'])
+    monkeypatch.setattr(metrics, 'get_io_bytes', lambda: state['io'])
+    return state
+
+
+def test_render(clock):
+    metrics_run = Metrics()
+    metrics_run.add_queued([QualityControl([(100, 100), (100, 100)]), QualityControl([(50, 40)])], 4)
+    clock['time'] += 10
+    clock['io'] = (3 * 1024**3, 1024**3)
+    metrics_run.granule_done(10000, busy_time=6.0, check_time=2.0)
+    metrics_run.granule_cached(10000)
+
+    values, comments = parse_metrics(metrics_run.render())
+    assert list(values) == [name for name, _, _ in METRICS]
+    for name, metric_type, metric_help in METRICS:
+        assert comments[('TYPE', name)] == metric_type
+        assert comments[('HELP', name)] == metric_help
+    assert values['qc4sd_granules_done_total'] == 2
+    assert values['qc4sd_granules_cached_total'] == 1
+    assert values['qc4sd_granules_queued'] == 1
+    # the pixels of the cache are not in the pixels checked nor in the pixels per second
+    assert values['qc4sd_pixels_processed_total'] == 10000
+    assert values['qc4sd_pixels_cached_total'] == 10000
+    assert values['qc4sd_pixels_per_second'] == 1000
+    assert values['qc4sd_workers'] == 4
+    assert values['qc4sd_worker_utilization_ratio'] == 0.75
+    assert values['qc4sd_read_bytes_total'] == 3 * 1024**3
+    assert values['qc4sd_written_bytes_total'] == 1024**3
+    assert values['qc4sd_eta_seconds'] == 2
+    assert values['qc4sd_start_timestamp_seconds'] == 1000
+    assert values['qc4sd_last_progress_timestamp_seconds'] == 1010
+
+
+def test_progress(clock):
+    metrics_run = Metrics()
+    metrics_run.add_queued([QualityControl([(1000, 1000)] * 4)], 2)
+    assert metrics_run.progress() == \
+        "[0/4 granules, 0.0 Mpx/s, workers 0%, read 0.0G, written 0.0G, ETA -]"
+
+    clock['time'] += 1
+    clock['io'] = (int(1.2 * 1024**3), int(0.3 * 1024**3))
+    metrics_run.granule_done(10**6, busy_time=1.0, check_time=1.0)
+    assert metrics_run.progress() == \
+        "[1/4 granules, 1.0 Mpx/s, workers 50%, read 1.2G, written 0.3G, ETA 0:00:03]"
+
+    clock['time'] += 1
+    metrics_run.granule_cached(10**6)
+    assert metrics_run.progress() == \
+        "[2/4 granules (1 cached), 0.5 Mpx/s, workers 50%, read 1.2G, written 0.3G, ETA 0:00:04]"
+
+
+def test_textfile(clock, tmp_path):
+    textfile = tmp_path / 'qc4sd.prom'
+    metrics_run = Metrics(str(textfile))
+    metrics_run.add_queued([QualityControl([(10, 10)] * 3)], 1)
+    # the textfile is updated with each granule, without temporal files left
+    assert parse_metrics(textfile.read_text())[0]['qc4sd_granules_queued'] == 3
+    metrics_run.granule_done(100)
+    assert parse_metrics(textfile.read_text())[0]['qc4sd_granules_done_total'] == 1
+    metrics_run.granule_cached(100)
+    metrics_run.close()
+    assert textfile.read_text() == metrics_run.render()
+    assert parse_metrics(textfile.read_text())[0]['qc4sd_granules_cached_total'] == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['qc4sd.prom']
+
+
+def test_without_textfile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrics_run = Metrics()
+    metrics_run.granule_done(100)
+    metrics_run.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_endpoint(clock):
+    metrics_run = Metrics(port=0)
+    try:
+        host, port = metrics_run.server.server_address
+        # only local by default
+        assert host == '127.0.0.1'
+        metrics_run.granule_done(100)
+        for path in ('', '/', '/metrics'):
+            with urlopen('http://127.0.0.1:{0}{1}'.format(port, path)) as response:
+                assert response.headers['Content-Type'] == 'text/plain; version=0.0.4'
+                assert response.read().decode('utf-8') == metrics_run.render()
+        with pytest.raises(HTTPError) as error:
+            urlopen('http://127.0.0.1:{0}/other'.format(port))
+        assert error.value.code == 404
+    finally:
+        metrics_run.close()
+    assert metrics_run.server is None
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import json
+
+import pytest
+from joblib import Parallel, delayed
+
+from qc4sd import __version__
+from qc4sd.profiler import Profiler, NO_PROFILER
+
+EVENT_KEYS = ['args', 'cpu', 'name', 'peak_rss', 'pid', 'read_bytes', 'start', 'wall', 'write_bytes']
+
+
+def work_in_worker(profiler, n):
+    with profiler.stage('check_qc_by_chunk', chunk=n):
+        sum(range(10000))
+    return os.getpid()
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(str(tmp_path / 'profile.json'))
+    with profiler.stage('load_satellite_data'):
+        pass
+    for band in (1, 2):
+        with profiler.stage('read_data_band', file='file.hdf', band=band):
+            with open(str(tmp_path / 'data_{0}'.format(band)), 'w') as data_file:
+                data_file.write('x' * 1000)
+    return profiler
+
+
+def test_json(profiler, tmp_path):
+    profiler.close()
+    with open(str(tmp_path / 'profile.json')) as json_file:
+        report = json.load(json_file)
+    assert report['qc4sd_version'] == __version__
+    assert report['total_wall'] >= 0
+    assert [event['name'] for event in report['events']] == \
+        ['load_satellite_data', 'read_data_band', 'read_data_band']
+    for event in report['events']:
+        assert sorted(event) == EVENT_KEYS
+        assert event['pid'] == os.getpid()
+    assert report['events'][1]['args'] == {'file': 'file.hdf', 'band': 1}
+    assert report['events'][2]['write_bytes'] >= 1000
+    # totals by stage
+    assert sorted(report['stages']) == ['load_satellite_data', 'read_data_band']
+    stage = report['stages']['read_data_band']
+    assert stage['count'] == 2
+    assert stage['wall'] == pytest.approx(sum(event['wall'] for event in report['events'][1:]))
+    assert stage['write_bytes'] == sum(event['write_bytes'] for event in report['events'][1:])
+    assert stage['peak_rss'] == max(event['peak_rss'] for event in report['events'][1:])
+    # the files of the events of the workers are deleted
+    assert not os.path.isdir(profiler.tmp_dir)
+
+
+def test_chrome(profiler, tmp_path):
+    trace_file = str(tmp_path / 'profile.trace.json')
+    profiler.save(trace_file, 'chrome')
+    profiler.close()
+    with open(trace_file) as json_file:
+        report = json.load(json_file)
+    assert report['displayTimeUnit'] == 'ms'
+    assert report['otherData'] == {'qc4sd_version': __version__}
+    trace_events = report['traceEvents']
+    assert len(trace_events) == len(profiler.events) == 3
+    for trace_event, event in zip(trace_events, profiler.events):
+        # complete events with the times in microseconds
+        assert trace_event['ph'] == 'X'
+        assert trace_event['cat'] == 'qc4sd'
+        assert trace_event['name'] == event['name']
+        assert trace_event['ts'] == int(event['start'] * 1e6)
+        assert trace_event['dur'] == int(event['wall'] * 1e6)
+        assert trace_event['pid'] == trace_event['tid'] == os.getpid()
+        assert trace_event['args'] == dict(event['args'], cpu=event['cpu'], read_bytes=event['read_bytes'],
+                                           write_bytes=event['write_bytes'], peak_rss=event['peak_rss'])
+    assert [trace_event['ts'] for trace_event in trace_events] == sorted(trace_event['ts']
+                                                                         for trace_event in trace_events)
+
+
+def test_events_of_workers(tmp_path):
+    profiler = Profiler(str(tmp_path / 'profile.json'), 'chrome')
+    with profiler.stage('check_qc'):
+        pids = Parallel(n_jobs=2, backend='loky')(delayed(work_in_worker)(profiler, n) for n in range(4))
+    profiler.close()
+    with open(str(tmp_path / 'profile.json')) as json_file:
+        trace_events = json.load(json_file)['traceEvents']
+    worker_events = [trace_event for trace_event in trace_events if trace_event['name'] == 'check_qc_by_chunk']
+    assert sorted(trace_event['args']['chunk'] for trace_event in worker_events) == [0, 1, 2, 3]
+    assert set(trace_event['pid'] for trace_event in worker_events) == set(pids)
+    assert os.getpid() not in pids
+    assert [trace_event['pid'] for trace_event in trace_events if trace_event['name'] == 'check_qc'] == [os.getpid()]
+
+
+def test_disabled(tmp_path):
+    with NO_PROFILER.stage('read_data_band', band=1):
+        pass
+    NO_PROFILER.close()
+    assert NO_PROFILER.events == [] and NO_PROFILER.get_stages() == {}
+    with pytest.raises(ValueError):
+        Profiler(str(tmp_path / 'profile.json'), 'csv')
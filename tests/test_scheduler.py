@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import pytest
+
+from qc4sd.lib import chunks
+from qc4sd.scheduler import MemoryBudget, WORKER_OVERHEAD, parse_memory_size, default_rows_per_chunk
+
+MiB = 1024**2
+
+
+def test_parse_memory_size():
+    assert parse_memory_size(1234) == 1234
+    assert parse_memory_size('4G') == 4 * 1024**3
+    assert parse_memory_size('512') == 512 * MiB
+    assert parse_memory_size('1.5G') == int(1.5 * 1024**3)
+    assert parse_memory_size('100k') == 100 * 1024
+    assert parse_memory_size(' 8 M ') == 8 * MiB
+    assert parse_memory_size('2GiB') == parse_memory_size('2GB') == 2 * 1024**3
+    assert parse_memory_size('10B') == 10
+    for size in ('abc', '-1G', '4X', '', '1.G'):
+        with pytest.raises(ValueError):
+            parse_memory_size(size)
+
+
+@pytest.mark.parametrize('n_rows,n_processes,rows_per_chunk', [
+    (2400, 4, 300), (4800, 8, 150), (500, 4, 125), (48, 2, 24), (7, 3, 3), (1, 8, 1)])
+def test_default_rows_per_chunk(n_rows, n_processes, rows_per_chunk):
+    assert default_rows_per_chunk(n_rows, n_processes) == rows_per_chunk
+    # all rows in chunks, at least one chunk for each process if there are enough rows
+    x_chunks = chunks(range(n_rows), rows_per_chunk)
+    assert [row for x_chunk in x_chunks for row in x_chunk] == list(range(n_rows))
+    assert len(x_chunks) >= min(n_rows, n_processes)
+
+
+def test_plan():
+    budget = MemoryBudget('1G')
+    # limited by the rows of each chunk
+    assert budget.plan(2400, 200 * MiB, MiB, 8) == (8, 3)
+    assert budget.estimated_peak == 200 * MiB + 8 * (WORKER_OVERHEAD + 3 * MiB)
+    # less processes than requested
+    assert budget.plan(2400, 400 * MiB, MiB, 8) == (6, 4)
+    # the processes requested with the default rows of each chunk
+    assert budget.plan(2400, 200 * MiB, MiB, 2) == (2, 312)
+    assert budget.plan(100, 10 * MiB, MiB // 10, 2) == (2, 50)
+    assert budget.n_jobs == 2
+    # the estimated peak is the maximum of all plans
+    assert budget.estimated_peak == 200 * MiB + 8 * (WORKER_OVERHEAD + 3 * MiB)
+
+
+@pytest.mark.parametrize('max_memory', ['300M', '1G', '4G'])
+@pytest.mark.parametrize('n_processes', [1, 3, 16])
+def test_plan_within_budget(max_memory, n_processes):
+    for n_rows, fixed_nbytes, row_nbytes in ((2400, 50 * MiB, 100 * 1024), (4800, 150 * MiB, MiB),
+                                             (240, MiB, 10 * 1024)):
+        budget = MemoryBudget(max_memory)
+        n_jobs, rows_per_chunk = budget.plan(n_rows, fixed_nbytes, row_nbytes, n_processes)
+        assert 1 <= n_jobs <= n_processes
+        assert 1 <= rows_per_chunk <= default_rows_per_chunk(n_rows, n_jobs)
+        assert budget.estimated_peak <= budget.max_memory
+
+
+def test_plan_too_small():
+    with pytest.raises(MemoryError):
+        MemoryBudget('200M').plan(2400, 150 * MiB, MiB, 4)
+    assert MemoryBudget('200M').plan(2400, 50 * MiB, MiB, 4) == (1, 50)
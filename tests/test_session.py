@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd import scheduler
+from qc4sd.qc4sd import run, iter_run, aiter_run
+from qc4sd.session import Session, WorkerPool
+
+
+class RecordingPool(WorkerPool):
+    """Shared pool of workers that records the number of tasks of each call"""
+
+    def __init__(self, n_jobs):
+        super().__init__(n_jobs)
+        self.batches = []
+
+    def __call__(self, tasks):
+        tasks = list(tasks)
+        self.batches.append(len(tasks))
+        return super().__call__(tasks)
+
+
+def test_shared_pool_with_memory_budget(granules, qcf_file, tmp_path, monkeypatch):
+    files = granules('MOD09A1', 1)
+    (tmp_path / 'budget').mkdir()
+    (tmp_path / 'full').mkdir()
+    # the memory budget plan one process and 5 rows per chunk
+    monkeypatch.setattr(scheduler.MemoryBudget, 'plan', lambda self, n_rows, fixed_nbytes, row_nbytes, n_processes:
+                        (1, 5))
+    pool = RecordingPool(3)
+    try:
+        with Session(qcf_file, [1], str(tmp_path / 'budget'), max_memory='1G', pool=pool) as session:
+            session.run(files)
+    finally:
+        pool.close()
+    # the chunks are checked one at a time in the shared pool of 3 workers
+    assert len(pool.batches) == 10 and set(pool.batches) == {1}
+
+    run(qcf_file, [1], files, str(tmp_path / 'full'))
+    np.testing.assert_array_equal(gdal.Open(str(tmp_path / 'budget' / 'h10v08_MOD09A1_band01.tif')).ReadAsArray(),
+                                  gdal.Open(str(tmp_path / 'full' / 'h10v08_MOD09A1_band01.tif')).ReadAsArray())
+
+
+def test_memory_report_once_per_run(granules, qcf_file, tmp_path, capsys):
+    files = granules('MOD09A1', 2)
+    run(qcf_file, [1, 2], files, str(tmp_path), max_memory='1G', number_of_processes=1)
+    assert capsys.readouterr().out.count('Memory: budget 1024MiB') == 1
+
+
+@pytest.fixture
+def read_files(monkeypatch):
+    """Files whose data band was read, in order"""
+    from qc4sd.satellite_data.satellite_data import SatelliteData
+    files = []
+    get_data_band = SatelliteData.get_data_band
+
+    def recording_get_data_band(self, band, window=None):
+        if self.file not in files:
+            files.append(self.file)
+        return get_data_band(self, band, window)
+
+    monkeypatch.setattr(SatelliteData, 'get_data_band', recording_get_data_band)
+    return files
+
+
+@pytest.fixture
+def closed_sessions(monkeypatch):
+    """Sessions closed"""
+    sessions = []
+    close = Session.close
+
+    def recording_close(self):
+        if not self.closed:
+            sessions.append(self)
+        close(self)
+
+    monkeypatch.setattr(Session, 'close', recording_close)
+    return sessions
+
+
+def read_output(output_dir):
+    return gdal.Open(str(output_dir / 'h10v08_MOD09A1_band01.tif')).ReadAsArray()
+
+
+def test_iter_run_backpressure(granules, qcf_file, tmp_path, read_files, closed_sessions):
+    files = granules('MOD09A1', 4)
+    (tmp_path / 'full').mkdir()
+    run(qcf_file, [1], files, str(tmp_path / 'full'), number_of_processes=2)
+    full_output = read_output(tmp_path / 'full')
+    del read_files[:], closed_sessions[:]
+
+    results = iter_run(qcf_file, [1], files, str(tmp_path), number_of_processes=2)
+    for n, file in enumerate(files[:2]):
+        result = next(results)
+        # the next file is not processed until the result is consumed
+        assert read_files == files[:n + 1]
+        assert (result.file, result.band, result.date, result.variant) == (file, 1, '2016{0:03d}'.format(1 + 8 * n),
+                                                                           None)
+        np.testing.assert_array_equal(result.raster, full_output[n])
+    assert closed_sessions == []
+    # the run is closed if the results are not consumed until the end
+    results.close()
+    assert read_files == files[:2] and len(closed_sessions) == 1
+
+
+def test_aiter_run_backpressure(granules, qcf_file, tmp_path, read_files, closed_sessions):
+    files = granules('MOD09A1', 4)
+
+    async def consume():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0.001)
+
+        ticker_task = asyncio.ensure_future(ticker())
+        dates = []
+        async for result in aiter_run(qcf_file, [1], files, str(tmp_path), number_of_processes=2):
+            dates.append(result.date)
+            # a slow consumer, the next file is not processed in the meantime
+            await asyncio.sleep(0.1)
+            assert read_files == files[:len(dates)]
+            if len(dates) == 2:
+                break
+        ticker_task.cancel()
+        return dates, ticks
+
+    dates, ticks = asyncio.run(consume())
+    assert dates == ['2016001', '2016009']
+    assert read_files == files[:2] and len(closed_sessions) == 1
+    # the event loop is not blocked while the files are processed
+    assert len(ticks) > 10
+
+
+def test_sessions_sharing_pool(granules, qcf_file, tmp_path, closed_sessions):
+    files = {'MOD09A1': granules('MOD09A1', 3), 'MYD09A1': granules('MYD09A1', 3)}
+    pool = RecordingPool(2)
+    errors = []
+
+    def run_session(shortname):
+        # each session is created and used in its own thread
+        try:
+            (tmp_path / shortname).mkdir()
+            with Session(qcf_file, [1], str(tmp_path / shortname), with_stats=True, pool=pool) as session:
+                session.run(files[shortname])
+        except Exception as error:
+            errors.append(error)
+
+    try:
+        threads = [threading.Thread(target=run_session, args=(shortname,)) for shortname in files]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(closed_sessions) == 2
+        # the shared pool is not stopped with the sessions and checked the files of both sessions
+        assert pool.parallel is not None
+        assert len(pool.batches) == 6
+    finally:
+        pool.close()
+
+    # the same outputs of each session alone, with the same processes (chunks)
+    for shortname in files:
+        (tmp_path / (shortname + '_alone')).mkdir()
+        run(qcf_file, [1], files[shortname], str(tmp_path / (shortname + '_alone')), with_stats=True,
+            number_of_processes=pool.n_jobs)
+        output = 'h10v08_{0}_band01'.format(shortname)
+        np.testing.assert_array_equal(
+            gdal.Open(str(tmp_path / shortname / (output + '.tif'))).ReadAsArray(),
+            gdal.Open(str(tmp_path / (shortname + '_alone') / (output + '.tif'))).ReadAsArray())
+        assert (tmp_path / shortname / (output + '_stats.csv')).read_text() == \
+            (tmp_path / (shortname + '_alone') / (output + '_stats.csv')).read_text()
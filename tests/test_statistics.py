@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import csv
+import pytest
+
+from qc4sd.quality_control.statistics import write_statistics, read_statistics, plot_statistics, \
+    STATISTICS_FIELDS
+
+STATISTICS = {
+    '2016001': {'total_pixels': 100, 'total_invalid_pixels': 30, 'nodata_pixels': 10,
+                'invalid_pixels': {'Reflectance State QA flags': {'sf_cloud_state_01': 12, 'sf_cloud_shadow_1': 0},
+                                   'Reflectance Band Quality': {'rbq_modland_qa_10': 8}}},
+    '2016009': {'total_pixels': 100, 'total_invalid_pixels': 5, 'nodata_pixels': 5,
+                'invalid_pixels': {'Reflectance State QA flags': {}, 'View/Sensor Zenith Angle': {'vza_max': 3}}}}
+
+
+def test_write_and_read_statistics(tmp_path):
+    stats_file = str(tmp_path / 'stats.csv')
+    for date in sorted(STATISTICS):
+        write_statistics(stats_file, date, STATISTICS[date])
+
+    with open(stats_file, newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    # the header once and one row for each total and flag, sorted by quality control band and flag
+    assert rows[0] == STATISTICS_FIELDS
+    assert rows[1:8] == [['2016001', '', 'total_pixels', '100'], ['2016001', '', 'total_invalid_pixels', '30'],
+                         ['2016001', '', 'nodata_pixels', '10'],
+                         ['2016001', 'Reflectance Band Quality', 'rbq_modland_qa_10', '8'],
+                         ['2016001', 'Reflectance State QA flags', 'sf_cloud_shadow_1', '0'],
+                         ['2016001', 'Reflectance State QA flags', 'sf_cloud_state_01', '12'],
+                         ['2016009', '', 'total_pixels', '100']]
+    assert len(rows) == 1 + 6 + 4
+
+    # the quality control bands without flags are not saved
+    expected = dict((date, dict(sd_statistics, invalid_pixels=dict(
+        (qc_band, flags) for qc_band, flags in sd_statistics['invalid_pixels'].items() if flags)))
+        for date, sd_statistics in STATISTICS.items())
+    assert read_statistics(stats_file) == expected
+
+
+def test_statistics_as_the_run_goes(granules, qcf_file, tmp_path):
+    from qc4sd.qc4sd import iter_run
+
+    files = granules('MOD09A1', 3)
+    stats_file = tmp_path / 'h10v08_MOD09A1_band01_stats.csv'
+    results = iter_run(qcf_file, [1], files, str(tmp_path), with_stats=True, number_of_processes=1)
+    for n, result in enumerate(results):
+        # the statistics of each date are saved as soon as it is processed
+        saved = read_statistics(str(stats_file))
+        assert sorted(saved) == ['2016{0:03d}'.format(1 + 8 * date) for date in range(n + 1)]
+        sd_statistics = saved[result.date]
+        for total in ('total_pixels', 'total_invalid_pixels', 'nodata_pixels'):
+            assert sd_statistics[total] == result.statistics[total]
+        assert sd_statistics['invalid_pixels'] == dict(
+            (qc_band, dict(flags)) for qc_band, flags in result.statistics['invalid_pixels'].items() if flags)
+        # the invalid pixels are the pixels NoData in the result
+        assert sd_statistics['total_invalid_pixels'] == int((result.raster == result.nodata_value).sum())
+        assert sd_statistics['total_pixels'] == result.raster.size
+    assert len(read_statistics(str(stats_file))) == 3
+
+
+@pytest.mark.parametrize('n_dates', [1, 12])
+def test_plot_statistics(tmp_path, n_dates):
+    image = pytest.importorskip('matplotlib.image')
+    # many flags with near values for the layout of the labels
+    quality_control_statistics = {}
+    for n in range(n_dates):
+        flags = dict(('sf_flag_{0:02d}'.format(flag), 100 + flag + n) for flag in range(25))
+        flags['sf_without_invalid_pixels'] = 0
+        quality_control_statistics['2016{0:03d}'.format(1 + 8 * n)] = {
+            'total_pixels': 10000, 'total_invalid_pixels': 3000 + n, 'nodata_pixels': 200,
+            'invalid_pixels': {'Reflectance State QA flags': flags, 'Solar Zenith Angle': {}}}
+    img_filename = str(tmp_path / 'stats.png')
+    plot_statistics(quality_control_statistics, img_filename, 'h10v08 MOD09A1 band 1')
+
+    # saved with the whitespace trimmed, smaller than the figure
+    rows, cols = image.imread(img_filename).shape[:2]
+    width = 7 if n_dates == 1 else 10 + n_dates * 0.4
+    assert 0 < cols < width * 86 and 0 < rows < 8 * 86
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.qc4sd import run
+from qc4sd.subset import Subset, Window, get_geotransform
+
+GEOTRANSFORM = (1000.0, 10.0, 0.0, 2000.0, 0.0, -10.0)
+
+
+@pytest.fixture
+def data_band(tmp_path):
+    """Satellite data with a data band of 40 columns and 30 rows"""
+    data_band_file = str(tmp_path / 'data_band.tif')
+    dataset = gdal.GetDriverByName('GTiff').Create(data_band_file, 40, 30, 1, gdal.GDT_Int16)
+    dataset.SetGeoTransform(GEOTRANSFORM)
+    dataset = None
+    return SimpleNamespace(get_data_band_name=lambda band: data_band_file)
+
+
+def test_parse_subset():
+    assert Subset(window='1,2,3,4').window == Window(1, 2, 3, 4)
+    assert Subset(bbox=[1, 2, 3, 4.5]).bbox == [1, 2, 3, 4.5]
+    for window in ('1,2,3', '1,2,3,a', 5):
+        with pytest.raises(ValueError):
+            Subset(window=window)
+    with pytest.raises(ValueError):
+        Subset(window='1,2,3,4', bbox='1,2,3,4')
+
+
+def test_window(data_band):
+    assert Subset(window='5,6,10,8').get_window(data_band, 1) == Window(5, 6, 10, 8)
+    # clipped to the extent of the data band
+    assert Subset(window='-5,25,60,10').get_window(data_band, 1) == Window(0, 25, 40, 5)
+    # outside of the data band
+    assert Subset(window='50,0,10,10').get_window(data_band, 1).xsize == 0
+
+
+def test_bbox(data_band):
+    # bbox in the projection of the tile, the pixels that intersect it
+    assert Subset(bbox='1050,1800,1200,1955').get_window(data_band, 1) == Window(5, 4, 15, 16)
+    assert Subset(bbox='1055,1801,1199,1950').get_window(data_band, 1) == Window(5, 5, 15, 15)
+    assert Subset(bbox='0,0,100,100').get_window(data_band, 1).ysize == 0
+
+
+def test_geotransform():
+    assert get_geotransform(GEOTRANSFORM, None) == GEOTRANSFORM
+    assert get_geotransform(GEOTRANSFORM, Window(5, 4, 15, 16)) == (1050.0, 10.0, 0.0, 1960.0, 0.0, -10.0)
+
+
+def test_run_window(granules, qcf_file, tmp_path):
+    files = granules('MOD09A1', 2)
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'window').mkdir()
+    run(qcf_file, [1], files, str(tmp_path / 'full'))
+    run(qcf_file, [1], files, str(tmp_path / 'window'), window='5,7,20,30')
+
+    full = gdal.Open(str(tmp_path / 'full' / 'h10v08_MOD09A1_band01.tif'))
+    window = gdal.Open(str(tmp_path / 'window' / 'h10v08_MOD09A1_band01.tif'))
+    assert (window.RasterXSize, window.RasterYSize, window.RasterCount) == (20, 30, 2)
+    np.testing.assert_array_equal(window.ReadAsArray(), full.ReadAsArray()[:, 7:37, 5:25])
+    assert window.GetGeoTransform() == get_geotransform(full.GetGeoTransform(), Window(5, 7, 20, 30))
+
+
+def test_run_window_flag_cache(granules, qcf_file, tmp_path):
+    files = granules('MOD09A1', 2)
+    flag_cache_dir = str(tmp_path / 'flags')
+    for name in ('window', 'window_cache', 'full', 'full_cache'):
+        (tmp_path / name).mkdir()
+    run(qcf_file, [1], files, str(tmp_path / 'window'), window='5,7,20,30')
+    run(qcf_file, [1], files, str(tmp_path / 'window_cache'), window='5,7,20,30', flag_cache_dir=flag_cache_dir)
+    run(qcf_file, [1], files, str(tmp_path / 'full'))
+    # the planes cached in the run of the window are of all tile
+    run(qcf_file, [1], files, str(tmp_path / 'full_cache'), flag_cache_dir=flag_cache_dir)
+
+    for name in ('window', 'full'):
+        expected = gdal.Open(str(tmp_path / name / 'h10v08_MOD09A1_band01.tif')).ReadAsArray()
+        result = gdal.Open(str(tmp_path / (name + '_cache') / 'h10v08_MOD09A1_band01.tif')).ReadAsArray()
+        np.testing.assert_array_equal(result, expected, err_msg=name)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+from datetime import datetime
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from qc4sd.quality_control import summary
+from qc4sd.quality_control.summary import Summary, SUMMARY_BANDS
+
+DATES = ['2015353', '2016001', '2016009', '2016033', '2016041', '2016097']
+NODATA = [-28672, -28672, -1, -28672, -1, -28672]
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    rasters = []
+    for nodata_value in NODATA:
+        raster = rng.integers(0, 100, (7, 5)).astype(np.int16)
+        raster[rng.random(raster.shape) < 0.5] = nodata_value
+        rasters.append(raster)
+    return rasters
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # several blocks of rows for the small rasters
+    monkeypatch.setattr(summary, 'BLOCK_ROWS', 3)
+
+
+def expected_summary(dates, rasters, nodata_values):
+    """Summary of each pixel computed from its list of valid dates"""
+    rows, cols = rasters[0].shape
+    expected = dict((name, np.zeros((rows, cols), dtype=np.int32)) for name in SUMMARY_BANDS)
+    for y in range(rows):
+        for x in range(cols):
+            valid = [date for date, raster, nodata_value in zip(dates, rasters, nodata_values)
+                     if raster[y, x] != nodata_value]
+            if not valid:
+                continue
+            days = [datetime.strptime(date, '%Y%j').toordinal() for date in valid]
+            expected['valid_count'][y, x] = len(valid)
+            expected['first_valid_date'][y, x] = int(valid[0])
+            expected['last_valid_date'][y, x] = int(valid[-1])
+            expected['longest_gap_days'][y, x] = max([b - a for a, b in zip(days, days[1:])] + [0])
+    return expected
+
+
+def test_summary(series):
+    result = Summary(7, 5)
+    for date, raster, nodata_value in zip(DATES, series, NODATA):
+        result.update(date, raster, nodata_value)
+    expected = expected_summary(DATES, series, NODATA)
+    for name in SUMMARY_BANDS:
+        np.testing.assert_array_equal(result.accumulators[name], expected[name], err_msg=name)
+    assert result.last_date == DATES[-1]
+    result.close()
+
+
+def test_summary_continued_from_file(series, tmp_path):
+    summary_file = str(tmp_path / 'summary.tif')
+    result = Summary(7, 5)
+    for date, raster, nodata_value in list(zip(DATES, series, NODATA))[:3]:
+        result.update(date, raster, nodata_value)
+    result.save(summary_file, (0, 1, 0, 0, 0, -1), '')
+    result.close()
+
+    # the gaps from the last valid date saved continue with the new dates
+    result = Summary(7, 5)
+    result.load(summary_file)
+    assert result.last_date == DATES[2]
+    for date, raster, nodata_value in list(zip(DATES, series, NODATA))[3:]:
+        result.update(date, raster, nodata_value)
+    expected = expected_summary(DATES, series, NODATA)
+    for name in SUMMARY_BANDS:
+        np.testing.assert_array_equal(result.accumulators[name], expected[name], err_msg=name)
+    result.close()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import csv
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.qc4sd import run
+from rules import complete_qcf
+
+# variants with the default values, with all values of the bit fields and with values at random
+VARIANTS = ['default', 'permissive', 'random']
+OUTPUT = 'h10v08_MOD09A1_band01'
+
+
+@pytest.fixture
+def qcf_files(tmp_path):
+    """Quality control files of the variants, with different values that not pass"""
+    qcf_files = []
+    for variant_name, qcf in zip(VARIANTS, (complete_qcf(), complete_qcf(np.random.default_rng(0), 0.0),
+                                            complete_qcf(np.random.default_rng(1), 0.1))):
+        qcf_file = str(tmp_path / (variant_name + '.ini'))
+        with open(qcf_file, 'w') as f:
+            qcf.write(f)
+        qcf_files.append(qcf_file)
+    return qcf_files
+
+
+def read_output(output_dir):
+    """Return the bands of the output (by date) and the text of the statistics"""
+    dataset = gdal.Open(os.path.join(output_dir, OUTPUT + '.tif'))
+    bands = [dataset.GetRasterBand(nband + 1) for nband in range(dataset.RasterCount)]
+    rasters = [(band.ReadAsArray(), band.GetNoDataValue()) for band in bands]
+    del bands, dataset
+    with open(os.path.join(output_dir, OUTPUT + '_stats.csv')) as stats_file:
+        return rasters, stats_file.read()
+
+
+def test_sweep(granules, qcf_files, tmp_path):
+    files = granules('MOD09A1', 3)
+    sweep_dir = tmp_path / 'sweep'
+    sweep_dir.mkdir()
+    run(qcf_files, [1], files, str(sweep_dir), with_stats=True, number_of_processes=2)
+
+    # the output of each variant is the output of its quality control file alone
+    outputs = {}
+    for variant_name, qcf_file in zip(VARIANTS, qcf_files):
+        single_dir = tmp_path / ('single_' + variant_name)
+        single_dir.mkdir()
+        run(qcf_file, [1], files, str(single_dir), with_stats=True, number_of_processes=2)
+        outputs[variant_name], single_stats = read_output(str(single_dir))
+        sweep_rasters, sweep_stats = read_output(str(sweep_dir / variant_name))
+        assert len(sweep_rasters) == len(outputs[variant_name]) == 3
+        for (sweep_raster, sweep_nodata), (raster, nodata_value) in zip(sweep_rasters, outputs[variant_name]):
+            np.testing.assert_array_equal(sweep_raster, raster, err_msg=variant_name)
+            assert sweep_nodata == nodata_value
+        assert sweep_stats == single_stats
+
+    # the pixels with different result (valid or invalid) for each pair of variants,
+    # the pixels NoData of the data band are NoData in all outputs
+    with open(str(sweep_dir / (OUTPUT + '_disagreement.csv'))) as csv_file:
+        disagreement = list(csv.DictReader(csv_file))
+    expected = []
+    for date_idx, date in enumerate(['2016001', '2016009', '2016017']):
+        for variant_a, name_a in enumerate(VARIANTS):
+            for name_b in VARIANTS[variant_a + 1:]:
+                raster_a, nodata_value = outputs[name_a][date_idx]
+                raster_b = outputs[name_b][date_idx][0]
+                pixels = np.count_nonzero((raster_a == nodata_value) != (raster_b == nodata_value))
+                expected.append({'date': date, 'qcf_a': name_a, 'qcf_b': name_b, 'pixels': str(pixels)})
+    assert disagreement == expected
+    assert all(int(row['pixels']) > 0 for row in disagreement)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import pytest
+
+pytest.importorskip('osgeo.gdal')
+
+from qc4sd import watch as watch_module
+from qc4sd.qc4sd import run
+from qc4sd.watch import find_complete_files, watch
+from qc4sd.quality_control.writer import read_vrt_bands
+from test_incremental import read_outputs, assert_same_outputs
+
+MTL_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<LANDSAT_METADATA_FILE>
+  <PRODUCT_CONTENTS>
+    <LANDSAT_PRODUCT_ID>LC08_L2SP_008058_20200105_20200824_02_T1</LANDSAT_PRODUCT_ID>
+    <FILE_NAME_BAND_1>LC08_L2SP_008058_20200105_20200824_02_T1_SR_B1.TIF</FILE_NAME_BAND_1>
+    <FILE_NAME_QUALITY_L1_PIXEL>LC08_L2SP_008058_20200105_20200824_02_T1_QA_PIXEL.TIF</FILE_NAME_QUALITY_L1_PIXEL>
+  </PRODUCT_CONTENTS>
+</LANDSAT_METADATA_FILE>
+"""
+SCENE = 'LC08_L2SP_008058_20200105_20200824_02_T1'
+
+
+def append(filename, data='x'):
+    with open(filename, 'a') as f:
+        f.write(data)
+
+
+def test_find_complete_files_modis(granules):
+    files = granules('MOD09A1', 2)
+    directory = os.path.dirname(files[0])
+    sizes = {}
+    # the files are complete when its sizes don't change since the previous call
+    assert find_complete_files(directory, sizes) == []
+    assert find_complete_files(directory, sizes) == sorted(files)
+    # the file or its xml file in download
+    append(files[0])
+    assert find_complete_files(directory, sizes) == [files[1]]
+    append(files[1] + '.xml', ' ')
+    assert find_complete_files(directory, sizes) == [files[0]]
+    assert find_complete_files(directory, sizes) == sorted(files)
+    # without its xml file
+    os.rename(files[1] + '.xml', files[1] + '.bak')
+    assert find_complete_files(directory, sizes) == [files[0]]
+
+
+def test_find_complete_files_landsat(tmp_path):
+    mtl_file = str(tmp_path / (SCENE + '_MTL.xml'))
+    band_file = str(tmp_path / (SCENE + '_SR_B1.TIF'))
+    qa_file = str(tmp_path / (SCENE + '_QA_PIXEL.TIF'))
+    # the metadata file in download (incomplete xml) is ignored
+    with open(mtl_file, 'w') as f:
+        f.write(MTL_TEMPLATE[:200])
+    append(band_file)
+    sizes = {}
+    assert find_complete_files(str(tmp_path), sizes) == []
+    assert find_complete_files(str(tmp_path), sizes) == []
+    with open(mtl_file, 'w') as f:
+        f.write(MTL_TEMPLATE)
+    assert find_complete_files(str(tmp_path), sizes) == []
+    # the bands not arrived are checked by the loader (retried)
+    assert find_complete_files(str(tmp_path), sizes) == [mtl_file]
+    # the bands of the metadata file in download
+    append(qa_file)
+    assert find_complete_files(str(tmp_path), sizes) == []
+    append(band_file)
+    assert find_complete_files(str(tmp_path), sizes) == []
+    assert find_complete_files(str(tmp_path), sizes) == [mtl_file]
+
+
+def test_find_complete_files_not_supported(tmp_path):
+    # xml files of other data and files without metadata
+    append(str(tmp_path / 'other.hdf'))
+    with open(str(tmp_path / 'other.hdf.xml'), 'w') as f:
+        f.write('<?xml version="1.0"?><GranuleMetaDataFile></GranuleMetaDataFile>')
+    append(str(tmp_path / 'other_MTL.xml'), '<?xml version="1.0"?><METADATA></METADATA>')
+    append(str(tmp_path / 'image.tif'))
+    sizes = {}
+    assert find_complete_files(str(tmp_path), sizes) == []
+    assert find_complete_files(str(tmp_path), sizes) == []
+    assert sizes == {}
+
+
+def test_watch_retry_without_source_file(qcf_file, granules, tmp_path, monkeypatch):
+    gq_files = granules('MOD09GQ', 2)
+    directory = os.path.dirname(gq_files[0])
+    ga_files = sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                      if filename.startswith('MOD09GA') and filename.endswith('.hdf'))
+    all_files = sorted(gq_files + ga_files)
+    # the MOD09GA file of the second date arrives later
+    later = tmp_path / 'later'
+    later.mkdir()
+    for filename in (ga_files[1], ga_files[1] + '.xml'):
+        os.rename(filename, str(later / os.path.basename(filename)))
+
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    gq_vrt = str(output_dir / 'h10v08_MOD09GQ_band01.vrt')
+    checks = []
+
+    def sleep(interval):
+        checks.append(interval)
+        if len(checks) == 2:
+            # the MOD09GQ file without its MOD09GA file is not processed
+            assert [band[0] for band in read_vrt_bands(gq_vrt)] == ['2016001']
+            for filename in os.listdir(str(later)):
+                os.rename(str(later / filename), os.path.join(directory, filename))
+        if len(checks) == 4:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch_module.time, 'sleep', sleep)
+    watch(qcf_file, [1], directory, str(output_dir), number_of_processes=1, interval=0.5)
+    assert checks == [0.5] * 4
+
+    # the same outputs of all files processed at once
+    expected_dir = tmp_path / 'expected'
+    expected_dir.mkdir()
+    run(qcf_file, [1], all_files, str(expected_dir), incremental=True, number_of_processes=1)
+    assert [band[0] for band in read_vrt_bands(gq_vrt)] == ['2016001', '2016009']
+    assert_same_outputs(read_outputs(str(output_dir)), read_outputs(str(expected_dir)))
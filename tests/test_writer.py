@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+from joblib import dump
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.quality_control.writer import DatesWriter, write_vrt, read_vrt_bands
+
+ROWS, COLS = 5, 6
+OUTPUT_PROPERTIES = ((100.0, 10.0, 0.0, 200.0, 0.0, -10.0), '', gdal.GDT_Int16)
+
+
+def date_raster(date):
+    """Different raster for each date (by its julian day)"""
+    return np.arange(ROWS * COLS, dtype=np.int16).reshape(ROWS, COLS) + int(date[-3:]) * 100
+
+
+def save_date(directory, date, nodata_value):
+    """Save the raster of the date in its file as the writer, return the band for the VRT"""
+    date_file = os.path.join(str(directory), 'date_' + date + '.tif')
+    dataset = gdal.GetDriverByName('GTiff').Create(date_file, COLS, ROWS, 1, gdal.GDT_Int16)
+    dataset.SetGeoTransform(OUTPUT_PROPERTIES[0])
+    dataset.GetRasterBand(1).WriteArray(date_raster(date))
+    if nodata_value is not None:
+        dataset.GetRasterBand(1).SetNoDataValue(nodata_value)
+    dataset = None
+    return date, date_file, 1, nodata_value
+
+
+def read_vrt(vrt_file):
+    """Return the labels in the metadata and the description, NoData and raster of each band"""
+    dataset = gdal.Open(vrt_file)
+    bands = [dataset.GetRasterBand(nband + 1) for nband in range(dataset.RasterCount)]
+    result = (dataset.GetMetadataItem('DATES'),
+              [(band.GetDescription(), band.GetNoDataValue(), band.ReadAsArray()) for band in bands])
+    del bands, dataset
+    return result
+
+
+def assert_vrt(vrt_file, bands):
+    labels, vrt_bands = read_vrt(vrt_file)
+    assert labels == ','.join(label for label, _, _, _ in bands)
+    assert len(vrt_bands) == len(bands)
+    for (label, _, _, nodata_value), (description, vrt_nodata, raster) in zip(bands, vrt_bands):
+        assert description == label
+        assert vrt_nodata == nodata_value
+        np.testing.assert_array_equal(raster, date_raster(label))
+
+
+def test_dates_writer(tmp_path):
+    writer = DatesWriter(2)
+    futures = []
+    for date, nodata_value in (('2016001', -28672), ('2016009', -1)):
+        mmap_raster = os.path.join(tempfile.mkdtemp(), 'mmap_raster')
+        dump(date_raster(date), mmap_raster)
+        futures.append((date, nodata_value, mmap_raster, writer.submit(
+            str(tmp_path / (date + '.tif')), date, mmap_raster, nodata_value, OUTPUT_PROPERTIES)))
+    writer.close()
+
+    for date, nodata_value, mmap_raster, future in futures:
+        assert future.done() and future.exception() is None
+        # the memmap of the raster is removed after write it
+        assert not os.path.exists(os.path.dirname(mmap_raster))
+        dataset = gdal.Open(str(tmp_path / (date + '.tif')))
+        assert dataset.GetMetadataItem('DATES') == date
+        assert dataset.GetGeoTransform() == OUTPUT_PROPERTIES[0]
+        band = dataset.GetRasterBand(1)
+        assert band.GetDescription() == date
+        assert band.GetNoDataValue() == nodata_value
+        np.testing.assert_array_equal(band.ReadAsArray(), date_raster(date))
+        del band, dataset
+    # without the hidden files of the writes in progress
+    assert sorted(os.listdir(str(tmp_path))) == ['2016001.tif', '2016009.tif']
+
+
+def test_write_and_read_vrt(tmp_path):
+    output_dir = tmp_path / 'output'
+    other_dir = tmp_path / 'other'
+    output_dir.mkdir()
+    other_dir.mkdir()
+    # the source in other directory (i.e. the stack of a previous run) and without NoData
+    bands = [save_date(output_dir, '2016017', -28672), save_date(other_dir, '2016001', -1),
+             save_date(output_dir, '2016009', None)]
+    vrt_file = str(output_dir / 'dates.vrt')
+    write_vrt(vrt_file, bands, ROWS, COLS, OUTPUT_PROPERTIES, 'DATES', {'SUMMARY': 'none'})
+
+    # sorted by date, the round trip of the bands of the VRT
+    sorted_bands = sorted(bands)
+    assert read_vrt_bands(vrt_file) == [(label, source_file, 1, float(nodata_value) if nodata_value is not None
+                                         else None) for label, source_file, _, nodata_value in sorted_bands]
+    assert_vrt(vrt_file, sorted_bands)
+    dataset = gdal.Open(vrt_file)
+    assert dataset.GetMetadataItem('SUMMARY') == 'none'
+    assert dataset.GetGeoTransform() == OUTPUT_PROPERTIES[0]
+    del dataset
+
+    # the sources in the directory of the VRT are relative, else absolute
+    source_filenames = [vrt_band.find('SimpleSource').find('SourceFilename')
+                        for vrt_band in ET.parse(vrt_file).getroot().iter('VRTRasterBand')]
+    assert [(source.get('relativeToVRT'), source.text) for source in source_filenames] == \
+        [('0', str(other_dir / 'date_2016001.tif')), ('1', 'date_2016009.tif'), ('1', 'date_2016017.tif')]
+    # without the hidden file of the write
+    assert sorted(os.listdir(str(output_dir))) == ['date_2016009.tif', 'date_2016017.tif', 'dates.vrt']
+
+    # the outputs can be moved with its VRT
+    moved_dir = str(tmp_path / 'moved')
+    shutil.move(str(output_dir), moved_dir)
+    moved_vrt_file = os.path.join(moved_dir, 'dates.vrt')
+    assert [source_file for _, source_file, _, _ in read_vrt_bands(moved_vrt_file)] == \
+        [str(other_dir / 'date_2016001.tif'), os.path.join(moved_dir, 'date_2016009.tif'),
+         os.path.join(moved_dir, 'date_2016017.tif')]
+    assert_vrt(moved_vrt_file, sorted_bands)
+
+
+def test_append_to_vrt(tmp_path):
+    # the new dates (before, between and after the existing dates) appended in the VRT
+    vrt_file = str(tmp_path / 'dates.vrt')
+    bands = [save_date(tmp_path, date, -28672) for date in ('2016009', '2016025')]
+    write_vrt(vrt_file, bands, ROWS, COLS, OUTPUT_PROPERTIES, 'DATES')
+    for new_dates in (['2016017'], ['2016001', '2016033']):
+        bands = read_vrt_bands(vrt_file) + [save_date(tmp_path, date, -28672) for date in new_dates]
+        write_vrt(vrt_file, bands, ROWS, COLS, OUTPUT_PROPERTIES, 'DATES')
+    dates = ['2016001', '2016009', '2016017', '2016025', '2016033']
+    assert [band[0] for band in read_vrt_bands(vrt_file)] == dates
+    assert_vrt(vrt_file, [(date, None, 1, -28672) for date in dates])
+
+
+def test_read_vrt_bands_complex_source(tmp_path):
+    # VRT with complex sources (i.e. edited with gdalbuildvrt) and without description
+    save_date(tmp_path, '2016001', None)
+    vrt_file = str(tmp_path / 'complex.vrt')
+    with open(vrt_file, 'w') as f:
+        f.write('<VRTDataset rasterXSize="{0}" rasterYSize="{1}"><VRTRasterBand dataType="Int16" band="1">'
+                '<NoDataValue>-9999</NoDataValue><ComplexSource><SourceFilename relativeToVRT="1">'
+                'date_2016001.tif</SourceFilename><SourceBand>1</SourceBand></ComplexSource>'
+                '</VRTRasterBand></VRTDataset>'.format(COLS, ROWS))
+    assert read_vrt_bands(vrt_file) == [(None, str(tmp_path / 'date_2016001.tif'), 1, -9999.0)]
+    assert read_vrt_bands(str(tmp_path / 'not_exist.vrt')) is None
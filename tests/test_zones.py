@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  (c) Copyright SMBYC - IDEAM 2015-2016
+#  Authors: Xavier Corredor Llano
+#  Email: xcorredorl at ideam.gov.co
+
+import os
+import csv
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from qc4sd.qc4sd import run
+from qc4sd.quality_control import zones as zones_module
+from qc4sd.quality_control.zones import Zones, ZONES_NODATA, ZONAL_STATISTICS_FIELDS, merge_zonal_statistics, \
+    write_zonal_statistics
+from qc4sd.quality_control.statistics import read_statistics
+from qc4sd.satellite_data.satellite_data import new
+
+OUTPUT = 'h10v08_MOD09A1_band01'
+
+
+def test_merge_zonal_statistics():
+    a = {'total_pixels': np.array([1, 2, 0]), 'invalid_pixels': {'sf': {'sf_cloud_state_01': np.array([1, 0, 0])}}}
+    b = {'total_pixels': np.array([3, 0, 1]), 'nodata_pixels': np.array([1, 0, 0]),
+         'invalid_pixels': {'sf': {'sf_cloud_state_01': np.array([0, 2, 0]), 'sf_salt_pan_1': np.array([0, 0, 1])},
+                            'rbq': {'rbq_atcorr_1': np.array([1, 1, 1])}}}
+    merged = merge_zonal_statistics(a, b)
+    np.testing.assert_array_equal(merged['total_pixels'], [4, 2, 1])
+    np.testing.assert_array_equal(merged['nodata_pixels'], [1, 0, 0])
+    np.testing.assert_array_equal(merged['invalid_pixels']['sf']['sf_cloud_state_01'], [1, 2, 0])
+    np.testing.assert_array_equal(merged['invalid_pixels']['sf']['sf_salt_pan_1'], [0, 0, 1])
+    np.testing.assert_array_equal(merged['invalid_pixels']['rbq']['rbq_atcorr_1'], [1, 1, 1])
+    # the statistics merged are not changed
+    np.testing.assert_array_equal(a['total_pixels'], [1, 2, 0])
+    assert merge_zonal_statistics({}, a) == a
+
+
+def test_write_zonal_statistics(tmp_path):
+    # two zones and the pixels outside of all zones (last index)
+    zonal_statistics = {'total_pixels': np.array([10, 0, 4]), 'total_invalid_pixels': np.array([3, 0, 4]),
+                        'nodata_pixels': np.array([1, 0, 4]),
+                        'invalid_pixels': {'sf': {'sf_salt_pan_1': np.array([2, 0, 0]),
+                                                  'sf_cloud_state_01': np.array([0, 0, 0])}}}
+    stats_file = str(tmp_path / 'zonal_stats.csv')
+    for date in ('2016001', '2016009'):
+        write_zonal_statistics(stats_file, date, zonal_statistics, np.array([5, 7]))
+    with open(stats_file, newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    # the zones without pixels and the flags without invalid pixels are not saved
+    assert rows == [ZONAL_STATISTICS_FIELDS] + [
+        [date, '5', qc_band, flag, pixels] for date in ('2016001', '2016009')
+        for qc_band, flag, pixels in (('', 'total_pixels', '10'), ('', 'total_invalid_pixels', '3'),
+                                      ('', 'nodata_pixels', '1'), ('sf', 'sf_salt_pan_1', '2'))]
+
+
+def make_zones_file(zones_file, sd, zones_raster):
+    """Save the raster of zones in the grid of the data band of the satellite data"""
+    data_band = gdal.Open(sd.get_data_band_name(1))
+    dataset = gdal.GetDriverByName('GTiff').Create(zones_file, data_band.RasterXSize, data_band.RasterYSize, 1,
+                                                   gdal.GDT_Int32)
+    dataset.SetGeoTransform(data_band.GetGeoTransform())
+    dataset.SetProjection(data_band.GetProjectionRef())
+    dataset.GetRasterBand(1).WriteArray(zones_raster)
+    dataset.GetRasterBand(1).SetNoDataValue(ZONES_NODATA)
+    dataset = None
+
+
+@pytest.fixture
+def zones_raster():
+    # three zones with labels not consecutive and the pixels outside of all zones
+    zones_raster = np.full((48, 48), ZONES_NODATA, dtype=np.int32)
+    zones_raster[:20, :30] = 30
+    zones_raster[20:, :] = 10
+    zones_raster[5:15, 35:45] = 20
+    return zones_raster
+
+
+def test_zones_cached(granules, zones_raster, tmp_path, monkeypatch):
+    files = granules('MOD09A1', 1)
+    sd = new(files[0], files[0] + '.xml')
+    zones_file = str(tmp_path / 'zones.tif')
+    make_zones_file(zones_file, sd, zones_raster)
+    cache_dir = str(tmp_path / 'cache')
+
+    zones = Zones(zones_file, cache_dir=cache_dir)
+    zones_index, labels = zones.get(sd, 1)
+    np.testing.assert_array_equal(labels, [10, 20, 30])
+    expected_index = np.searchsorted([10, 20, 30], zones_raster)
+    expected_index[zones_raster == ZONES_NODATA] = 3
+    np.testing.assert_array_equal(zones_index, expected_index)
+    zones.close()
+    assert len(os.listdir(cache_dir)) == 2
+
+    # the zones are rasterized once for each grid
+    def rasterize(*args, **kwargs):
+        raise AssertionError("The zones are rasterized again")
+
+    monkeypatch.setattr(zones_module, 'rasterize', rasterize)
+    zones = Zones(zones_file, cache_dir=cache_dir)
+    np.testing.assert_array_equal(zones.get(sd, 1)[0], expected_index)
+    zones.close()
+
+    # without cache dir the zones are deleted at the end
+    monkeypatch.undo()
+    zones = Zones(zones_file)
+    zones.get(sd, 1)
+    temporal_dir = zones.cache_dir
+    zones.close()
+    assert not os.path.exists(temporal_dir)
+    with pytest.raises(FileNotFoundError):
+        Zones(str(tmp_path / 'not_exist.tif'))
+
+
+def read_zonal_statistics(stats_file):
+    """Return the zonal statistics as the statistics (see read_statistics) by zone"""
+    zonal_statistics = {}
+    with open(stats_file, newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            sd_statistics = zonal_statistics.setdefault(row['zone'], {}).setdefault(
+                row['date'], {'total_pixels': 0, 'total_invalid_pixels': 0, 'nodata_pixels': 0, 'invalid_pixels': {}})
+            if row['qc_band']:
+                sd_statistics['invalid_pixels'].setdefault(row['qc_band'], {})[row['flag']] = int(row['pixels'])
+            else:
+                sd_statistics[row['flag']] = int(row['pixels'])
+    return zonal_statistics
+
+
+def without_zeros(statistics):
+    for sd_statistics in statistics.values():
+        sd_statistics['invalid_pixels'] = dict(
+            (qc_band, dict((flag, pixels) for flag, pixels in flags.items() if pixels))
+            for qc_band, flags in sd_statistics['invalid_pixels'].items())
+        sd_statistics['invalid_pixels'] = dict(
+            (qc_band, flags) for qc_band, flags in sd_statistics['invalid_pixels'].items() if flags)
+    return statistics
+
+
+def test_run_zones(granules, qcf_file, zones_raster, tmp_path):
+    files = granules('MOD09A1', 2)
+    sd = new(files[0], files[0] + '.xml')
+    zones_file = str(tmp_path / 'zones.tif')
+    make_zones_file(zones_file, sd, zones_raster)
+    (tmp_path / 'zones').mkdir()
+    run(qcf_file, [1], files, str(tmp_path / 'zones'), zones=zones_file, number_of_processes=2)
+    zonal_statistics = read_zonal_statistics(str(tmp_path / 'zones' / (OUTPUT + '_zonal_stats.csv')))
+    assert sorted(zonal_statistics) == ['10', '20', '30']
+
+    # the statistics of each zone are the statistics of the run with the mask of the zone
+    for zone in (10, 20, 30):
+        mask_file = str(tmp_path / 'mask_{0}.tif'.format(zone))
+        make_zones_file(mask_file, sd, (zones_raster == zone).astype(np.int32))
+        output_dir = tmp_path / 'mask_{0}'.format(zone)
+        output_dir.mkdir()
+        run(qcf_file, [1], files, str(output_dir), with_stats=True, mask=mask_file, number_of_processes=2)
+        statistics = without_zeros(read_statistics(str(output_dir / (OUTPUT + '_stats.csv'))))
+        assert zonal_statistics[str(zone)] == statistics, zone